@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
+import json
 import os
 
 # Load environment variables from .env file
@@ -48,6 +49,67 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
+# Client database connection pooling (per ClientDatabase credentials, per process)
+CLIENT_DB_POOL_MIN_SIZE = int(os.environ.get('CLIENT_DB_POOL_MIN_SIZE', 1))
+CLIENT_DB_POOL_MAX_SIZE = int(os.environ.get('CLIENT_DB_POOL_MAX_SIZE', 10))
+CLIENT_DB_POOL_MAX_IDLE = int(os.environ.get('CLIENT_DB_POOL_MAX_IDLE', 300))  # seconds before an idle connection is closed
+CLIENT_DB_POOL_HEALTH_CHECK_AFTER = int(os.environ.get('CLIENT_DB_POOL_HEALTH_CHECK_AFTER', 30))  # ping connections idle longer than this
+CLIENT_DB_POOL_TIMEOUT = int(os.environ.get('CLIENT_DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+CLIENT_DB_STATUS_FLUSH_INTERVAL = int(os.environ.get('CLIENT_DB_STATUS_FLUSH_INTERVAL', 5))  # seconds between connection_status write-backs
+CLIENT_DB_ASYNC_WORKERS = int(os.environ.get('CLIENT_DB_ASYNC_WORKERS', 100))  # threads async views use for blocking queries
+REPLICA_REFRESH_INTERVAL = int(os.environ.get('REPLICA_REFRESH_INTERVAL', 30))  # seconds a database's replica list is cached
+CLIENT_DB_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('CLIENT_DB_BREAKER_FAILURE_THRESHOLD', 3))  # consecutive connect failures that open the breaker
+CLIENT_DB_BREAKER_RESET_TIMEOUT = int(os.environ.get('CLIENT_DB_BREAKER_RESET_TIMEOUT', 30))  # seconds before an open breaker lets a probe through
+
+# Workload scheduler (per worker process): concurrent client queries and fair queuing per owner
+WORKLOAD_MAX_CONCURRENCY = int(os.environ.get('WORKLOAD_MAX_CONCURRENCY', 32))  # across all client databases
+WORKLOAD_MAX_CONCURRENCY_PER_DATABASE = int(os.environ.get('WORKLOAD_MAX_CONCURRENCY_PER_DATABASE', 8))  # default for ClientDatabase.max_concurrent_queries
+WORKLOAD_QUEUE_TIMEOUT = int(os.environ.get('WORKLOAD_QUEUE_TIMEOUT', 30))  # seconds a query may wait for a slot
+WORKLOAD_OWNER_WEIGHTS = json.loads(os.environ.get('WORKLOAD_OWNER_WEIGHTS', '{}'))  # {"<user id>": weight}, default weight 1
+
+# Default query guards, overridable per ClientDatabase
+QUERY_STATEMENT_TIMEOUT_MS = int(os.environ.get('QUERY_STATEMENT_TIMEOUT_MS', 30000))
+QUERY_MAX_ROWS = int(os.environ.get('QUERY_MAX_ROWS', 1000000))
+QUERY_MAX_BYTES = int(os.environ.get('QUERY_MAX_BYTES', 256 * 1024 * 1024))  # approximate, measured while fetching
+QUERY_MAX_PLAN_COST = float(os.environ.get('QUERY_MAX_PLAN_COST', 10000000))  # EXPLAIN cost above which the cost guard steps in
+QUERY_MAX_PLAN_ROWS = int(os.environ.get('QUERY_MAX_PLAN_ROWS', 10000000))  # estimated result rows above which the cost guard steps in
+
+# Paginated query results (execute_query returns the first page plus a result handle)
+QUERY_RESULT_PAGE_SIZE = int(os.environ.get('QUERY_RESULT_PAGE_SIZE', 1000))  # rows returned per page by execute_query
+QUERY_RESULT_TTL = int(os.environ.get('QUERY_RESULT_TTL', 900))  # seconds a spilled result stays readable after its last access
+QUERY_RESULT_PAGE_WAIT = int(os.environ.get('QUERY_RESULT_PAGE_WAIT', 10))  # seconds a page request waits for rows still being spilled
+QUERY_RESULT_SPILL_DIR = os.environ.get('QUERY_RESULT_SPILL_DIR')  # defaults to <tmp>/dbms_query_results
+
+# Query result cache (per worker process; SELECT results keyed by database, normalized SQL and params)
+QUERY_CACHE_MAX_BYTES = int(os.environ.get('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+QUERY_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('QUERY_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024))
+QUERY_CACHE_TTL = int(os.environ.get('QUERY_CACHE_TTL', 300))  # seconds
+
+# COPY exports: bytes per streamed chunk and how many chunks may wait for a slow client
+QUERY_EXPORT_CHUNK_BYTES = int(os.environ.get('QUERY_EXPORT_CHUNK_BYTES', 256 * 1024))
+QUERY_EXPORT_QUEUE_CHUNKS = int(os.environ.get('QUERY_EXPORT_QUEUE_CHUNKS', 16))
+QUERY_EXPORT_STATEMENT_TIMEOUT_MS = int(os.environ.get('QUERY_EXPORT_STATEMENT_TIMEOUT_MS', 0))  # replaces the per-database timeout for exports; 0 for none
+QUERY_IMPORT_CHUNK_BYTES = int(os.environ.get('QUERY_IMPORT_CHUNK_BYTES', 256 * 1024))  # bytes per COPY FROM read
+QUERY_IMPORT_STATEMENT_TIMEOUT_MS = int(os.environ.get('QUERY_IMPORT_STATEMENT_TIMEOUT_MS', 0))  # replaces the per-database timeout for imports; 0 for none
+
+# Batch execution
+QUERY_BATCH_VALUES_PAGE_SIZE = int(os.environ.get('QUERY_BATCH_VALUES_PAGE_SIZE', 1000))  # parameter rows per execute_values statement or execute_batch round trip
+
+# Query result responses are compressed (brotli if installed, else gzip) above this size
+QUERY_RESPONSE_COMPRESS_MIN_BYTES = int(os.environ.get('QUERY_RESPONSE_COMPRESS_MIN_BYTES', 1024))
+QUERY_RESPONSE_BROTLI_QUALITY = int(os.environ.get('QUERY_RESPONSE_BROTLI_QUALITY', 4))
+
+# EXPLAIN plans (cached per worker process, keyed by SQL fingerprint and schema version)
+EXPLAIN_CACHE_MAX_BYTES = int(os.environ.get('EXPLAIN_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+EXPLAIN_CACHE_TTL = int(os.environ.get('EXPLAIN_CACHE_TTL', 600))  # seconds
+EXPLAIN_LARGE_TABLE_ROWS = int(os.environ.get('EXPLAIN_LARGE_TABLE_ROWS', 100000))  # seq scans over tables this big are flagged
+
+# Metadata extraction
+METADATA_SAMPLE_ROWS = int(os.environ.get('METADATA_SAMPLE_ROWS', 1000))  # rows read per table to sample column values
+METADATA_BULK_BATCH_SIZE = int(os.environ.get('METADATA_BULK_BATCH_SIZE', 500))  # rows per bulk insert/update/delete query
+METADATA_EXACT_COUNT_TIMEOUT_MS = int(os.environ.get('METADATA_EXACT_COUNT_TIMEOUT_MS', 10000))  # time budget per table for exact COUNT(*)
+METADATA_EXTRACT_WORKERS = int(os.environ.get('METADATA_EXTRACT_WORKERS', 4))  # parallel per-table reads (samples, exact counts) per database
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
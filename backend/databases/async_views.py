@@ -0,0 +1,98 @@
+"""
+Async (ASGI) endpoints for long-running client database work
+
+Under an ASGI server these views keep the event loop free while queries run on the shared
+query thread pool, and when the client disconnects Django cancels the view task, which in
+turn cancels the statement on the client database. Under WSGI they still work, one request
+per worker thread like the DRF views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .columnar import to_columnar
+from .models import ClientDatabase
+from .responses import query_result_response
+from .routing import replica_router
+from .serializers import QueryExecutionSerializer
+from .services import DatabaseConnector
+
+
+async def authenticate_request(request):
+    """Authenticate a plain Django request with the JWT scheme the DRF views use; returns the user or None"""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return result[0] if result else None
+
+
+def parse_json_body(request):
+    """Decode a JSON request body, returning None when it is not valid JSON"""
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+def unauthorized_response():
+    return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+
+
+@csrf_exempt
+@require_POST
+async def execute_query_async(request, pk):
+    """Execute SQL query on the database without holding a worker thread while it runs"""
+    user = await authenticate_request(request)
+    if user is None:
+        return unauthorized_response()
+
+    try:
+        database = await ClientDatabase.objects.aget(pk=pk, owner=user)
+    except ClientDatabase.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+
+    data = parse_json_body(request)
+    if data is None:
+        return JsonResponse({'detail': 'Request body must be valid JSON'}, status=400)
+    query_serializer = QueryExecutionSerializer(data=data)
+    if not query_serializer.is_valid():
+        return JsonResponse(query_serializer.errors, status=400)
+    if query_serializer.validated_data['format'] == 'arrow':
+        return JsonResponse({
+            'success': False,
+            'status': 'Error: the arrow format is served by the execute_query endpoint',
+            'error_type': 'format_unavailable'
+        }, status=400)
+
+    # Load the replica list here, so the worker thread running the query needs no ORM access
+    await sync_to_async(replica_router.replicas)(database)
+
+    connector = DatabaseConnector()
+    result = await connector.aexecute_query(
+        database,
+        query_serializer.validated_data['query'],
+        query_serializer.validated_data.get('params'),
+        page_size=query_serializer.validated_data.get('page_size', settings.QUERY_RESULT_PAGE_SIZE),
+        bypass_cache=query_serializer.validated_data['bypass_cache'],
+        on_limit=query_serializer.validated_data['on_limit'],
+        execution_id=query_serializer.validated_data.get('execution_id'),
+        override_cost_guard=query_serializer.validated_data['override_cost_guard'],
+        use_primary=query_serializer.validated_data['use_primary'],
+        owner_id=user.id
+    )
+
+    # Ensure that error_type is included in the response
+    if not result.get("success", True) and "error_type" not in result:
+        result["error_type"] = "execution_error"
+
+    if query_serializer.validated_data['format'] == 'columnar':
+        result = to_columnar(result)
+    return query_result_response(request, result)
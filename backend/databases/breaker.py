@@ -0,0 +1,128 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised instead of connecting while an endpoint's circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops connection attempts to an endpoint that keeps failing to connect
+
+    After failure_threshold consecutive connect failures the breaker opens and callers
+    fail fast with CircuitOpen. Once reset_timeout has passed, one caller is let through as
+    a probe (half open): success closes the breaker, failure opens it for another period.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return HALF_OPEN
+            return self._state
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a probe through"""
+        with self._lock:
+            if self._state != OPEN:
+                return 0
+            return max(round(self.reset_timeout - (time.monotonic() - self._opened_at), 1), 0)
+
+    def available(self):
+        """Whether a call would be let through right now, without claiming the probe"""
+        with self._lock:
+            if self._state == OPEN:
+                return time.monotonic() - self._opened_at >= self.reset_timeout and not self._probing
+            # Half open: only while nobody holds the probe
+            return self._state == CLOSED or not self._probing
+
+    def before_call(self, force=False):
+        """Raise CircuitOpen unless the call may go ahead; force always lets it through (as a probe)"""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and (force or time.monotonic() - self._opened_at >= self.reset_timeout):
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == HALF_OPEN and (force or not self._probing):
+                self._probing = True
+                return
+            raise CircuitOpen(
+                f"Connection to the database is failing; skipping connection attempts for "
+                f"{max(round(self.reset_timeout - (time.monotonic() - self._opened_at)), 1)}s"
+            )
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info("Circuit breaker closed after a successful connection")
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """Free the probe slot after a call that neither reached nor failed to reach the endpoint"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning("Circuit breaker opened after %s connection failures", self._failures)
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class BreakerRegistry:
+    """One CircuitBreaker per endpoint (a database id or a replica's pool key), per process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    failure_threshold=getattr(settings, 'CLIENT_DB_BREAKER_FAILURE_THRESHOLD', 3),
+                    reset_timeout=getattr(settings, 'CLIENT_DB_BREAKER_RESET_TIMEOUT', 30),
+                )
+                self._breakers[key] = breaker
+            return breaker
+
+    def state(self, key):
+        with self._lock:
+            breaker = self._breakers.get(key)
+        return breaker.state if breaker else CLOSED
+
+    def reset(self, key):
+        """Forget an endpoint's failures (its host or credentials were edited)"""
+        with self._lock:
+            self._breakers.pop(key, None)
+
+
+# Shared by every DatabaseConnector in this process
+breaker_registry = BreakerRegistry()
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .sqltools import sql_fingerprint
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry TTL, bounded by the total size of its values in bytes"""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            # Evict least recently used entries until we fit
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return True
+
+    def delete_where(self, predicate):
+        """Remove every entry whose key matches predicate; returns how many were removed"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+def estimate_result_size(result, sample_rows=100):
+    """Approximate the JSON size of a query result by encoding a sample of its rows"""
+    rows = result.get("rows") or []
+    sample = rows[:sample_rows]
+    encoded = len(json.dumps(sample, cls=JSONEncoder)) if sample else 2
+    per_row = encoded / max(len(sample), 1)
+    return int(per_row * len(rows)) + len(json.dumps(result.get("columns", []))) + 256
+
+
+class QueryResultCache:
+    """
+    Caches execute_query results per ClientDatabase
+
+    Keys are (database id, normalized SQL fingerprint, params, page size). Any statement
+    that is not a plain SELECT run against a database invalidates that database's entries.
+    The cache lives in each worker process, so QUERY_CACHE_TTL bounds how stale a result
+    can get when the data is changed through another process or outside this app.
+    """
+
+    def __init__(self):
+        self._cache = LRUCache(
+            max_bytes=getattr(settings, 'QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024),
+            ttl=getattr(settings, 'QUERY_CACHE_TTL', 300),
+        )
+        self._lock = threading.Lock()
+        self._counters = {}  # database id -> {'hits': n, 'misses': n}
+
+    def make_key(self, database_id, query, params=None, page_size=None):
+        params_key = json.dumps(params, sort_keys=True, cls=JSONEncoder)
+        return (database_id, sql_fingerprint(query), params_key, page_size)
+
+    def _count(self, database_id, counter):
+        with self._lock:
+            counters = self._counters.setdefault(database_id, {'hits': 0, 'misses': 0})
+            counters[counter] += 1
+            return dict(counters)
+
+    def get(self, key):
+        """Return (cached result or None, counters for the database)"""
+        result = self._cache.get(key)
+        counters = self._count(key[0], 'hits' if result is not None else 'misses')
+        return result, counters
+
+    def put(self, key, result):
+        max_entry = getattr(settings, 'QUERY_CACHE_MAX_ENTRY_BYTES', 8 * 1024 * 1024)
+        size = estimate_result_size(result)
+        if size > max_entry:
+            return False
+        return self._cache.set(key, result, size)
+
+    def invalidate(self, database_id):
+        """Drop every cached result for a database"""
+        return self._cache.delete_where(lambda key: key[0] == database_id)
+
+    def stats(self, database_id):
+        with self._lock:
+            counters = dict(self._counters.get(database_id, {'hits': 0, 'misses': 0}))
+        # Entry and byte totals are for the whole process-wide cache
+        counters['total_entries'] = len(self._cache)
+        counters['total_bytes'] = self._cache.size_bytes
+        return counters
+
+
+# Shared by every DatabaseConnector in this process
+query_result_cache = QueryResultCache()
@@ -0,0 +1,123 @@
+"""
+Column-oriented result formats for execute_query
+
+'columnar' is JSON with one array per column plus a type header; 'arrow' is an Apache Arrow
+IPC stream built batch by batch from the server-side cursor. Arrow output and Parquet imports
+need the optional pyarrow package.
+"""
+import io
+
+from .responses import encode_json
+
+try:
+    import pyarrow
+except ImportError:  # the arrow format is unavailable without it
+    pyarrow = None
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+def to_columnar(result):
+    """Return a copy of a row-oriented result with its rows pivoted into per-column arrays"""
+    columnar = {key: value for key, value in result.items() if key != 'rows'}
+    rows = result.get('rows') or []
+    columns = result.get('columns') or []
+    columnar['format'] = 'columnar'
+    columnar['row_count'] = len(rows)
+    columnar['data'] = [list(values) for values in zip(*rows)] if rows else [[] for _ in columns]
+    return columnar
+
+
+def arrow_available():
+    return pyarrow is not None
+
+
+def _arrow_type(type_name):
+    # Values arrive already converted by the result casters: numeric as float, temporal
+    # types and bytea as text, so only plain scalar types keep a native arrow type
+    return {
+        'boolean': pyarrow.bool_(),
+        'smallint': pyarrow.int16(),
+        'integer': pyarrow.int32(),
+        'bigint': pyarrow.int64(),
+        'oid': pyarrow.int64(),
+        'real': pyarrow.float32(),
+        'double precision': pyarrow.float64(),
+        'numeric': pyarrow.float64(),
+    }.get(type_name, pyarrow.string())
+
+
+def _as_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return encode_json(value).decode('utf-8')
+    return str(value)
+
+
+def arrow_stream(columns, types, batches, budget=None):
+    """
+    Encode streamed batches as an Arrow IPC stream; yields the bytes of each message
+
+    If the result was cut off at its budget, the stream ends with an empty record batch whose
+    custom metadata carries truncated=true and the limit that fired.
+    """
+    schema = pyarrow.schema([pyarrow.field(name, _arrow_type(type_name)) for name, type_name in zip(columns, types)])
+    buffer = io.BytesIO()
+    writer = pyarrow.ipc.new_stream(buffer, schema)
+
+    def drain():
+        # Hand over what the writer produced so far and start the buffer again
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    try:
+        for batch in batches:
+            arrays = []
+            for index, field in enumerate(schema):
+                values = [row[index] for row in batch]
+                if pyarrow.types.is_string(field.type):
+                    values = [_as_text(value) for value in values]
+                arrays.append(pyarrow.array(values, type=field.type))
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+            yield drain()
+        if budget is not None and budget.exceeded:
+            empty = pyarrow.RecordBatch.from_arrays([pyarrow.array([], type=field.type) for field in schema], schema=schema)
+            writer.write_batch(empty, custom_metadata={'truncated': 'true', 'limit': budget.exceeded})
+            yield drain()
+    finally:
+        writer.close()
+    yield drain()
+
+
+def parquet_csv_chunks(fileobj, batch_size=50000):
+    """
+    Read a Parquet file batch by batch and re-encode it as header-less CSV for COPY FROM
+
+    Returns the file's column names and a generator of CSV byte chunks, one per row batch.
+    A file that is not Parquet, or is corrupt, raises ValueError (possibly only once the
+    chunk holding the damage is read).
+    """
+    import pyarrow.csv
+    import pyarrow.parquet
+
+    try:
+        parquet_file = pyarrow.parquet.ParquetFile(fileobj)
+    except (pyarrow.ArrowException, OSError) as e:
+        raise ValueError(f"Invalid Parquet file: {str(e)}") from e
+    columns = parquet_file.schema_arrow.names
+    write_options = pyarrow.csv.WriteOptions(include_header=False)
+
+    def chunks():
+        try:
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                buffer = io.BytesIO()
+                pyarrow.csv.write_csv(batch, buffer, write_options=write_options)
+                yield buffer.getvalue()
+        except (pyarrow.ArrowException, OSError) as e:
+            # Damaged pages only show up when their batch is decoded
+            raise ValueError(f"Invalid Parquet file: {str(e)}") from e
+
+    return columns, chunks()
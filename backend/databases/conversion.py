@@ -0,0 +1,133 @@
+from psycopg2 import extensions
+
+# PostgreSQL type OIDs (pg_type.oid) for the types we convert
+TIMESTAMP, TIMESTAMPTZ, DATE, TIME, TIMETZ = 1114, 1184, 1082, 1083, 1266
+TIMESTAMP_ARRAY, TIMESTAMPTZ_ARRAY, DATE_ARRAY, TIME_ARRAY, TIMETZ_ARRAY = 1115, 1185, 1182, 1183, 1270
+NUMERIC, NUMERIC_ARRAY = 1700, 1231
+BYTEA, BYTEA_ARRAY = 17, 1001
+INTERVAL, INTERVAL_ARRAY = 1186, 1187
+
+
+def _timestamp_text(value, cursor):
+    # Text output is 'YYYY-MM-DD HH:MM:SS[.ffffff][+TZ]' under DateStyle ISO; keep the
+    # seconds-precision wall time, the same as strftime('%Y-%m-%d %H:%M:%S') gave
+    return value[:19] if value is not None else None
+
+
+def _text(value, cursor):
+    return value
+
+
+def _numeric_float(value, cursor):
+    return float(value) if value is not None else None
+
+
+def _caster(oids, name, cast):
+    return extensions.new_type(oids, name, cast)
+
+
+# Casters that turn the driver's text straight into the value we return, so no datetime,
+# Decimal or memoryview objects are created for these columns at all
+TIMESTAMP_TEXT = _caster((TIMESTAMP, TIMESTAMPTZ), 'DBMS_TIMESTAMP_TEXT', _timestamp_text)
+TEMPORAL_TEXT = _caster((DATE, TIME, TIMETZ), 'DBMS_TEMPORAL_TEXT', _text)
+BYTEA_TEXT = _caster((BYTEA,), 'DBMS_BYTEA_TEXT', _text)  # '\x..' hex text, bytea_output is hex
+NUMERIC_FLOAT = _caster((NUMERIC,), 'DBMS_NUMERIC_FLOAT', _numeric_float)
+NUMERIC_TEXT = _caster((NUMERIC,), 'DBMS_NUMERIC_TEXT', _text)
+
+# Array casters reuse the element caster; psycopg2's built-in array types do not look up
+# casters registered on the cursor for their elements
+TEXT_CASTERS = [
+    TIMESTAMP_TEXT,
+    TEMPORAL_TEXT,
+    BYTEA_TEXT,
+    extensions.new_array_type((TIMESTAMP_ARRAY, TIMESTAMPTZ_ARRAY), 'DBMS_TIMESTAMP_TEXT_ARRAY', TIMESTAMP_TEXT),
+    extensions.new_array_type((DATE_ARRAY, TIME_ARRAY, TIMETZ_ARRAY), 'DBMS_TEMPORAL_TEXT_ARRAY', TEMPORAL_TEXT),
+    extensions.new_array_type((BYTEA_ARRAY,), 'DBMS_BYTEA_TEXT_ARRAY', BYTEA_TEXT),
+]
+NUMERIC_FLOAT_ARRAY = extensions.new_array_type((NUMERIC_ARRAY,), 'DBMS_NUMERIC_FLOAT_ARRAY', NUMERIC_FLOAT)
+NUMERIC_TEXT_ARRAY = extensions.new_array_type((NUMERIC_ARRAY,), 'DBMS_NUMERIC_TEXT_ARRAY', NUMERIC_TEXT)
+
+
+def register_casters(cursor, exact_numeric=False):
+    """
+    Register the result casters on a cursor; must run before cursor.execute()
+
+    numeric becomes a float (what the JSON encoder produced from Decimal anyway) unless
+    exact_numeric is set, in which case the exact text is kept (used for CSV output).
+    """
+    for caster in TEXT_CASTERS:
+        extensions.register_type(caster, cursor)
+    if exact_numeric:
+        extensions.register_type(NUMERIC_TEXT, cursor)
+        extensions.register_type(NUMERIC_TEXT_ARRAY, cursor)
+    else:
+        extensions.register_type(NUMERIC_FLOAT, cursor)
+        extensions.register_type(NUMERIC_FLOAT_ARRAY, cursor)
+
+
+def _interval(value):
+    # Matches the DRF JSONEncoder rendering of timedelta
+    return str(value.total_seconds())
+
+
+def _array(convert):
+    def convert_array(value):
+        return [convert_array(v) if isinstance(v, list) else (convert(v) if v is not None else None) for v in value]
+    return convert_array
+
+
+# Per-column converters for what the casters cannot produce directly. Every other type
+# (integers, floats, text, booleans, json/jsonb already decoded by the driver, uuid which
+# psycopg2 returns as text) passes through untouched
+COLUMN_CONVERTERS = {
+    INTERVAL: _interval,
+    INTERVAL_ARRAY: _array(_interval),
+}
+
+
+class ConversionPlan:
+    """
+    Converts result rows to JSON-ready values, decided once per result from cursor.description
+
+    Columns with no converter are left as they are; only the indexes that need work are
+    visited for each row, and batches with nothing to convert are returned unchanged.
+    """
+
+    def __init__(self, description):
+        self.converters = []
+        for index, column in enumerate(description or []):
+            convert = COLUMN_CONVERTERS.get(column[1])
+            if convert:
+                self.converters.append((index, convert))
+
+    def rows(self, rows):
+        """Convert a batch of rows"""
+        if not self.converters:
+            return rows
+
+        converted = []
+        for row in rows:
+            row = list(row)
+            for index, convert in self.converters:
+                value = row[index]
+                if value is not None:
+                    row[index] = convert(value)
+            converted.append(row)
+        return converted
+
+
+# Names reported in the column type header; anything else is reported as 'unknown'
+TYPE_NAMES = {
+    16: 'boolean', 17: 'bytea', 18: 'char', 19: 'name', 20: 'bigint', 21: 'smallint', 23: 'integer',
+    25: 'text', 26: 'oid', 114: 'json', 700: 'real', 701: 'double precision', 869: 'inet',
+    1042: 'character', 1043: 'character varying', 1082: 'date', 1083: 'time', 1114: 'timestamp',
+    1184: 'timestamptz', 1186: 'interval', 1266: 'timetz', 1700: 'numeric', 2950: 'uuid', 3802: 'jsonb',
+    1000: 'boolean[]', 1005: 'smallint[]', 1007: 'integer[]', 1009: 'text[]', 1015: 'character varying[]',
+    1016: 'bigint[]', 1021: 'real[]', 1022: 'double precision[]', 1115: 'timestamp[]', 1182: 'date[]',
+    1185: 'timestamptz[]', 1231: 'numeric[]', 2951: 'uuid[]',
+}
+
+
+def column_types(description):
+    """PostgreSQL type name for each column of a cursor.description"""
+    return [TYPE_NAMES.get(column[1], 'unknown') for column in description or []]
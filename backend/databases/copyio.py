@@ -0,0 +1,104 @@
+"""
+File-like adapters between psycopg2's COPY and HTTP uploads and streamed responses
+"""
+import queue
+
+from django.conf import settings
+
+# Marks the end of a COPY in the chunk queue
+COPY_DONE = object()
+
+
+class CopyAborted(Exception):
+    """Raised inside copy_expert when the consumer stopped reading"""
+
+
+class QueueWriter:
+    """
+    Target for copy_expert(COPY ... TO STDOUT) that hands the data to a bounded queue
+
+    psycopg2 calls write() once per row, so rows are gathered into chunks of about
+    QUERY_EXPORT_CHUNK_BYTES before being queued. A full queue blocks the COPY, which keeps
+    memory bounded when the HTTP client reads slower than the database produces.
+    """
+
+    def __init__(self, chunk_bytes=None, max_chunks=None):
+        self.chunk_bytes = chunk_bytes or getattr(settings, 'QUERY_EXPORT_CHUNK_BYTES', 256 * 1024)
+        self.chunks = queue.Queue(maxsize=max_chunks or getattr(settings, 'QUERY_EXPORT_QUEUE_CHUNKS', 16))
+        self.closed = False
+        self._buffer = bytearray()
+
+    def write(self, data):
+        if self.closed:
+            raise CopyAborted("Export consumer went away")
+        self._buffer += data if isinstance(data, bytes) else data.encode('utf-8')
+        if len(self._buffer) >= self.chunk_bytes:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def put(self, item):
+        """Queue an item, giving up once the consumer has closed the writer"""
+        while not self.closed:
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise CopyAborted("Export consumer went away")
+
+    def finish(self, error=None):
+        """Called by the COPY thread when it is done; error is the exception that stopped it, if any"""
+        try:
+            if error is None:
+                self.flush()
+            self.put(error if error is not None else COPY_DONE)
+        except CopyAborted:
+            pass
+
+    def close(self):
+        """Called by the consumer; makes any further write() fail so the COPY stops"""
+        self.closed = True
+
+
+class CountingReader:
+    """Source for copy_expert(COPY ... FROM STDIN) that reads an uploaded file and counts the bytes"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.fileobj.readline(size)
+        self.bytes += len(data)
+        return data
+
+
+class IterReader:
+    """Source for copy_expert(COPY ... FROM STDIN) over an iterator of byte chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b''
+        self.bytes = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size < 0:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.bytes += len(data)
+        return data
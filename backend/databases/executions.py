@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+# Sessions running a tracked query carry this prefix in application_name, so any worker
+# process can find (and cancel) them through pg_stat_activity
+APPLICATION_NAME_PREFIX = 'dbms-query:'
+
+
+def application_name(database_id, execution_id):
+    """
+    application_name for a tracked query: the ClientDatabase pk plus a digest of the execution id
+
+    Execution ids are chosen by clients, so the pk keeps one user's cancel from reaching a query
+    another user runs on the same server under the same id. The id is hashed because Postgres
+    truncates application_name to 63 bytes.
+    """
+    digest = hashlib.sha256(execution_id.encode('utf-8')).hexdigest()[:32]
+    return f"{APPLICATION_NAME_PREFIX}{database_id}:{digest}"
+
+
+class ExecutionRegistry:
+    """
+    Tracks queries currently running against client databases in this process
+
+    Entries are keyed by (database id, execution id): execution ids are chosen by clients,
+    so two databases may each be running a query under the same id.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = {}  # (database id, execution id) -> execution info
+
+    def register(self, database_id, execution_id, backend_pid, query, owner_id=None):
+        with self._lock:
+            self._running[(database_id, execution_id)] = {
+                'execution_id': execution_id,
+                'database_id': database_id,
+                'owner_id': owner_id,
+                'backend_pid': backend_pid,
+                'query': query,
+                'started_at': time.time(),
+                'cancel_requested': False,
+            }
+
+    def unregister(self, database_id, execution_id):
+        with self._lock:
+            return self._running.pop((database_id, execution_id), None)
+
+    def get(self, database_id, execution_id):
+        with self._lock:
+            execution = self._running.get((database_id, execution_id))
+            return dict(execution) if execution else None
+
+    def mark_cancelled(self, database_id, execution_id):
+        with self._lock:
+            execution = self._running.get((database_id, execution_id))
+            if execution:
+                execution['cancel_requested'] = True
+
+    def running(self, database_id):
+        """Executions in progress for a database, oldest first"""
+        now = time.time()
+        with self._lock:
+            executions = [dict(e) for e in self._running.values() if e['database_id'] == database_id]
+        for execution in executions:
+            execution['elapsed'] = round(now - execution['started_at'], 3)
+        return sorted(executions, key=lambda e: e['started_at'])
+
+
+# Shared by every DatabaseConnector in this process
+execution_registry = ExecutionRegistry()
+
+
+_query_executor = None
+_query_executor_lock = threading.Lock()
+
+
+def get_query_executor():
+    """Thread pool that async views use to run blocking psycopg2 calls off the event loop"""
+    global _query_executor
+    if _query_executor is None:
+        with _query_executor_lock:
+            if _query_executor is None:
+                _query_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'CLIENT_DB_ASYNC_WORKERS', 100),
+                    thread_name_prefix='client-query',
+                )
+    return _query_executor
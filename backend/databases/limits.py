@@ -0,0 +1,93 @@
+from django.conf import settings
+
+
+class QueryLimitExceeded(Exception):
+    """Raised when a result exceeds a row or byte budget and the caller asked for an error instead of truncation"""
+
+
+class CostLimitExceeded(Exception):
+    """Raised before execution when the planner's estimate is over the database's cost guard thresholds"""
+
+    def __init__(self, message, estimate, override_required=False):
+        super().__init__(message)
+        self.estimate = estimate
+        self.override_required = override_required
+
+
+def cost_policy(database_obj):
+    """Effective cost guard settings for a database: mode, plan cost and row thresholds, auto LIMIT"""
+    return {
+        'mode': database_obj.cost_guard_mode,
+        'max_cost': database_obj.max_plan_cost or getattr(settings, 'QUERY_MAX_PLAN_COST', 10000000.0),
+        'max_rows': database_obj.max_plan_rows or getattr(settings, 'QUERY_MAX_PLAN_ROWS', 10000000),
+        'auto_limit': database_obj.auto_limit,
+    }
+
+
+def check_plan_estimate(policy, estimate, override=False):
+    """Raise CostLimitExceeded when a plan estimate is over the policy's thresholds and may not run"""
+    over = []
+    if estimate['total_cost'] > policy['max_cost']:
+        over.append(f"estimated cost {estimate['total_cost']:,.0f} exceeds {policy['max_cost']:,.0f}")
+    if estimate['estimated_rows'] > policy['max_rows']:
+        over.append(f"estimated rows {estimate['estimated_rows']:,} exceed {policy['max_rows']:,}")
+    if not over:
+        return False
+
+    if policy['mode'] == 'override':
+        if override:
+            return True
+        raise CostLimitExceeded(
+            f"Query needs an explicit override: {'; '.join(over)}", estimate, override_required=True
+        )
+    raise CostLimitExceeded(f"Query rejected by the cost guard: {'; '.join(over)}", estimate)
+
+
+def query_limits(database_obj):
+    """Effective statement timeout (ms), row cap and byte budget for a database"""
+    return {
+        'statement_timeout': database_obj.statement_timeout or getattr(settings, 'QUERY_STATEMENT_TIMEOUT_MS', 30000),
+        'max_rows': database_obj.max_result_rows or getattr(settings, 'QUERY_MAX_ROWS', 1000000),
+        'max_bytes': database_obj.max_result_bytes or getattr(settings, 'QUERY_MAX_BYTES', 256 * 1024 * 1024),
+    }
+
+
+class ResultBudget:
+    """Counts rows and approximate bytes as batches are fetched and cuts the result off at the limits"""
+
+    def __init__(self, max_rows, max_bytes):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.rows = 0
+        self.bytes = 0
+        self.exceeded = None  # 'max_rows' or 'max_bytes' once a limit is hit
+
+    def _estimate_bytes(self, rows):
+        # Size a sample of the batch rather than every row
+        step = max(len(rows) // 20, 1)
+        sample = rows[::step]
+        return sum(len(repr(row)) for row in sample) * len(rows) // len(sample)
+
+    def take(self, rows):
+        """Return the part of a fetched batch that fits in the remaining budget"""
+        if self.exceeded or not rows:
+            return []
+
+        if self.rows + len(rows) > self.max_rows:
+            rows = rows[:self.max_rows - self.rows]
+            self.exceeded = 'max_rows'
+
+        size = self._estimate_bytes(rows) if rows else 0
+        if self.bytes + size > self.max_bytes:
+            # Keep the share of the batch that still fits
+            keep = int(len(rows) * (self.max_bytes - self.bytes) / size)
+            rows = rows[:keep]
+            size = self._estimate_bytes(rows) if rows else 0
+            self.exceeded = 'max_bytes'
+
+        self.rows += len(rows)
+        self.bytes += size
+        return rows
+
+    def limit_value(self):
+        return self.max_rows if self.exceeded == 'max_rows' else self.max_bytes
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0003_erdiagram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='max_result_bytes',
+            field=models.BigIntegerField(blank=True, help_text='Approximate maximum bytes fetched per query', null=True),
+        ),
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='max_result_rows',
+            field=models.IntegerField(blank=True, help_text='Maximum rows fetched per query', null=True),
+        ),
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='statement_timeout',
+            field=models.IntegerField(blank=True, help_text='Statement timeout in milliseconds', null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0004_query_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='replica_selection',
+            field=models.CharField(choices=[('round_robin', 'Round robin'), ('least_latency', 'Least latency')], default='round_robin', help_text='How SELECT-only queries pick a read replica', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='DatabaseReplica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(max_length=255)),
+                ('port', models.IntegerField(default=5432)),
+                ('username', models.CharField(blank=True, default='', max_length=255)),
+                ('password', models.CharField(blank=True, default='', max_length=255)),
+                ('enabled', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('database', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='replicas', to='databases.clientdatabase')),
+            ],
+        ),
+    ]
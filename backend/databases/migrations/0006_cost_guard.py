@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0005_read_replicas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='auto_limit',
+            field=models.IntegerField(blank=True, help_text='LIMIT added to SELECTs that have none', null=True),
+        ),
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='cost_guard_mode',
+            field=models.CharField(choices=[('off', 'Off'), ('reject', 'Reject'), ('override', 'Require override')], default='off', help_text='Check the EXPLAIN estimate before running a statement', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='max_plan_cost',
+            field=models.FloatField(blank=True, help_text='Maximum estimated plan cost', null=True),
+        ),
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='max_plan_rows',
+            field=models.BigIntegerField(blank=True, help_text='Maximum estimated result rows', null=True),
+        ),
+    ]
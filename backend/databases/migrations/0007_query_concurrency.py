@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0006_cost_guard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clientdatabase',
+            name='max_concurrent_queries',
+            field=models.IntegerField(blank=True, help_text='Queries allowed to run at once per worker process', null=True),
+        ),
+    ]
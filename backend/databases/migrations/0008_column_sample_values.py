@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0007_query_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='columnmetadata',
+            name='sample_values',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
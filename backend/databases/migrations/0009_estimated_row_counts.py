@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+def mark_existing_counts_exact(apps, schema_editor):
+    # Counts stored before this migration came from COUNT(*)
+    TableMetadata = apps.get_model('databases', 'TableMetadata')
+    TableMetadata.objects.filter(row_count__isnull=False).update(row_count_estimated=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('databases', '0008_column_sample_values'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tablemetadata',
+            name='count_rows_exactly',
+            field=models.BooleanField(default=False, help_text='Count rows with COUNT(*) during metadata extraction'),
+        ),
+        migrations.AddField(
+            model_name='tablemetadata',
+            name='row_count_estimated',
+            field=models.BooleanField(default=True, help_text='row_count is a planner estimate, not an exact count'),
+        ),
+        migrations.AlterField(
+            model_name='tablemetadata',
+            name='row_count',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_existing_counts_exact, migrations.RunPython.noop),
+    ]
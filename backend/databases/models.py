@@ -13,6 +13,19 @@ CONNECTION_STATUS = [
     ('error', 'Error'),
 ]
 
+# How read-only queries choose among a database's replicas
+REPLICA_SELECTION = [
+    ('round_robin', 'Round robin'),
+    ('least_latency', 'Least latency'),
+]
+
+# What execute_query does when EXPLAIN estimates a statement over the cost thresholds
+COST_GUARD_MODES = [
+    ('off', 'Off'),
+    ('reject', 'Reject'),
+    ('override', 'Require override'),
+]
+
 class ClientDatabase(models.Model):
     """Represents a client's database connection"""
     name = models.CharField(max_length=255)
@@ -33,10 +46,42 @@ class ClientDatabase(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     last_metadata_update = models.DateTimeField(null=True, blank=True)
     connection_status = models.CharField(max_length=20, choices=CONNECTION_STATUS, default='disconnected')
+    # Query guards; null falls back to the QUERY_* defaults in settings
+    statement_timeout = models.IntegerField(null=True, blank=True, help_text="Statement timeout in milliseconds")
+    max_result_rows = models.IntegerField(null=True, blank=True, help_text="Maximum rows fetched per query")
+    max_result_bytes = models.BigIntegerField(null=True, blank=True, help_text="Approximate maximum bytes fetched per query")
+    replica_selection = models.CharField(max_length=20, choices=REPLICA_SELECTION, default='round_robin',
+                                         help_text="How SELECT-only queries pick a read replica")
+    # Hash of all table fingerprints at the last extraction; unchanged means nothing to re-extract
+    schema_fingerprint = models.CharField(max_length=64, blank=True, default='')
+    # Cost admission guard; null thresholds fall back to QUERY_MAX_PLAN_* in settings
+    cost_guard_mode = models.CharField(max_length=20, choices=COST_GUARD_MODES, default='off',
+                                       help_text="Check the EXPLAIN estimate before running a statement")
+    max_plan_cost = models.FloatField(null=True, blank=True, help_text="Maximum estimated plan cost")
+    max_plan_rows = models.BigIntegerField(null=True, blank=True, help_text="Maximum estimated result rows")
+    auto_limit = models.IntegerField(null=True, blank=True,
+                                     help_text="LIMIT added to SELECTs that have none")
+    max_concurrent_queries = models.IntegerField(null=True, blank=True,
+                                                 help_text="Queries allowed to run at once per worker process")
     
     def __str__(self):
         return f"{self.name} ({self.database_type})"
 
+class DatabaseReplica(models.Model):
+    """A read replica of a client database; SELECT-only queries are routed to enabled replicas"""
+    database = models.ForeignKey(ClientDatabase, on_delete=models.CASCADE, related_name='replicas')
+    host = models.CharField(max_length=255)
+    port = models.IntegerField(default=5432)
+    # Credentials default to the primary's when left empty
+    username = models.CharField(max_length=255, blank=True, default='')
+    password = models.CharField(max_length=255, blank=True, default='')
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.host}:{self.port} (replica of {self.database.name})"
+
 class TableMetadata(models.Model):
     """Stores metadata about database tables"""
     database = models.ForeignKey(ClientDatabase, on_delete=models.CASCADE, related_name='tables')
@@ -44,7 +89,12 @@ class TableMetadata(models.Model):
     table_name = models.CharField(max_length=255)
     table_type = models.CharField(max_length=50)  # table, view, etc.
     description = models.TextField(null=True, blank=True)
-    row_count = models.IntegerField(null=True, blank=True)
+    row_count = models.BigIntegerField(null=True, blank=True)
+    # Counts come from planner statistics unless the table opts in to COUNT(*) at extraction
+    row_count_estimated = models.BooleanField(default=True, help_text="row_count is a planner estimate, not an exact count")
+    count_rows_exactly = models.BooleanField(default=False, help_text="Count rows with COUNT(*) during metadata extraction")
+    # Catalog hash (pg_class xmin, attributes, constraints, comments) at the last extraction
+    fingerprint = models.CharField(max_length=32, blank=True, default='')
     embedding_vector = models.JSONField(null=True, blank=True)  # For semantic search
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -65,6 +115,7 @@ class ColumnMetadata(models.Model):
     is_foreign_key = models.BooleanField(default=False)
     description = models.TextField(null=True, blank=True)
     embedding_vector = models.JSONField(null=True, blank=True)  # For semantic search
+    sample_values = models.JSONField(null=True, blank=True)  # Distinct values from a table sample, for descriptions
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -0,0 +1,117 @@
+import json
+
+from django.conf import settings
+
+from .cache import LRUCache
+from .sqltools import sql_fingerprint
+
+
+def _walk(node, depth=0):
+    """Yield (node, depth) for a plan node and all of its children"""
+    yield node, depth
+    for child in node.get('Plans', []):
+        yield from _walk(child, depth + 1)
+
+
+def _relation(node):
+    # Schema is only reported by EXPLAIN VERBOSE; without it the bare name is all we know
+    if 'Relation Name' not in node:
+        return None
+    if 'Schema' not in node:
+        return node['Relation Name']
+    return f"{node['Schema']}.{node['Relation Name']}"
+
+
+def _exclusive(node, analyzed):
+    """Cost (or, with ANALYZE, milliseconds) spent in a node itself, excluding its children"""
+    if analyzed:
+        def total(n):
+            return n.get('Actual Total Time', 0.0) * n.get('Actual Loops', 1)
+    else:
+        def total(n):
+            return n.get('Total Cost', 0.0)
+    return max(total(node) - sum(total(child) for child in node.get('Plans', [])), 0.0)
+
+
+def digest_plan(explain_output, table_rows=None, top_nodes=5):
+    """
+    Summarize EXPLAIN (FORMAT JSON, VERBOSE) output
+
+    Reports the total cost and estimated rows, the nodes with the highest exclusive cost
+    (or time, for ANALYZE plans) and sequential scans over tables with at least
+    EXPLAIN_LARGE_TABLE_ROWS rows. table_rows maps 'schema.table' to a known row count;
+    without one the planner's row estimate for the scan is used.
+    """
+    entry = explain_output[0]
+    root = entry['Plan']
+    analyzed = 'Actual Total Time' in root
+    table_rows = table_rows or {}
+    large_table_rows = getattr(settings, 'EXPLAIN_LARGE_TABLE_ROWS', 100000)
+
+    nodes = []
+    seq_scans = []
+    for node, depth in _walk(root):
+        relation = _relation(node)
+        nodes.append({
+            'node_type': node['Node Type'],
+            'relation': relation,
+            'depth': depth,
+            'exclusive': round(_exclusive(node, analyzed), 3),
+            'estimated_rows': node.get('Plan Rows'),
+            'actual_rows': node.get('Actual Rows'),
+        })
+        if node['Node Type'] == 'Seq Scan':
+            rows = table_rows.get(relation)
+            if rows is None:
+                rows = node.get('Plan Rows', 0)
+            if rows >= large_table_rows:
+                seq_scans.append({'relation': relation, 'table_rows': rows, 'filter': node.get('Filter')})
+
+    summary = {
+        'total_cost': root.get('Total Cost'),
+        'startup_cost': root.get('Startup Cost'),
+        'estimated_rows': root.get('Plan Rows'),
+        'analyzed': analyzed,
+        'slowest_nodes': sorted(nodes, key=lambda n: n['exclusive'], reverse=True)[:top_nodes],
+        'large_seq_scans': seq_scans,
+        'warnings': [
+            f"Sequential scan on {scan['relation']} (~{scan['table_rows']:,} rows)" for scan in seq_scans
+        ],
+    }
+    if analyzed:
+        summary['actual_rows'] = root.get('Actual Rows')
+        summary['planning_time_ms'] = entry.get('Planning Time')
+        summary['execution_time_ms'] = entry.get('Execution Time')
+    return summary
+
+
+class PlanCache:
+    """
+    Caches EXPLAIN output (without ANALYZE) per database
+
+    Keys include the SQL fingerprint, the params and the database's schema version
+    (its last metadata extraction time), so plans are re-computed after schema changes.
+    """
+
+    def __init__(self):
+        self._cache = LRUCache(
+            max_bytes=getattr(settings, 'EXPLAIN_CACHE_MAX_BYTES', 16 * 1024 * 1024),
+            ttl=getattr(settings, 'EXPLAIN_CACHE_TTL', 600),
+        )
+
+    def make_key(self, database_obj, query, params=None):
+        schema_version = database_obj.last_metadata_update.isoformat() if database_obj.last_metadata_update else None
+        return (database_obj.pk, sql_fingerprint(query), json.dumps(params, sort_keys=True, default=str), schema_version)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def put(self, key, plan):
+        self._cache.set(key, plan, len(json.dumps(plan)))
+
+    def invalidate(self, database_id):
+        return self._cache.delete_where(lambda key: key[0] == database_id)
+
+
+# Shared by every DatabaseConnector in this process
+plan_cache = PlanCache()
@@ -0,0 +1,332 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available within the pool timeout"""
+
+
+def connection_params(database_obj):
+    """Build the psycopg2.connect() arguments for a ClientDatabase"""
+    return {
+        'dbname': database_obj.database_name,
+        'user': database_obj.username,
+        'password': database_obj.password,
+        'host': database_obj.host,
+        'port': database_obj.port,
+        'connect_timeout': 5,
+    }
+
+
+def replica_connection_params(database_obj, replica):
+    """psycopg2.connect() arguments for a DatabaseReplica, falling back to the primary's credentials"""
+    params = connection_params(database_obj)
+    params.update({
+        'host': replica.host,
+        'port': replica.port,
+        'user': replica.username or database_obj.username,
+        'password': replica.password or database_obj.password,
+    })
+    return params
+
+
+def replica_owner_key(replica_id):
+    """Pool registry key for a replica, kept apart from the primary's key (the database id)"""
+    return f"replica:{replica_id}"
+
+
+def credentials_fingerprint(params):
+    """Stable hash of connection arguments, used as the pool key (keeps passwords out of the key)"""
+    raw = '\x1f'.join(f"{key}={params[key]}" for key in sorted(params))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections sharing one set of credentials
+
+    Connections are opened on demand; min_size only keeps that many open when idle ones
+    are evicted, it does not pre-open them.
+    """
+
+    def __init__(self, params, min_size=1, max_size=10, max_idle=300, health_check_after=30, timeout=10):
+        self.params = params
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, last_used) pairs, most recently used last
+        self._size = 0  # open connections, idle or checked out
+        self._in_use = 0
+        self._closed = False
+
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.params)
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['closed'] += 1
+
+    def _is_healthy(self, conn, last_used):
+        """Check a connection taken from the idle list before handing it out"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self):
+        """Detach idle connections past max_idle, keeping at least min_size open (caller holds the lock)"""
+        evicted = []
+        now = time.monotonic()
+        # Oldest connections sit at the front of the idle list
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            evicted.append(conn)
+        return evicted
+
+    def getconn(self):
+        """Check out a connection, waiting up to the pool timeout when the pool is exhausted"""
+        deadline = time.monotonic() + self.timeout
+        wait_started = None
+        conn = None
+        last_used = None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool has been closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve a slot and open the connection outside the lock
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    if wait_started is not None:
+                        self._stats['wait_time'] += time.monotonic() - wait_started
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a connection "
+                        f"({self.max_size} connections in use)"
+                    )
+                if wait_started is None:
+                    wait_started = time.monotonic()
+                    self._stats['waits'] += 1
+                self._cond.wait(remaining)
+
+            if wait_started is not None:
+                self._stats['wait_time'] += time.monotonic() - wait_started
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                self._close_quietly(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            # Give the reserved slot back so waiters can retry
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def _reset_session(self, conn):
+        """
+        Drop session state the last user may have left: SET/SET ROLE, temp tables, prepared
+        statements, advisory locks. Pools are shared by every ClientDatabase with the same
+        credentials, so this must not reach the next user.
+        """
+        conn.autocommit = True  # DISCARD ALL cannot run inside a transaction block
+        with conn.cursor() as cursor:
+            cursor.execute("DISCARD ALL")
+            # psycopg2 sets an ISO DateStyle when it connects; DISCARD ALL reverts to the server default
+            if not (conn.info.parameter_status('DateStyle') or '').startswith('ISO'):
+                cursor.execute("SET DateStyle TO 'ISO'")
+        conn.autocommit = False
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, resetting its session state first (dropped if that fails)"""
+        if not discard and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                else:
+                    if status != extensions.TRANSACTION_STATUS_IDLE:
+                        # Roll back whatever the caller left open so the next user starts clean
+                        conn.rollback()
+                    self._reset_session(conn)
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                to_close = [conn]
+            else:
+                self._idle.append((conn, time.monotonic()))
+                to_close = []
+            to_close.extend(self._evict_idle())
+            self._cond.notify()
+
+        for stale in to_close:
+            self._close_quietly(stale)
+
+    def prune(self):
+        """Close idle connections that exceeded max_idle"""
+        with self._cond:
+            evicted = self._evict_idle()
+        for conn in evicted:
+            self._close_quietly(conn)
+
+    def close(self):
+        """Close idle connections now; checked-out ones are closed when returned"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle = []
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        stats['wait_time'] = round(stats['wait_time'], 6)
+        stats['avg_wait_time'] = round(stats['wait_time'] / stats['waits'], 6) if stats['waits'] else 0.0
+        return stats
+
+
+class PoolRegistry:
+    """Process-wide registry of connection pools keyed by connection credentials"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}  # credentials fingerprint -> ConnectionPool
+        self._owners = {}  # owner key (e.g. ClientDatabase id) -> credentials fingerprint
+        self._pid = os.getpid()
+
+    def _new_pool(self, params):
+        return ConnectionPool(
+            params,
+            min_size=getattr(settings, 'CLIENT_DB_POOL_MIN_SIZE', 1),
+            max_size=getattr(settings, 'CLIENT_DB_POOL_MAX_SIZE', 10),
+            max_idle=getattr(settings, 'CLIENT_DB_POOL_MAX_IDLE', 300),
+            health_check_after=getattr(settings, 'CLIENT_DB_POOL_HEALTH_CHECK_AFTER', 30),
+            timeout=getattr(settings, 'CLIENT_DB_POOL_TIMEOUT', 10),
+        )
+
+    def _release_fingerprint(self, fingerprint):
+        """Drop a pool once no owner references it (caller holds the lock)"""
+        if fingerprint in self._owners.values():
+            return None
+        return self._pools.pop(fingerprint, None)
+
+    def get_pool(self, owner_key, params):
+        """Return the pool for these credentials, rebuilding it if the owner's credentials changed"""
+        fingerprint = credentials_fingerprint(params)
+        stale = []
+
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: the parent's sockets are not ours to use or close
+                self._pools = {}
+                self._owners = {}
+                self._pid = os.getpid()
+
+            previous = self._owners.get(owner_key)
+            self._owners[owner_key] = fingerprint
+            if previous and previous != fingerprint:
+                logger.info("Credentials changed for %s, rebuilding its connection pool", owner_key)
+                stale.append(self._release_fingerprint(previous))
+
+            pool = self._pools.get(fingerprint)
+            if pool is None:
+                pool = self._new_pool(params)
+                self._pools[fingerprint] = pool
+            pools = list(self._pools.values())
+
+        for old_pool in stale:
+            if old_pool:
+                old_pool.close()
+        # Opportunistically evict idle connections from every pool
+        for other in pools:
+            other.prune()
+        return pool
+
+    def discard(self, owner_key):
+        """Forget an owner (database edited or deleted) and close its pool if nothing else shares it"""
+        with self._lock:
+            fingerprint = self._owners.pop(owner_key, None)
+            pool = self._release_fingerprint(fingerprint) if fingerprint else None
+        if pool:
+            pool.close()
+
+    def stats(self, owner_key):
+        """Usage counters for the pool currently serving an owner"""
+        with self._lock:
+            fingerprint = self._owners.get(owner_key)
+            pool = self._pools.get(fingerprint) if fingerprint else None
+        if pool is None:
+            return None
+        return pool.stats()
+
+
+# Shared by every DatabaseConnector in this process
+pool_registry = PoolRegistry()
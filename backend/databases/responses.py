@@ -0,0 +1,86 @@
+import datetime
+import decimal
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the brotli package is installed
+    brotli = None
+
+
+def _default(value):
+    """Types orjson does not encode natively, rendered the way the DRF encoder does"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.timedelta):
+        return str(value.total_seconds())
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(data):
+    """Encode data as compact JSON bytes, using orjson when it is available"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; the standard encoder handles those
+            pass
+    return json.dumps(data, cls=JSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def _accepted_encodings(header):
+    """Content codings from an Accept-Encoding header, skipping any sent with q=0"""
+    encodings = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            encodings.add(coding)
+    return encodings
+
+
+def query_result_response(request, result, status=200):
+    """
+    Build the HTTP response for a query result without going through a serializer
+
+    Rows come straight from the connector, already converted to JSON-friendly values, so
+    they are encoded once and never re-validated. Bodies above QUERY_RESPONSE_COMPRESS_MIN_BYTES
+    are compressed with brotli or gzip when the client accepts it.
+    """
+    body = encode_json(result)
+    response = HttpResponse(status=status, content_type='application/json')
+    patch_vary_headers(response, ('Accept-Encoding',))
+
+    if len(body) >= getattr(settings, 'QUERY_RESPONSE_COMPRESS_MIN_BYTES', 1024):
+        accepted = _accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            body = brotli.compress(body, quality=getattr(settings, 'QUERY_RESPONSE_BROTLI_QUALITY', 4))
+            response['Content-Encoding'] = 'br'
+        elif 'gzip' in accepted:
+            body = compress_string(body)
+            response['Content-Encoding'] = 'gzip'
+
+    response.content = body
+    return response
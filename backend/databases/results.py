@@ -0,0 +1,215 @@
+import json
+import os
+import re
+import stat
+import struct
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .responses import encode_json
+
+HANDLE_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+OFFSET_FORMAT = struct.Struct('<Q')
+
+
+_verified_dirs = set()
+
+
+def _spill_dir():
+    path = getattr(settings, 'QUERY_RESULT_SPILL_DIR', None) or os.path.join(tempfile.gettempdir(), 'dbms_query_results')
+    if path in _verified_dirs:
+        return path
+    # Results hold query output, so only this user may read them; the default lives in the shared temp dir
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"Query result spill directory {path} is not a directory owned by this user")
+    if stat.S_IMODE(info.st_mode) & 0o077:
+        os.chmod(path, 0o700)
+    _verified_dirs.add(path)
+    return path
+
+
+def _ttl():
+    return getattr(settings, 'QUERY_RESULT_TTL', 900)
+
+
+class SpilledResult:
+    """
+    A query result written to local files so any page can be read back without re-running the query
+
+    Three files share the handle as their name: <handle>.rows holds one JSON array per row,
+    <handle>.idx holds the byte offset of every row and <handle>.json holds the columns,
+    row count and the query that produced the result. The TTL slides on every read.
+    While the result is still being written, complete is False and total_rows counts the
+    rows written so far.
+    """
+
+    def __init__(self, handle, meta):
+        self.handle = handle
+        self.meta = meta
+
+    @property
+    def columns(self):
+        return self.meta['columns']
+
+    @property
+    def total_rows(self):
+        return self.meta['total_rows']
+
+    @property
+    def complete(self):
+        return self.meta.get('complete', True)
+
+    def _path(self, suffix):
+        return os.path.join(_spill_dir(), f"{self.handle}.{suffix}")
+
+    def read(self, offset, limit):
+        """Read up to limit rows starting at row number offset"""
+        offset = max(offset, 0)
+        count = max(min(limit, self.total_rows - offset), 0)
+        if count == 0:
+            return []
+
+        with open(self._path('idx'), 'rb') as index_file:
+            index_file.seek(offset * OFFSET_FORMAT.size)
+            (start,) = OFFSET_FORMAT.unpack(index_file.read(OFFSET_FORMAT.size))
+
+        rows = []
+        with open(self._path('rows'), 'rb') as rows_file:
+            rows_file.seek(start)
+            for _ in range(count):
+                rows.append(json.loads(rows_file.readline()))
+
+        # Sliding expiry: reading a page keeps the result alive
+        os.utime(self._path('json'))
+        return rows
+
+
+class SpilledResultWriter:
+    """
+    Writes rows for a new SpilledResult batch by batch
+
+    The result is published after every batch, so its pages can be read while the rest is
+    still being written.
+    """
+
+    def __init__(self, database_id, columns, query, params, column_types=None):
+        self.handle = uuid.uuid4().hex
+        self.meta = {
+            'database_id': database_id,
+            'columns': columns,
+            'column_types': column_types or [],
+            'query': query,
+            'params': params,
+            'total_rows': 0,
+            'complete': False,
+        }
+        directory = _spill_dir()
+        self._rows_file = open(os.path.join(directory, f"{self.handle}.rows"), 'wb')
+        self._index_file = open(os.path.join(directory, f"{self.handle}.idx"), 'wb')
+
+    def write(self, rows):
+        position = self._rows_file.tell()
+        index = bytearray()
+        lines = []
+        for row in rows:
+            line = encode_json(row) + b'\n'
+            index += OFFSET_FORMAT.pack(position)
+            position += len(line)
+            lines.append(line)
+        self._rows_file.write(b''.join(lines))
+        self._index_file.write(index)
+        # Rows must be on disk before the metadata that counts them
+        self._rows_file.flush()
+        self._index_file.flush()
+        self.meta['total_rows'] += len(rows)
+        self._publish()
+
+    def _publish(self):
+        meta_path = os.path.join(_spill_dir(), f"{self.handle}.json")
+        # Replace the metadata atomically, so readers never see a half-written file
+        with open(meta_path + '.tmp', 'w') as meta_file:
+            json.dump(self.meta, meta_file, cls=JSONEncoder)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def close(self, truncated=None):
+        """Finish writing and mark the result complete; truncated names the limit that cut it off"""
+        self._rows_file.close()
+        self._index_file.close()
+        self.meta['complete'] = True
+        if truncated:
+            self.meta['truncated'] = truncated
+        self._publish()
+        return SpilledResult(self.handle, self.meta)
+
+    def fail(self, message, error_type):
+        """Stop writing after an error; the rows written so far stay readable"""
+        self._rows_file.close()
+        self._index_file.close()
+        self.meta['complete'] = True
+        self.meta['error'] = message
+        self.meta['error_type'] = error_type
+        self._publish()
+
+    def abort(self):
+        """Throw away a partially written result"""
+        self._rows_file.close()
+        self._index_file.close()
+        ResultStore.delete(self.handle)
+
+
+class ResultStore:
+    """Looks up and expires spilled query results; shared by all workers on the same host"""
+
+    @staticmethod
+    def create(database_obj, columns, query, params=None, column_types=None):
+        ResultStore.purge_expired()
+        return SpilledResultWriter(database_obj.pk, columns, query, params, column_types)
+
+    @staticmethod
+    def get(handle, database_obj):
+        """Return the SpilledResult for a handle if it exists, has not expired and belongs to the database"""
+        if not handle or not HANDLE_PATTERN.match(handle):
+            return None
+        meta_path = os.path.join(_spill_dir(), f"{handle}.json")
+        try:
+            if time.time() - os.path.getmtime(meta_path) > _ttl():
+                ResultStore.delete(handle)
+                return None
+            with open(meta_path) as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('database_id') != database_obj.pk:
+            return None
+        return SpilledResult(handle, meta)
+
+    @staticmethod
+    def delete(handle):
+        for suffix in ('json', 'json.tmp', 'rows', 'idx'):
+            try:
+                os.remove(os.path.join(_spill_dir(), f"{handle}.{suffix}"))
+            except OSError:
+                pass
+
+    @staticmethod
+    def purge_expired():
+        """Remove results whose TTL has passed"""
+        directory = _spill_dir()
+        cutoff = time.time() - _ttl()
+        for name in os.listdir(directory):
+            handle, _, suffix = name.partition('.')
+            if suffix != 'json' and os.path.exists(os.path.join(directory, f"{handle}.json")):
+                # Data files live as long as their metadata file
+                continue
+            try:
+                if os.path.getmtime(os.path.join(directory, name)) < cutoff:
+                    ResultStore.delete(handle)
+            except OSError:
+                continue
@@ -0,0 +1,78 @@
+import itertools
+import threading
+import time
+
+from django.conf import settings
+
+from .breaker import OPEN, breaker_registry
+from .pool import replica_owner_key
+
+
+class ReplicaRouter:
+    """
+    Chooses the read replica for SELECT-only work and remembers replica health and latency
+
+    Each database's enabled replicas are loaded from the ORM and reused for
+    REPLICA_REFRESH_INTERVAL seconds. Replicas whose circuit breaker is open are skipped.
+    Latency is a moving average of the first round trip on each checked-out connection.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._replicas = {}  # database id -> (loaded at, [DatabaseReplica])
+        self._counters = {}  # database id -> round robin counter
+        self._latency = {}  # replica id -> smoothed seconds
+
+    def replicas(self, database_obj):
+        """Enabled replicas of a database (cached)"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._replicas.get(database_obj.pk)
+        if cached and now - cached[0] < getattr(settings, 'REPLICA_REFRESH_INTERVAL', 30):
+            return cached[1]
+
+        replicas = list(database_obj.replicas.filter(enabled=True).order_by('pk'))
+        with self._lock:
+            self._replicas[database_obj.pk] = (now, replicas)
+        return replicas
+
+    def candidates(self, database_obj):
+        """Healthy replicas in the order they should be tried, according to replica_selection"""
+        replicas = self.replicas(database_obj)
+        if not replicas:
+            return []
+
+        healthy = [r for r in replicas if breaker_registry.get(replica_owner_key(r.pk)).available()]
+        with self._lock:
+            if not healthy:
+                return []
+            if database_obj.replica_selection == 'least_latency':
+                # Replicas without a measurement yet go first so they get one
+                return sorted(healthy, key=lambda r: self._latency.get(r.pk, 0.0))
+            counter = self._counters.setdefault(database_obj.pk, itertools.count())
+            start = next(counter) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def record_latency(self, replica_id, seconds):
+        with self._lock:
+            previous = self._latency.get(replica_id)
+            self._latency[replica_id] = seconds if previous is None else previous * 0.8 + seconds * 0.2
+
+    def invalidate(self, database_id):
+        """Reload the database's replicas on next use (after replicas are added, edited or removed)"""
+        with self._lock:
+            self._replicas.pop(database_id, None)
+
+    def stats(self, replica_id):
+        with self._lock:
+            latency = self._latency.get(replica_id)
+        circuit_state = breaker_registry.state(replica_owner_key(replica_id))
+        return {
+            'latency_ms': round(latency * 1000, 2) if latency is not None else None,
+            'healthy': circuit_state != OPEN,
+            'circuit_state': circuit_state,
+        }
+
+
+# Shared by every DatabaseConnector in this process
+replica_router = ReplicaRouter()
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata
+from .models import ClientDatabase, DatabaseReplica, TableMetadata, ColumnMetadata, RelationshipMetadata
+from .status import connection_status_tracker
+from .routing import replica_router
+from .breaker import OPEN, breaker_registry
 
 class ClientDatabaseSerializer(serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
@@ -11,23 +14,142 @@ class ClientDatabaseSerializer(serializers.ModelSerializer):
             'host', 'port', 'database_name', 'username', 'password',
             'ssl_enabled', 'ssl_ca', 'ssl_cert', 'ssl_key', 
             'created_at', 'updated_at', 'last_metadata_update', 
-            'connection_status'
+            'connection_status', 'statement_timeout', 'max_result_rows', 'max_result_bytes',
+            'replica_selection', 'cost_guard_mode', 'max_plan_cost', 'max_plan_rows', 'auto_limit',
+            'max_concurrent_queries'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'last_metadata_update', 'connection_status']
         extra_kwargs = {
             'password': {'write_only': True}
         }
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Status changes are written back lazily, so report the live in-memory value
+        data['connection_status'] = connection_status_tracker.get(instance.pk, data['connection_status'])
+        # An open circuit breaker means connections are currently being refused up front
+        data['circuit_state'] = breaker_registry.state(instance.pk)
+        if data['circuit_state'] == OPEN:
+            data['connection_status'] = 'error'
+        return data
+
+class DatabaseReplicaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DatabaseReplica
+        fields = ['id', 'database', 'host', 'port', 'username', 'password', 'enabled', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+        extra_kwargs = {
+            'password': {'write_only': True}
+        }
+    
+    def validate_database(self, database):
+        request = self.context.get('request')
+        if request and database.owner_id != request.user.id:
+            raise serializers.ValidationError("Database not found")
+        return database
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Live routing state in this worker process
+        data.update(replica_router.stats(instance.pk))
+        return data
 
 class QueryExecutionSerializer(serializers.Serializer):
     query = serializers.CharField(required=True)
     params = serializers.JSONField(required=False, allow_null=True)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=50000)
+    # Client-chosen id, so the query can be cancelled while this request is still running
+    execution_id = serializers.RegexField(r'^[0-9A-Za-z-]{1,48}$', required=False)
+    bypass_cache = serializers.BooleanField(required=False, default=False)
+    # What to do when a result exceeds the database's row/byte budget
+    on_limit = serializers.ChoiceField(choices=['truncate', 'error'], required=False, default='truncate')
+    # rows: one array per row; columnar: one array per column; arrow: Arrow IPC stream
+    format = serializers.ChoiceField(choices=['rows', 'columnar', 'arrow'], required=False, default='rows')
+    # Run a statement the cost guard flagged (databases with cost_guard_mode='override')
+    override_cost_guard = serializers.BooleanField(required=False, default=False)
+    # Run and commit on the primary, for SELECTs calling functions that write (rows and columnar formats)
+    use_primary = serializers.BooleanField(required=False, default=False)
+
+class ResultPageSerializer(serializers.Serializer):
+    handle = serializers.RegexField(r'^[0-9a-f]{32}$', required=True)
+    offset = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=50000)
+    # Keyset paging: rows ordered by key_column, strictly after the given value
+    key_column = serializers.CharField(required=False)
+    after = serializers.CharField(required=False, allow_null=True)
+    format = serializers.ChoiceField(choices=['rows', 'columnar'], required=False, default='rows')
+
+class QueryStreamSerializer(QueryExecutionSerializer):
+    format = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+    batch_size = serializers.IntegerField(required=False, min_value=1, max_value=50000, default=2000)
+
+class QueryExportSerializer(serializers.Serializer):
+    query = serializers.CharField(required=True)
+    params = serializers.JSONField(required=False, allow_null=True)
+    execution_id = serializers.RegexField(r'^[0-9A-Za-z-]{1,48}$', required=False)
+    # gzip the CSV on the fly (served as a .csv.gz download)
+    compress = serializers.BooleanField(required=False, default=False)
+    # Run a statement the cost guard flagged (databases with cost_guard_mode='override')
+    override_cost_guard = serializers.BooleanField(required=False, default=False)
+
+class DataImportSerializer(serializers.Serializer):
+    file = serializers.FileField(required=True)
+    # Target table, as extracted into TableMetadata for this database
+    table_id = serializers.IntegerField(required=True)
+    format = serializers.ChoiceField(choices=['csv', 'parquet'], required=False, default='csv')
+    header = serializers.BooleanField(required=False, default=True)
+    delimiter = serializers.CharField(required=False, default=',', min_length=1, max_length=1, trim_whitespace=False)
+    # Table columns in file order; defaults to all columns (CSV) or the file's columns (Parquet)
+    columns = serializers.ListField(child=serializers.CharField(), required=False)
+    execution_id = serializers.RegexField(r'^[0-9A-Za-z-]{1,48}$', required=False)
+
+class BatchStatementSerializer(serializers.Serializer):
+    query = serializers.CharField(required=True)
+    params = serializers.JSONField(required=False, allow_null=True)
+    # Run the statement once per parameter set (execute_batch)
+    params_list = serializers.ListField(child=serializers.JSONField(), required=False, allow_null=True)
+    # With params_list: expand the rows into a single VALUES %s (execute_values)
+    values = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data.get('values') and data.get('params_list') is None:
+            raise serializers.ValidationError("values requires params_list")
+        return data
+
+class BatchExecutionSerializer(serializers.Serializer):
+    statements = BatchStatementSerializer(many=True, allow_empty=False, max_length=100)
+    execution_id = serializers.RegexField(r'^[0-9A-Za-z-]{1,48}$', required=False)
+    on_limit = serializers.ChoiceField(choices=['truncate', 'error'], required=False, default='truncate')
+
+class ExplainSerializer(serializers.Serializer):
+    query = serializers.CharField(required=True)
+    params = serializers.JSONField(required=False, allow_null=True)
+    # Run the statement (in a rolled-back transaction) to get actual timings
+    analyze = serializers.BooleanField(required=False, default=False)
+    # With analyze: include shared buffer hits and reads
+    buffers = serializers.BooleanField(required=False, default=False)
+    # Return the raw plan along with the summary
+    include_plan = serializers.BooleanField(required=False, default=True)
+    execution_id = serializers.RegexField(r'^[0-9A-Za-z-]{1,48}$', required=False)
+
+class MetadataExtractionSerializer(serializers.Serializer):
+    # Read the catalog from a replica, if the database has one
+    use_replica = serializers.BooleanField(required=False, default=False)
+    # Re-extract tables whose catalog fingerprint did not change
+    force = serializers.BooleanField(required=False, default=False)
+
+class RowCountSerializer(serializers.Serializer):
+    # TableMetadata ids; defaults to every base table of the database
+    table_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    # Count on a background thread and return right away
+    background = serializers.BooleanField(required=False, default=True)
+    time_budget_ms = serializers.IntegerField(required=False, min_value=100)
+    # Also count these tables exactly on every later extraction
+    always = serializers.BooleanField(required=False, default=False)
+
+class CancelQuerySerializer(serializers.Serializer):
+    execution_id = serializers.RegexField(r'^[0-9A-Za-z-]{1,48}$', required=True)
 
 class ConnectionTestSerializer(serializers.Serializer):
     success = serializers.BooleanField()
     message = serializers.CharField()
-
-class QueryResultSerializer(serializers.Serializer):
-    columns = serializers.ListField(child=serializers.CharField())
-    rows = serializers.ListField()
-    status = serializers.CharField()
-    success = serializers.BooleanField()
\ No newline at end of file
@@ -1,96 +1,340 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
 import psycopg2
+import psycopg2.errors
+import psycopg2.extras
 import pytz
+import queue
+import re
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager, nullcontext
 from datetime import datetime
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
 from .models import ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata, CONNECTION_STATUS
+from .pool import connection_params, pool_registry, replica_connection_params, replica_owner_key
+from .routing import replica_router
+from .breaker import CircuitOpen, breaker_registry
+from .status import connection_status_tracker
+from .results import ResultStore
+from .cache import query_result_cache
+from .plans import digest_plan, plan_cache
+from .limits import (
+    CostLimitExceeded, QueryLimitExceeded, ResultBudget, check_plan_estimate, cost_policy, query_limits
+)
+from .executions import application_name, execution_registry, get_query_executor
+from .workload import QueueTimeout, workload_scheduler
+from .conversion import ConversionPlan, column_types, register_casters
+from .copyio import COPY_DONE, CountingReader, IterReader, QueueWriter
+from .columnar import parquet_csv_chunks
+from .sqltools import add_limit, has_limit, is_explainable, is_select, quote_ident, strip_statement
+
+# Rows pulled from the driver per fetchmany() call
+FETCH_BATCH_SIZE = 2000
+
+RETURNING_PATTERN = re.compile(r'\bRETURNING\b', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
 
 class DatabaseConnector:
     """Handles database connection and basic operations"""
     
     def create_connection(self, database_obj):
-        """Create a connection to the database using stored credentials"""
+        """Create a new, unpooled connection to the database using stored credentials"""
+        breaker = breaker_registry.get(database_obj.pk)
         try:
             if database_obj.database_type == 'postgresql':
-                conn = psycopg2.connect(
-                    dbname=database_obj.database_name,
-                    user=database_obj.username,
-                    password=database_obj.password,
-                    host=database_obj.host,
-                    port=database_obj.port,
-                    connect_timeout=5
-                )
+                breaker.before_call()
+                try:
+                    conn = psycopg2.connect(**connection_params(database_obj))
+                except psycopg2.OperationalError:
+                    breaker.record_failure()
+                    raise
+                except Exception:
+                    breaker.release_probe()
+                    raise
+                breaker.record_success()
                 # Update connection status
-                database_obj.connection_status = 'connected'
-                database_obj.save(update_fields=['connection_status'])
+                connection_status_tracker.set(database_obj, 'connected')
                 return conn
             else:
                 raise ValueError(f"Unsupported database type: {database_obj.database_type}")
         except Exception as e:
             # Update connection status on error
-            database_obj.connection_status = 'error'
-            database_obj.save(update_fields=['connection_status'])
+            connection_status_tracker.set(database_obj, 'error')
+            raise e
+    
+    def get_pool(self, database_obj):
+        """Get the process-wide connection pool for the database's current credentials"""
+        if database_obj.database_type != 'postgresql':
+            raise ValueError(f"Unsupported database type: {database_obj.database_type}")
+        return pool_registry.get_pool(database_obj.pk, connection_params(database_obj))
+    
+    def _checkout(self, pool, breaker):
+        """Get a connection from a pool, reporting the outcome to the endpoint's circuit breaker"""
+        try:
+            conn = pool.getconn()
+        except psycopg2.OperationalError:
+            breaker.record_failure()
+            raise
+        except Exception:
+            # Anything but a failed connect (e.g. an exhausted pool) says nothing about the host
+            # either way: keep the state and counters, just let the next probe through
+            breaker.release_probe()
+            raise
+        breaker.record_success()
+        return conn
+    
+    @contextmanager
+    def connection(self, database_obj, probe=False):
+        """
+        Check out a pooled connection and return it to the pool when the block exits
+        
+        While the database's circuit breaker is open this fails fast with CircuitOpen instead
+        of waiting for connect_timeout; probe=True connects anyway (used by test_connection).
+        """
+        breaker = breaker_registry.get(database_obj.pk)
+        try:
+            breaker.before_call(force=probe)
+            pool = self.get_pool(database_obj)
+            conn = self._checkout(pool, breaker)
+        except Exception as e:
+            # Update connection status on error
+            connection_status_tracker.set(database_obj, 'error')
             raise e
+        
+        connection_status_tracker.set(database_obj, 'connected')
+        try:
+            yield conn
+        finally:
+            # The pool rolls back open transactions and drops broken connections
+            pool.putconn(conn)
+    
+    def get_replica_pool(self, database_obj, replica):
+        """Get the process-wide connection pool for a read replica"""
+        return pool_registry.get_pool(replica_owner_key(replica.pk), replica_connection_params(database_obj, replica))
+    
+    @contextmanager
+    def read_connection(self, database_obj):
+        """
+        Check out a connection for read-only work
+        
+        A healthy replica is picked according to the database's replica_selection policy,
+        falling back to the next replica and finally to the primary. The transaction is
+        READ ONLY wherever it runs.
+        """
+        pool, conn, replica = None, None, None
+        for candidate in replica_router.candidates(database_obj):
+            breaker = breaker_registry.get(replica_owner_key(candidate.pk))
+            try:
+                breaker.before_call()
+                pool = self.get_replica_pool(database_obj, candidate)
+                conn = self._checkout(pool, breaker)
+                replica = candidate
+                break
+            except Exception as e:
+                logger.warning("Replica %s:%s unavailable, trying the next endpoint: %s", candidate.host, candidate.port, e)
+        
+        if conn is None:
+            with self.connection(database_obj) as conn:
+                self._start_read_only(conn)
+                yield conn
+            return
+        
+        try:
+            started = time.monotonic()
+            self._start_read_only(conn)
+            replica_router.record_latency(replica.pk, time.monotonic() - started)
+            yield conn
+        finally:
+            pool.putconn(conn)
+    
+    def _start_read_only(self, conn):
+        # Must be the first statement of the transaction
+        with conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION READ ONLY")
+    
+    def _endpoint_connections(self, database_obj):
+        """Yield a pooled connection to the primary and then to each enabled replica"""
+        with self.connection(database_obj) as conn:
+            yield conn
+        for replica in replica_router.replicas(database_obj):
+            breaker = breaker_registry.get(replica_owner_key(replica.pk))
+            try:
+                breaker.before_call()
+                pool = self.get_replica_pool(database_obj, replica)
+                conn = self._checkout(pool, breaker)
+            except Exception as e:
+                logger.warning("Replica %s:%s unavailable: %s", replica.host, replica.port, e)
+                continue
+            try:
+                yield conn
+            finally:
+                pool.putconn(conn)
+    
+    def purge_cache(self, database_obj):
+        """Drop all cached query results for the database; returns the number of entries removed"""
+        return query_result_cache.invalidate(database_obj.pk)
+    
+    def get_pool_stats(self, database_obj):
+        """Return usage counters for the database's connection pool"""
+        return pool_registry.stats(database_obj.pk)
     
     def test_connection(self, database_obj):
         """Test if the database connection works"""
         try:
-            conn = self.create_connection(database_obj)
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT 1")
-                result = cursor.fetchone()
-            conn.close()
-            database_obj.connection_status = 'disconnected'  # Set to disconnected after successful test
-            database_obj.save(update_fields=['connection_status'])
+            # An explicit test always connects, so it can close an open circuit breaker
+            with self.connection(database_obj, probe=True) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    result = cursor.fetchone()
+            connection_status_tracker.set(database_obj, 'disconnected')  # Set to disconnected after successful test
             return True, "Connection successful"
         except Exception as e:
             return False, str(e)
     
-    def execute_query(self, database_obj, query, params=None):
-        """Execute a SQL query on the database and return results with column names"""
-        results = {"columns": [], "rows": [], "status": "", "execution_time": None}
+    def execute_query(self, database_obj, query, params=None, page_size=None, bypass_cache=False, on_limit='truncate',
+                      execution_id=None, owner_id=None, override_cost_guard=False, admission=None, use_primary=False):
+        """
+        Execute a SQL query on the database and return results with column names
+        
+        When page_size is given and the query is a single SELECT, rows are read from a
+        server-side cursor: the first page is returned directly and, if there are more rows,
+        a result_handle is returned right away while a background thread spills the full
+        result to a ResultStore file, so later pages can be read with fetch_result_page()
+        without re-running the query. Limits hit while spilling are reported on those pages.
+        
+        Results of plain SELECTs are served from the per-database result cache unless
+        bypass_cache is set (which still refreshes the cached entry); any other statement
+        invalidates the database's cached results.
+        
+        The database's statement timeout applies to the transaction, and rows are fetched in
+        batches against its row and byte budget. A result that hits a limit is truncated and
+        flagged with truncated=True, or fails with error_type limit_exceeded when on_limit='error'.
+        
+        While it runs the query is registered under execution_id (generated if not given) so
+        cancel_execution() can stop it from another request.
+        
+        With the database's cost guard on, the statement is planned first and one whose
+        estimated cost or rows exceed the thresholds fails with error_type cost_limit_exceeded
+        (mode 'reject'), or unless override_cost_guard is set (mode 'override'). A SELECT
+        without a LIMIT gets the database's auto_limit appended, if it has one.
+        
+        Queries that are not served from the cache first wait for a slot from the workload
+        scheduler; one that waits too long fails with error_type queue_timeout. A slot already
+        granted by workload_scheduler.aadmit can be passed in as admission instead.
+        
+        Reads go to a replica when the database has one. A SELECT calling a function that writes
+        (other than the built-ins is_select knows) must be sent with use_primary, which runs and
+        commits it on the primary like any other write.
+        """
+        execution_id = execution_id or uuid.uuid4().hex
+        results = {"columns": [], "rows": [], "status": "", "execution_time": None, "execution_id": execution_id}
         start_time = datetime.now()
         
+        read_only = is_select(query) and not use_primary
+        policy = cost_policy(database_obj)
+        if read_only and policy['auto_limit'] and not has_limit(query):
+            query = add_limit(query, policy['auto_limit'])
+            results["rewritten_query"] = query
+        guarded = policy['mode'] != 'off' and is_explainable(query)
+        
+        cache_key = query_result_cache.make_key(database_obj.pk, query, params, page_size) if read_only else None
+        if cache_key and not bypass_cache:
+            cached, counters = query_result_cache.get(cache_key)
+            if cached is not None:
+                if admission is not None:
+                    admission.abandon()
+                # The entry keeps the id and queue wait of the run that filled it
+                return dict(cached, execution_id=execution_id, queue_time=0.0, cache=dict(counters, hit=True))
+        
+        limits = query_limits(database_obj)
+        budget = ResultBudget(limits['max_rows'], limits['max_bytes'])
+        
         try:
-            print(query)
-            conn = self.create_connection(database_obj)
-            with conn.cursor() as cursor:
-                cursor.execute(query, params)
-                
-                # Calculate execution time
-                execution_time = (datetime.now() - start_time).total_seconds()
-                results["execution_time"] = execution_time
-                
-                # Check if query returns data
-                if cursor.description:
-                    # Get column names
-                    results["columns"] = [desc[0] for desc in cursor.description]
+            logger.debug("Executing on database %s: %s", database_obj.pk, query)
+            # SELECT-only statements go to a read replica when the database has one
+            endpoint = self.read_connection(database_obj) if read_only else self.connection(database_obj)
+            with ExitStack() as stack:
+                results["queue_time"] = stack.enter_context(admission or workload_scheduler.admit(database_obj, owner_id))
+                conn = stack.enter_context(endpoint)
+                stack.enter_context(self._running(conn, database_obj, execution_id, query, owner_id))
+                if guarded:
+                    self._guard_cost(conn, database_obj, policy, query, params, override_cost_guard, results)
+                if page_size and read_only:
+                    spill = self._execute_paged(stack, conn, database_obj, query, params, page_size, start_time,
+                                                results, budget, on_limit)
+                    if spill is not None:
+                        # The cursor, connection and workload slot now belong to the spill thread
+                        threading.Thread(
+                            target=spill, args=(stack.pop_all(),), name=f"result-spill-{execution_id}", daemon=True
+                        ).start()
+                else:
+                    with conn.cursor() as cursor:
+                        register_casters(cursor)
+                        cursor.execute(query, params)
                     
-                    # Get all rows
-                    rows = cursor.fetchall()
-                    # Convert any non-serializable types to strings
-                    formatted_rows = []
-                    for row in rows:
-                        formatted_row = []
-                        for value in row:
-                            if isinstance(value, (datetime, pytz.datetime.datetime)):
-                                formatted_row.append(value.strftime('%Y-%m-%d %H:%M:%S'))
-                            else:
-                                formatted_row.append(value)
-                        formatted_rows.append(formatted_row)
+                        # Calculate execution time
+                        execution_time = (datetime.now() - start_time).total_seconds()
+                        results["execution_time"] = execution_time
                     
-                    results["rows"] = formatted_rows
-                    results["status"] = f"Query returned {len(formatted_rows)} rows"
-                else:
-                    # For non-SELECT queries
-                    affected_rows = cursor.rowcount
-                    conn.commit()
-                    results["status"] = f"Query executed successfully. Affected rows: {affected_rows}"
+                        # Check if query returns data
+                        if cursor.description:
+                            # Get column names
+                            results["columns"] = [desc[0] for desc in cursor.description]
+                            results["column_types"] = column_types(cursor.description)
+                        
+                            # Fetch rows in batches so the budget can stop us early
+                            plan = ConversionPlan(cursor.description)
+                            formatted_rows = []
+                            while not budget.exceeded:
+                                rows = budget.take(cursor.fetchmany(FETCH_BATCH_SIZE))
+                                if not rows:
+                                    break
+                                # Convert any non-serializable types
+                                formatted_rows.extend(plan.rows(rows))
+                            self._check_budget(budget, on_limit)
+                        
+                            results["rows"] = formatted_rows
+                            results["status"] = f"Query returned {len(formatted_rows)} rows"
+                            if not read_only:
+                                # e.g. INSERT ... RETURNING, or a function that writes
+                                conn.commit()
+                        else:
+                            # For non-SELECT queries
+                            affected_rows = cursor.rowcount
+                            conn.commit()
+                            results["status"] = f"Query executed successfully. Affected rows: {affected_rows}"
             
-            conn.close()
-            database_obj.connection_status = 'disconnected'  # Set to disconnected after query
-            database_obj.save(update_fields=['connection_status'])
+            connection_status_tracker.set(database_obj, 'disconnected')  # Set to disconnected after query
             results["success"] = True
+            
+            if budget.exceeded and "result_handle" not in results:
+                # A spilled result reports its truncation on its pages
+                results["truncated"] = True
+                results["limit"] = budget.exceeded
+                results["status"] += f" (truncated at the {budget.exceeded} limit of {budget.limit_value()})"
+            
+            if cache_key and "result_handle" not in results and not budget.exceeded:
+                # Spilled and truncated results are not cached, only whole results
+                query_result_cache.put(cache_key, dict(results))
+            elif not read_only:
+                query_result_cache.invalidate(database_obj.pk)
+            results["cache"] = dict(query_result_cache.stats(database_obj.pk), hit=False, bypassed=bypass_cache)
             return results
         except Exception as e:
+            if not read_only:
+                # The statement may have changed data before failing
+                query_result_cache.invalidate(database_obj.pk)
+            
             # Calculate execution time even for failed queries
             execution_time = (datetime.now() - start_time).total_seconds()
             results["execution_time"] = execution_time
@@ -98,83 +342,845 @@ class DatabaseConnector:
             # Set default error information
             results["success"] = False
             results["status"] = f"Error: {str(e)}"
-            results["error_type"] = "execution_error"  # Default error type
-            
-            # Try to classify the error more specifically
-            error_message = str(e).lower()
-            
-            if "syntax error" in error_message:
-                results["error_type"] = "syntax_error"
-            elif "permission denied" in error_message or "access denied" in error_message:
-                results["error_type"] = "permission_error"
-            elif "does not exist" in error_message and "relation" in error_message:
-                results["error_type"] = "undefined_table"
-            elif "column" in error_message and "does not exist" in error_message:
-                results["error_type"] = "undefined_column"
-            elif "connection" in error_message:
-                results["error_type"] = "connection_error"
-            elif "timeout" in error_message:
-                results["error_type"] = "timeout_error"
-            elif "duplicate key" in error_message:
-                results["error_type"] = "duplicate_key_error"
-            elif "violates foreign key constraint" in error_message:
-                results["error_type"] = "foreign_key_violation"
-            elif "division by zero" in error_message:
-                results["error_type"] = "division_by_zero"
-            
-            database_obj.connection_status = 'error'
-            database_obj.save(update_fields=['connection_status'])
+            results["error_type"] = self.classify_error(e)
+            
+            if isinstance(e, CostLimitExceeded):
+                results["cost_guard"]["override_required"] = e.override_required
+            if isinstance(e, (CostLimitExceeded, QueueTimeout)):
+                # Refused before running; the connection itself is fine
+                connection_status_tracker.set(database_obj, 'disconnected')
+            else:
+                connection_status_tracker.set(database_obj, 'error')
             return results
     
-    def get_column_sample_values(self, database_obj, schema_name, table_name, column_name, limit=10):
-        """Fetch sample distinct values from a column to provide AI context"""
+    def execute_batch(self, database_obj, statements, execution_id=None, owner_id=None, on_limit='truncate'):
+        """
+        Run an ordered list of statements on one connection, in a single transaction
+        
+        Each statement is a dict with 'query' and either 'params' or 'params_list'. A
+        params_list runs the statement once per parameter set with execute_batch() (executemany()
+        for RETURNING statements), or with execute_values() when 'values' is set (the query then
+        has a single VALUES %s).
+        Every statement reports its own timing and result set; the row and byte budget covers
+        the whole batch. If any statement fails, the whole batch is rolled back.
+        """
+        execution_id = execution_id or uuid.uuid4().hex
+        results = {"results": [], "execution_id": execution_id, "execution_time": None, "status": ""}
+        start_time = datetime.now()
+        
+        limits = query_limits(database_obj)
+        budget = ResultBudget(limits['max_rows'], limits['max_bytes'])
+        read_only = all(is_select(statement['query']) for statement in statements)
+        batch_text = ';\n'.join(statement['query'] for statement in statements)
+        
+        index = None  # statement being run, for error reporting
         try:
-            conn = self.create_connection(database_obj)
-            results = []
+            endpoint = self.read_connection(database_obj) if read_only else self.connection(database_obj)
+            with workload_scheduler.admit(database_obj, owner_id) as queued_for, endpoint as conn, \
+                    self._running(conn, database_obj, execution_id, batch_text, owner_id):
+                results["queue_time"] = queued_for
+                try:
+                    for index, statement in enumerate(statements):
+                        results["results"].append(self._execute_statement(conn, index, statement, budget, on_limit))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
             
-            with conn.cursor() as cursor:
-                # Use SQL DISTINCT to get unique values, limit to 10 for context
-                query = f"""
-                SELECT DISTINCT "{column_name}" 
-                FROM "{schema_name}"."{table_name}"
-                WHERE "{column_name}" IS NOT NULL
-                LIMIT {limit}
-                """
+            connection_status_tracker.set(database_obj, 'disconnected')  # Set to disconnected after query
+            results["success"] = True
+            results["status"] = f"Executed {len(statements)} statements"
+        except Exception as e:
+            results["success"] = False
+            results["status"] = f"Error in statement {index + 1}: {str(e)}" if index is not None else f"Error: {str(e)}"
+            results["error_type"] = self.classify_error(e)
+            results["failed_statement"] = index
+            results["rolled_back"] = True
+            connection_status_tracker.set(database_obj, 'error')
+        finally:
+            if not read_only:
+                query_result_cache.invalidate(database_obj.pk)
+        
+        results["execution_time"] = (datetime.now() - start_time).total_seconds()
+        return results
+    
+    def _execute_statement(self, conn, index, statement, budget, on_limit):
+        """Run one statement of a batch and collect its result set or affected row count"""
+        result = {"index": index}
+        start_time = datetime.now()
+        query = statement['query']
+        
+        fetched = None
+        with conn.cursor() as cursor:
+            register_casters(cursor)
+            if statement.get('params_list') is not None and statement.get('values'):
+                # execute_values sends one statement per page; with RETURNING it has to collect
+                # the rows of every page itself
+                fetched = psycopg2.extras.execute_values(
+                    cursor, query, statement['params_list'],
+                    page_size=getattr(settings, 'QUERY_BATCH_VALUES_PAGE_SIZE', 1000),
+                    fetch=bool(RETURNING_PATTERN.search(query))
+                )
+                # It only reports the row count of its last page
+                result["rows_submitted"] = len(statement['params_list'])
+            elif statement.get('params_list') is not None and not RETURNING_PATTERN.search(query):
+                # execute_batch sends a page of statements per round trip, executemany one each
+                psycopg2.extras.execute_batch(
+                    cursor, query, statement['params_list'],
+                    page_size=getattr(settings, 'QUERY_BATCH_VALUES_PAGE_SIZE', 1000)
+                )
+                # Like execute_values, the row count covers only the last page
+                result["rows_submitted"] = len(statement['params_list'])
+            elif statement.get('params_list') is not None:
+                # execute_batch would only keep the RETURNING rows of its last statement;
+                # executemany discards them all, as it always has
+                cursor.executemany(query, statement['params_list'])
+                result["affected_rows"] = cursor.rowcount
+            else:
+                cursor.execute(query, statement.get('params'))
+            
+            if cursor.description:
+                plan = ConversionPlan(cursor.description)
+                rows = plan.rows(budget.take(fetched)) if fetched is not None else []
+                while fetched is None and not budget.exceeded:
+                    batch = budget.take(cursor.fetchmany(FETCH_BATCH_SIZE))
+                    if not batch:
+                        break
+                    rows.extend(plan.rows(batch))
+                self._check_budget(budget, on_limit)
+                result["columns"] = [desc[0] for desc in cursor.description]
+                result["column_types"] = column_types(cursor.description)
+                result["rows"] = rows
+                result["status"] = f"Query returned {len(rows)} rows"
+                if budget.exceeded:
+                    result["truncated"] = True
+                    result["limit"] = budget.exceeded
+            elif "rows_submitted" in result:
+                result["status"] = f"Statement executed for {result['rows_submitted']} parameter rows"
+            else:
+                result.setdefault("affected_rows", cursor.rowcount)
+                result["status"] = f"Query executed successfully. Affected rows: {result['affected_rows']}"
+        
+        result["execution_time"] = (datetime.now() - start_time).total_seconds()
+        return result
+    
+    def explain_query(self, database_obj, query, params=None, analyze=False, buffers=False, table_rows=None,
+                      execution_id=None, owner_id=None):
+        """
+        Run EXPLAIN (FORMAT JSON, VERBOSE) for a query and digest the plan
+        
+        Only a single SELECT/INSERT/UPDATE/DELETE is accepted. With analyze the statement really
+        runs (EXPLAIN ANALYZE, optionally with BUFFERS) inside a transaction that is always
+        rolled back, so data-modifying statements leave no trace.
+        Plain plans are cached by SQL fingerprint, params and schema version; analyzed ones
+        are not, since their timings are the point.
+        """
+        execution_id = execution_id or uuid.uuid4().hex
+        results = {"plan": None, "summary": None, "cached": False, "execution_id": execution_id,
+                   "execution_time": None, "status": ""}
+        start_time = datetime.now()
+        
+        # The text goes straight after EXPLAIN, so anything past one statement (e.g. a COMMIT
+        # that would keep an analyzed write) must never reach the server
+        if not is_explainable(query):
+            results["success"] = False
+            results["status"] = "Error: only a single SELECT, INSERT, UPDATE or DELETE statement can be explained"
+            results["error_type"] = "invalid_query"
+            results["execution_time"] = (datetime.now() - start_time).total_seconds()
+            return results
+        
+        cache_key = None if analyze else plan_cache.make_key(database_obj, query, params)
+        plan = plan_cache.get(cache_key) if cache_key else None
+        
+        try:
+            if plan is None:
+                options = ['FORMAT JSON', 'VERBOSE']
+                if analyze:
+                    options.append('ANALYZE')
+                    if buffers:
+                        options.append('BUFFERS')
                 
-                try:
-                    cursor.execute(query)
-                    rows = cursor.fetchall()
+                # EXPLAIN ANALYZE of a write has to run on the primary
+                read_only = is_select(query)
+                endpoint = self.read_connection(database_obj) if read_only else self.connection(database_obj)
+                with endpoint as conn, self._running(conn, database_obj, execution_id, query, owner_id):
+                    try:
+                        plan = self._explain(conn, query, params, options)
+                    finally:
+                        conn.rollback()
+                
+                if cache_key:
+                    plan_cache.put(cache_key, plan)
+            else:
+                results["cached"] = True
+            
+            results["plan"] = plan
+            results["summary"] = digest_plan(plan, table_rows)
+            results["success"] = True
+            results["status"] = "Plan analyzed" if analyze else "Plan estimated"
+        except Exception as e:
+            results["success"] = False
+            results["status"] = f"Error: {str(e)}"
+            results["error_type"] = self.classify_error(e)
+        
+        results["execution_time"] = (datetime.now() - start_time).total_seconds()
+        return results
+    
+    def _explain(self, conn, query, params, options=('FORMAT JSON', 'VERBOSE')):
+        """
+        EXPLAIN a statement on an open connection and return the decoded JSON plan
+        
+        VERBOSE makes scans report their schema, so digest_plan can match known row counts; the
+        cost guard uses the same options because it shares the plan cache with explain_query.
+        """
+        with conn.cursor() as cursor:
+            cursor.execute(f"EXPLAIN ({', '.join(options)}) {query}", params or None)
+            plan = cursor.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    
+    def _guard_cost(self, conn, database_obj, policy, query, params, override, results):
+        """Plan the statement and raise CostLimitExceeded if the estimate is over the policy's thresholds"""
+        cache_key = plan_cache.make_key(database_obj, query, params)
+        plan = plan_cache.get(cache_key)
+        if plan is None:
+            plan = self._explain(conn, query, params)
+            plan_cache.put(cache_key, plan)
+        
+        root = plan[0]['Plan']
+        estimate = {"total_cost": root['Total Cost'], "estimated_rows": root['Plan Rows']}
+        results["cost_guard"] = dict(estimate, overridden=False)
+        if check_plan_estimate(policy, estimate, override):
+            results["cost_guard"]["overridden"] = True
+    
+    async def aexecute_query(self, database_obj, query, params=None, **options):
+        """
+        Async variant of execute_query for ASGI views
+        
+        The query waits for its workload slot on the event loop, then the blocking driver calls
+        run on the shared query thread pool, so neither queued nor running queries block the
+        loop. If the awaiting task is cancelled (under ASGI that happens when the HTTP client
+        disconnects) the statement is cancelled on the server too.
+        """
+        execution_id = options.pop('execution_id', None) or uuid.uuid4().hex
+        loop = asyncio.get_running_loop()
+        executor = get_query_executor()
+        admission = await workload_scheduler.aadmit(database_obj, options.get('owner_id'))
+        run = functools.partial(self.execute_query, database_obj, query, params, execution_id=execution_id,
+                                admission=admission, **options)
+        
+        try:
+            return await loop.run_in_executor(executor, run)
+        except asyncio.CancelledError:
+            # The worker thread keeps waiting on the database until the backend gives up. The
+            # cancel runs on the loop's default executor so it never queues behind busy query threads
+            await loop.run_in_executor(None, self._cancel_quietly, database_obj, execution_id)
+            raise
+        finally:
+            # Give the slot back if the query never took it (cancelled or failed before it started)
+            admission.abandon()
+    
+    def _cancel_quietly(self, database_obj, execution_id):
+        try:
+            self.cancel_execution(database_obj, execution_id)
+        except Exception as e:
+            logger.warning("Error cancelling abandoned query %s: %s", execution_id, e)
+    
+    def _execute_paged(self, stack, conn, database_obj, query, params, page_size, start_time, results, budget, on_limit):
+        """
+        Fetch the first page of a SELECT; if there are more rows, publish a result handle
+        
+        Returns None when the first page is the whole result. Otherwise it returns the function
+        that spills the remaining rows, to be run on its own thread with the ExitStack holding
+        the cursor and connection, which it closes when done.
+        """
+        cursor = stack.enter_context(conn.cursor(name=f"page_{uuid.uuid4().hex}"))
+        cursor.itersize = page_size
+        register_casters(cursor)
+        cursor.execute(query, params)
+        
+        rows = cursor.fetchmany(page_size)
+        # Server-side cursors only report their description after the first fetch
+        plan = ConversionPlan(cursor.description)
+        first_page = plan.rows(budget.take(rows))
+        self._check_budget(budget, on_limit)
+        results["execution_time"] = (datetime.now() - start_time).total_seconds()
+        results["columns"] = [desc[0] for desc in cursor.description]
+        results["column_types"] = column_types(cursor.description)
+        results["rows"] = first_page
+        results["offset"] = 0
+        results["page_size"] = page_size
+        
+        rows = budget.take(cursor.fetchmany(page_size))
+        if not rows:
+            self._check_budget(budget, on_limit)
+            results["total_rows"] = len(first_page)
+            results["has_more"] = False
+            results["status"] = f"Query returned {len(first_page)} rows"
+            return None
+        
+        # More rows than one page: the handle is readable as soon as the first page is written
+        writer = ResultStore.create(database_obj, results["columns"], query, params, results["column_types"])
+        writer.write(first_page)
+        results["result_handle"] = writer.handle
+        results["total_rows"] = None
+        results["has_more"] = True
+        results["spill_complete"] = False
+        results["status"] = f"Query returned the first {len(first_page)} rows; more are being fetched"
+        
+        def spill(held):
+            self._spill_rest(held, cursor, writer, plan, rows, page_size, budget, on_limit, database_obj)
+        return spill
+    
+    def _spill_rest(self, held, cursor, writer, plan, rows, page_size, budget, on_limit, database_obj):
+        """Write the rest of a paged result to its spill file, then release the connection"""
+        try:
+            with held:
+                while rows:
+                    writer.write(plan.rows(rows))
+                    rows = budget.take(cursor.fetchmany(page_size))
+                self._check_budget(budget, on_limit)
+        except Exception as e:
+            error_type = self.classify_error(e)
+            writer.fail(f"Error: {str(e)}", error_type)
+            if error_type not in ('limit_exceeded', 'cancelled'):
+                connection_status_tracker.set(database_obj, 'error')
+            return
+        writer.close(truncated=budget.exceeded)
+        connection_status_tracker.set(database_obj, 'disconnected')
+    
+    def _check_budget(self, budget, on_limit):
+        """Raise instead of truncating when the caller asked for limit errors"""
+        if budget.exceeded and on_limit == 'error':
+            raise QueryLimitExceeded(
+                f"Result exceeds the {budget.exceeded} limit of {budget.limit_value()}"
+            )
+    
+    def fetch_result_page(self, database_obj, handle, offset=0, limit=None):
+        """Read a page of a spilled result by handle and row offset; None if the handle expired"""
+        spilled = ResultStore.get(handle, database_obj)
+        if spilled is None:
+            return None
+        
+        limit = limit or getattr(settings, 'QUERY_RESULT_PAGE_SIZE', 1000)
+        # A result still being spilled may not have reached this page yet
+        deadline = time.monotonic() + getattr(settings, 'QUERY_RESULT_PAGE_WAIT', 10)
+        while not spilled.complete and spilled.total_rows < offset + limit and time.monotonic() < deadline:
+            time.sleep(0.1)
+            spilled = ResultStore.get(handle, database_obj) or spilled
+        
+        rows = spilled.read(offset, limit)
+        page = {
+            "columns": spilled.columns,
+            "column_types": spilled.meta.get('column_types', []),
+            "rows": rows,
+            "result_handle": handle,
+            "offset": offset,
+            "page_size": limit,
+            "total_rows": spilled.total_rows if spilled.complete else None,
+            "has_more": offset + len(rows) < spilled.total_rows or not spilled.complete,
+            "spill_complete": spilled.complete,
+            "status": f"Returned rows {offset + 1}-{offset + len(rows)}" if rows else "No more rows",
+            "success": True,
+        }
+        if spilled.complete and rows:
+            page["status"] += f" of {spilled.total_rows}"
+        elif not spilled.complete:
+            page["status"] += " (more rows are still being fetched)"
+        if spilled.meta.get('truncated'):
+            page["truncated"] = True
+            page["limit"] = spilled.meta['truncated']
+        if spilled.meta.get('error'):
+            # Fetching the rest of the result failed; the rows before the failure are still served
+            page["error_type"] = spilled.meta['error_type']
+            page["status"] += f" (result incomplete: {spilled.meta['error']})"
+        return page
+    
+    def fetch_keyset_page(self, database_obj, handle, key_column, after=None, limit=None):
+        """
+        Read the page after a key value by re-querying the source ordered on key_column
+        
+        Keyset pages stay cheap however deep the client pages, as long as key_column is indexed.
+        """
+        spilled = ResultStore.get(handle, database_obj)
+        if spilled is None:
+            return None
+        if key_column not in spilled.columns:
+            return {
+                "columns": [], "rows": [], "success": False, "error_type": "invalid_key_column",
+                "status": f"Error: {key_column} is not a column of this result",
+            }
+        
+        limit = limit or getattr(settings, 'QUERY_RESULT_PAGE_SIZE', 1000)
+        query = spilled.meta['query']
+        params = spilled.meta['params']
+        if params is None:
+            # The wrapper adds placeholders, so literal percent signs must be escaped
+            query = query.replace('%', '%%')
+        inner = strip_statement(query)
+        key = quote_ident(key_column)
+        
+        if isinstance(params, dict):
+            condition = f"WHERE {key} > %(_keyset_after)s " if after is not None else ""
+            page_params = dict(params, _keyset_after=after, _keyset_limit=limit)
+            limit_placeholder = "%(_keyset_limit)s"
+        else:
+            condition = f"WHERE {key} > %s " if after is not None else ""
+            page_params = list(params or []) + ([after] if after is not None else []) + [limit]
+            limit_placeholder = "%s"
+        
+        page_query = f"SELECT * FROM ({inner}) AS _keyset_page {condition}ORDER BY {key} LIMIT {limit_placeholder}"
+        result = self.execute_query(database_obj, page_query, page_params)
+        if result.get("success"):
+            result["result_handle"] = handle
+            result["key_column"] = key_column
+            result["has_more"] = len(result["rows"]) == limit
+            if result["rows"]:
+                result["next_after"] = result["rows"][-1][result["columns"].index(key_column)]
+        return result
+    
+    def stream_query(self, database_obj, query, params=None, batch_size=2000, execution_id=None, owner_id=None,
+                     exact_numeric=False, with_types=False, guarded=False, budget=None, on_limit='truncate',
+                     override_cost_guard=False):
+        """
+        Run a query on a named server-side cursor and yield its results incrementally
+        
+        The first item yielded is the list of column names; every following item is
+        a batch of at most batch_size formatted rows. Only one batch is held in memory.
+        With exact_numeric, numeric values are yielded as their exact text instead of floats.
+        With with_types, the first item is a (column names, column type names) pair instead.
+        
+        With guarded, the stream gets the same protections as execute_query: it waits for a
+        workload slot, gets the auto_limit and cost guard, and stops at the row and byte budget
+        (a ResultBudget from the database's limits unless one is passed in, so the caller can
+        check budget.exceeded afterwards), or raises QueryLimitExceeded when on_limit='error'.
+        """
+        read_only = is_select(query)
+        policy = cost_policy(database_obj) if guarded else None
+        if guarded:
+            if read_only and policy['auto_limit'] and not has_limit(query):
+                query = add_limit(query, policy['auto_limit'])
+            if budget is None:
+                limits = query_limits(database_obj)
+                budget = ResultBudget(limits['max_rows'], limits['max_bytes'])
+        
+        try:
+            execution_id = execution_id or uuid.uuid4().hex
+            admission = workload_scheduler.admit(database_obj, owner_id) if guarded else nullcontext()
+            endpoint = self.read_connection(database_obj) if read_only else self.connection(database_obj)
+            with admission, endpoint as conn, self._running(conn, database_obj, execution_id, query, owner_id):
+                if guarded and policy['mode'] != 'off' and is_explainable(query):
+                    self._guard_cost(conn, database_obj, policy, query, params, override_cost_guard, {})
+                
+                # Named cursors need a transaction; the pool rolls it back on return
+                with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = batch_size
+                    register_casters(cursor, exact_numeric=exact_numeric)
+                    cursor.execute(query, params)
                     
-                    for row in rows:
-                        # Handle different data types for serialization
-                        value = row[0]
-                        if isinstance(value, (datetime, pytz.datetime.datetime)):
-                            value = value.strftime('%Y-%m-%d %H:%M:%S')
-                        
-                        results.append(value)
-                except Exception as e:
-                    # If query fails, just return empty list
-                    print(f"Error getting sample values: {str(e)}")
+                    # Server-side cursors only report their description after the first fetch
+                    rows = cursor.fetchmany(batch_size)
+                    plan = ConversionPlan(cursor.description)
+                    columns = [desc[0] for desc in cursor.description]
+                    yield (columns, column_types(cursor.description)) if with_types else columns
+                    
+                    while rows:
+                        if budget is not None:
+                            rows = budget.take(rows)
+                            self._check_budget(budget, on_limit)
+                        if rows:
+                            yield plan.rows(rows)
+                        if budget is not None and budget.exceeded:
+                            break
+                        rows = cursor.fetchmany(batch_size)
+        except (CostLimitExceeded, QueueTimeout):
+            # Refused before running; the connection itself is fine
+            connection_status_tracker.set(database_obj, 'disconnected')
+            raise
+        except Exception:
+            connection_status_tracker.set(database_obj, 'error')
+            raise
+        
+        connection_status_tracker.set(database_obj, 'disconnected')  # Set to disconnected after query
+    
+    def copy_export(self, database_obj, query, params=None, compress=False, execution_id=None, owner_id=None,
+                    guarded=False, override_cost_guard=False):
+        """
+        Export a SELECT as CSV (with a header row) and yield the bytes as the database sends them
+        
+        The query is wrapped in COPY (...) TO STDOUT, so rows never become Python objects. COPY
+        runs on a helper thread writing into a bounded queue; this generator drains the queue,
+        gzip-compressing on the fly when compress is set. If the consumer stops early the COPY
+        is cancelled and its connection closed, so the pool drops it.
+        
+        A slow client holds the COPY open, so the database's statement timeout does not apply;
+        QUERY_EXPORT_STATEMENT_TIMEOUT_MS (0 for none) bounds the export instead.
+        
+        With guarded, the export waits for a workload slot (held until the last byte is sent)
+        and gets the database's auto_limit and cost guard like execute_query.
+        The row and byte budget does not apply: rows never reach Python, so an export is bounded
+        by the planner estimate, the auto_limit and the timeout instead.
+        """
+        if not is_select(query):
+            raise ValueError("Only a single SELECT statement can be exported")
+        
+        policy = cost_policy(database_obj) if guarded else None
+        if guarded and policy['auto_limit'] and not has_limit(query):
+            query = add_limit(query, policy['auto_limit'])
+        
+        execution_id = execution_id or uuid.uuid4().hex
+        try:
+            timeout = getattr(settings, 'QUERY_EXPORT_STATEMENT_TIMEOUT_MS', 0)
+            admission = workload_scheduler.admit(database_obj, owner_id) if guarded else nullcontext()
+            with admission, self.read_connection(database_obj) as conn, \
+                    self._running(conn, database_obj, execution_id, query, owner_id, timeout=timeout):
+                if guarded and policy['mode'] != 'off':
+                    self._guard_cost(conn, database_obj, policy, query, params, override_cost_guard, {})
+                
+                with conn.cursor() as cursor:
+                    # COPY takes no bind parameters, so they are interpolated client-side
+                    inner = cursor.mogrify(strip_statement(query), params if params else None)
+                    copy_sql = b"COPY (" + inner + b") TO STDOUT WITH (FORMAT csv, HEADER)"
+                    
+                    writer = QueueWriter()
+                    
+                    def run_copy():
+                        try:
+                            cursor.copy_expert(copy_sql, writer)
+                        except BaseException as e:
+                            writer.finish(e)
+                        else:
+                            writer.finish()
+                    
+                    copy_thread = threading.Thread(target=run_copy, name=f"copy-export-{execution_id}", daemon=True)
+                    copy_thread.start()
+                    # wbits=31 writes a gzip container rather than a raw zlib stream
+                    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+                    try:
+                        while True:
+                            chunk = writer.chunks.get()
+                            if chunk is COPY_DONE:
+                                break
+                            if isinstance(chunk, BaseException):
+                                raise chunk
+                            yield compressor.compress(chunk) if compressor else chunk
+                        if compressor:
+                            yield compressor.flush()
+                    finally:
+                        if copy_thread.is_alive():
+                            # Stopped early (client gone or error): stop the server side too
+                            writer.close()
+                            conn.cancel()
+                            copy_thread.join()
+                            # The cancel may land after the COPY ends; a closed connection is never reused
+                            conn.close()
+        except (CostLimitExceeded, QueueTimeout):
+            # Refused before running; the connection itself is fine
+            connection_status_tracker.set(database_obj, 'disconnected')
+            raise
+        except Exception:
+            connection_status_tracker.set(database_obj, 'error')
+            raise
+        
+        connection_status_tracker.set(database_obj, 'disconnected')  # Set to disconnected after query
+    
+    def copy_import(self, database_obj, schema_name, table_name, fileobj, file_format='csv', header=True,
+                    delimiter=',', columns=None, execution_id=None, owner_id=None):
+        """
+        Load a CSV or Parquet file into a table with COPY ... FROM STDIN
+        
+        The file is read in QUERY_IMPORT_CHUNK_BYTES chunks while COPY consumes it, so it is
+        never held in memory whole. Parquet files are re-encoded to CSV one row batch at a time.
+        Returns the row count, bytes read and throughput; the load commits as one transaction.
+        
+        The COPY waits on the upload, so QUERY_IMPORT_STATEMENT_TIMEOUT_MS (0 for none) bounds it
+        instead of the database's statement timeout.
+        """
+        execution_id = execution_id or uuid.uuid4().hex
+        start_time = datetime.now()
+        
+        try:
+            if file_format == 'parquet':
+                # Raises ValueError for a file that is not Parquet or is corrupt
+                file_columns, chunks = parquet_csv_chunks(fileobj)
+                columns = columns or file_columns
+                reader = IterReader(chunks)
+                options = "FORMAT csv"
+            else:
+                reader = CountingReader(fileobj)
+                options = f"FORMAT csv, HEADER {'true' if header else 'false'}, DELIMITER '{delimiter.replace(chr(39), chr(39) * 2)}'"
             
-            conn.close()
-            return results
+            target = f"{quote_ident(schema_name)}.{quote_ident(table_name)}"
+            column_list = f" ({', '.join(quote_ident(column) for column in columns)})" if columns else ""
+            copy_sql = f"COPY {target}{column_list} FROM STDIN WITH ({options})"
+            
+            timeout = getattr(settings, 'QUERY_IMPORT_STATEMENT_TIMEOUT_MS', 0)
+            with self.connection(database_obj) as conn, \
+                    self._running(conn, database_obj, execution_id, copy_sql, owner_id, timeout=timeout):
+                with conn.cursor() as cursor:
+                    cursor.copy_expert(copy_sql, reader, size=getattr(settings, 'QUERY_IMPORT_CHUNK_BYTES', 256 * 1024))
+                    rows = cursor.rowcount
+                conn.commit()
+        except Exception as e:
+            if isinstance(e, ValueError):
+                # A bad upload says nothing about the connection
+                error_type = "invalid_file"
+            else:
+                error_type = self.classify_error(e)
+                connection_status_tracker.set(database_obj, 'error')
+            return {
+                "success": False,
+                "status": f"Error: {str(e)}",
+                "error_type": error_type,
+                "execution_time": (datetime.now() - start_time).total_seconds(),
+                "execution_id": execution_id,
+            }
+        finally:
+            query_result_cache.invalidate(database_obj.pk)
+        
+        connection_status_tracker.set(database_obj, 'disconnected')  # Set to disconnected after query
+        # Parquet is re-encoded, so report the size of the uploaded file rather than the CSV fed to COPY
+        size = getattr(fileobj, 'size', None) or reader.bytes
+        elapsed = max((datetime.now() - start_time).total_seconds(), 1e-6)
+        return {
+            "success": True,
+            "status": f"Imported {rows} rows into {schema_name}.{table_name}",
+            "table": f"{schema_name}.{table_name}",
+            "rows": rows,
+            "bytes": size,
+            "execution_time": elapsed,
+            "execution_id": execution_id,
+            "rows_per_second": round(rows / elapsed),
+            "megabytes_per_second": round(size / elapsed / (1024 * 1024), 2),
+        }
+    
+    @contextmanager
+    def _running(self, conn, database_obj, execution_id, query, owner_id=None, timeout=None):
+        """
+        Prepare the transaction for a tracked query and register it while it runs
+        
+        statement_timeout and application_name are set with set_config(..., true) so they
+        only last for the current transaction and never leak into other users of the pooled
+        connection. application_name identifies the database and execution for cancel_execution().
+        DateStyle and bytea_output are pinned because the result casters read the text format.
+        timeout (ms, 0 for none) replaces the database's statement timeout.
+        """
+        if timeout is None:
+            timeout = query_limits(database_obj)['statement_timeout']
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true), set_config('application_name', %s, true), "
+                "set_config('DateStyle', 'ISO', true), set_config('bytea_output', 'hex', true)",
+                (str(timeout), application_name(database_obj.pk, execution_id))
+            )
+        execution_registry.register(database_obj.pk, execution_id, conn.get_backend_pid(), query, owner_id)
+        try:
+            yield
+        finally:
+            execution_registry.unregister(database_obj.pk, execution_id)
+    
+    def cancel_execution(self, database_obj, execution_id):
+        """
+        Cancel a running query with pg_cancel_backend, issued from a separate pooled connection
+        
+        The query may be running on the primary or on any replica, so each is tried in turn.
+        """
+        cancelled = False
+        for conn in self._endpoint_connections(database_obj):
+            with conn.cursor() as cursor:
+                # Match on application_name rather than a remembered PID: it is only set while the
+                # query's transaction is open, so a pooled backend that moved on is never hit, and
+                # queries started by other worker processes are found too
+                cursor.execute("""
+                SELECT pg_cancel_backend(pid)
+                FROM pg_stat_activity
+                WHERE application_name = %s AND datname = current_database()
+                """, (application_name(database_obj.pk, execution_id),))
+                cancelled = any(row[0] for row in cursor.fetchall())
+            if cancelled:
+                break
+        
+        if cancelled:
+            execution_registry.mark_cancelled(database_obj.pk, execution_id)
+        return cancelled
+    
+    def get_running_queries(self, database_obj):
+        """Queries this worker process is currently running against the database"""
+        return execution_registry.running(database_obj.pk)
+    
+    def classify_error(self, error):
+        """Map a database exception to the error_type reported to clients"""
+        error_type = "execution_error"  # Default error type
+        
+        if isinstance(error, QueryLimitExceeded):
+            return "limit_exceeded"
+        if isinstance(error, CostLimitExceeded):
+            return "cost_limit_exceeded"
+        if isinstance(error, QueueTimeout):
+            return "queue_timeout"
+        if isinstance(error, CircuitOpen):
+            return "connection_error"
+        if isinstance(error, psycopg2.errors.QueryCanceled):
+            if "statement timeout" in str(error):
+                return "timeout_error"
+            if "user request" in str(error):
+                return "cancelled"
+        
+        # Try to classify the error more specifically
+        error_message = str(error).lower()
+        
+        if "syntax error" in error_message:
+            error_type = "syntax_error"
+        elif "permission denied" in error_message or "access denied" in error_message:
+            error_type = "permission_error"
+        elif "does not exist" in error_message and "relation" in error_message:
+            error_type = "undefined_table"
+        elif "column" in error_message and "does not exist" in error_message:
+            error_type = "undefined_column"
+        elif "connection" in error_message:
+            error_type = "connection_error"
+        elif "timeout" in error_message:
+            error_type = "timeout_error"
+        elif "duplicate key" in error_message:
+            error_type = "duplicate_key_error"
+        elif "violates foreign key constraint" in error_message:
+            error_type = "foreign_key_violation"
+        elif "division by zero" in error_message:
+            error_type = "division_by_zero"
+        
+        return error_type
+    
+    def get_table_sample_values(self, database_obj, schema_name, table_name, column_names, limit=10, conn=None):
+        """
+        Sample distinct values for several columns of a table from one read of the table
+        
+        Returns {column_name: [values]} with up to limit distinct non-null values per column.
+        Runs on conn when given (e.g. the metadata extraction connection), otherwise on a
+        read connection of its own.
+        """
+        if not column_names:
+            return {}
+        if conn is not None:
+            return self._sample_table(conn, schema_name, table_name, column_names, limit)
+        with self.read_connection(database_obj) as conn:
+            return self._sample_table(conn, schema_name, table_name, column_names, limit)
+    
+    def _sample_table(self, conn, schema_name, table_name, column_names, limit):
+        """
+        Read a slice of the table and derive per-column distinct samples from it
+        
+        Large tables are read with TABLESAMPLE SYSTEM, sized from the planner's row estimate
+        so about METADATA_SAMPLE_ROWS rows come back; small tables, views and samples that
+        happen to come back empty fall back to a plain LIMIT read. DateStyle and bytea_output
+        are pinned for the transaction, as in DatabaseConnector._running, because the casters
+        read their text format.
+        """
+        target_rows = getattr(settings, 'METADATA_SAMPLE_ROWS', 1000)
+        relation = f"{quote_ident(schema_name)}.{quote_ident(table_name)}"
+        select_list = ', '.join(quote_ident(name) for name in column_names)
+        
+        try:
+            with conn.cursor() as cursor:
+                register_casters(cursor)
+                cursor.execute("SELECT set_config('DateStyle', 'ISO', true), set_config('bytea_output', 'hex', true)")
+                cursor.execute("""
+                SELECT c.reltuples, c.relkind
+                FROM pg_catalog.pg_class c
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = %s AND c.relname = %s
+                """, (schema_name, table_name))
+                row = cursor.fetchone()
+                estimated_rows, relkind = row if row else (-1, None)
+                
+                rows = []
+                if relkind in ('r', 'm') and estimated_rows > target_rows * 10:
+                    # SYSTEM samples whole pages, so ask for twice the share we need
+                    percent = min(target_rows * 200.0 / estimated_rows, 100.0)
+                    cursor.execute(
+                        f"SELECT {select_list} FROM {relation} TABLESAMPLE SYSTEM (%s) LIMIT %s",
+                        (percent, target_rows)
+                    )
+                    rows = cursor.fetchall()
+                if not rows:
+                    cursor.execute(f"SELECT {select_list} FROM {relation} LIMIT %s", (target_rows,))
+                    rows = cursor.fetchall()
+                rows = ConversionPlan(cursor.description).rows(rows)
         except Exception as e:
-            print(f"Connection error getting sample values: {str(e)}")
-            return []
+            # The extraction connection is shared, so leave it usable
+            conn.rollback()
+            logger.warning("Error sampling %s.%s: %s", schema_name, table_name, e)
+            return {}
+        
+        samples = {}
+        for index, column_name in enumerate(column_names):
+            values = []
+            seen = set()
+            for row in rows:
+                value = row[index]
+                if value is None:
+                    continue
+                if isinstance(value, str) and len(value) > 200:
+                    value = value[:200]
+                key = json.dumps(value, sort_keys=True, default=str)
+                if key in seen:
+                    continue
+                seen.add(key)
+                values.append(value)
+                if len(values) >= limit:
+                    break
+            samples[column_name] = values
+        return samples
+
+_extraction_slots = {}
+_extraction_slots_lock = threading.Lock()
+
+
+def extraction_slots(database_id):
+    """Semaphore limiting parallel metadata reads against one database across the process"""
+    with _extraction_slots_lock:
+        slots = _extraction_slots.get(database_id)
+        if slots is None:
+            slots = _extraction_slots[database_id] = threading.BoundedSemaphore(
+                getattr(settings, 'METADATA_EXTRACT_WORKERS', 4)
+            )
+        return slots
+
+
+def _delete_in_batches(model, ids, batch_size):
+    """Delete rows of a model by primary key, batch_size ids per query"""
+    for start in range(0, len(ids), batch_size):
+        model.objects.filter(pk__in=ids[start:start + batch_size]).delete()
 
 class MetadataExtractor:
     """Extracts schema metadata from connected databases"""
     
-    def __init__(self):
+    def __init__(self, use_replica=False):
         self.connector = DatabaseConnector()
+        # Read the catalog from a replica (if the database has one) instead of the primary
+        self.use_replica = use_replica
         self.changes = {
             'tables': {'added': [], 'updated': [], 'removed': []},
             'columns': {'added': [], 'updated': [], 'removed': []},
             'relationships': {'added': [], 'updated': [], 'removed': []}
         }
     
-    def extract_full_metadata(self, database_obj):
-        """Extract all metadata (tables, columns, relationships) from a database"""
+    def _connection(self, database_obj):
+        if self.use_replica:
+            return self.connector.read_connection(database_obj)
+        return self.connector.connection(database_obj)
+    
+    def extract_full_metadata(self, database_obj, force=False):
+        """
+        Extract all metadata (tables, columns, relationships) from a database
+        
+        The client database is read first, on one connection: tables, row counts, the column
+        catalog, foreign keys and samples for columns that have none yet. The stored metadata
+        is loaded once and diffed against that in memory, and only the differences are written,
+        with bulk queries inside a single transaction.
+        
+        Refreshes are incremental: every table has a catalog fingerprint, and only tables
+        whose fingerprint changed get their columns re-read and diffed. When the database-wide
+        fingerprint is unchanged only the row counts are refreshed. force re-extracts everything.
+        """
         try:
             # Reset changes tracking
             self.changes = {
@@ -183,416 +1189,687 @@ class MetadataExtractor:
                 'relationships': {'added': [], 'updated': [], 'removed': []}
             }
             
-            # Get all current tables in database to track removed tables
-            existing_tables = set(TableMetadata.objects.filter(database=database_obj)
-                                 .values_list('schema_name', 'table_name'))
-            
-            # Get tables first
-            tables = self.extract_tables(database_obj)
+            with self._connection(database_obj) as conn:
+                fingerprints = self.extract_fingerprints(conn)
+                schema_fingerprint = self.schema_fingerprint(fingerprints)
+                unchanged = not force and database_obj.schema_fingerprint == schema_fingerprint
+                # Planner estimates for every table; counts move even when the schema does not
+                row_counts = {key: (count, True) for key, count in self.estimate_row_counts(conn).items()}
+                
+                if not unchanged:
+                    stored = self._load_stored(database_obj)
+                    table_rows = self.extract_tables(database_obj, conn=conn)
+                    # Tables whose columns, keys or comments may have changed
+                    changed_keys = set(
+                        (schema_name, table_name) for schema_name, table_name, _, _ in table_rows
+                        if force
+                        or (schema_name, table_name) not in stored['tables']
+                        or stored['tables'][(schema_name, table_name)].fingerprint != fingerprints.get((schema_name, table_name), '')
+                    )
+                    
+                    # Columns of the changed tables with their key flags and comments, in one catalog query
+                    catalog = {}
+                    if changed_keys:
+                        only = None if len(changed_keys) == len(table_rows) else sorted(changed_keys)
+                        catalog = self.extract_catalog_columns(database_obj, tables=only, conn=conn)
+                    fk_rows = self.extract_relationships(database_obj, conn=conn)
             
-            # Check for removed tables
-            current_tables = set((table.schema_name, table.table_name) for table in tables)
-            removed_tables = existing_tables - current_tables
+            if unchanged:
+                self.refresh_row_counts(database_obj, row_counts)
+                return True, "Schema unchanged since the last extraction; row counts refreshed", self.changes
             
-            # Record removed tables
-            for schema_name, table_name in removed_tables:
-                try:
-                    table = TableMetadata.objects.get(
-                        database=database_obj,
-                        schema_name=schema_name,
-                        table_name=table_name
-                    )
-                    self.changes['tables']['removed'].append({
-                        'schema': schema_name,
-                        'name': table_name
-                    })
-                    table.delete()
-                except TableMetadata.DoesNotExist:
-                    continue  # Table was already deleted somehow
+            # Per-table reads run in parallel: exact counts for tables that opted in, and samples
+            row_counts.update(self.exact_row_counts(database_obj, stored['tables'].values()))
+            samples = self.sample_new_columns(database_obj, catalog, stored)
             
-            # For each table, get its columns
-            for table in tables:
-                # Get current columns in table to track removed columns
-                existing_columns = set(
-                    ColumnMetadata.objects.filter(table=table)
-                    .values_list('column_name', flat=True)
-                )
-                
-                # Extract columns
-                columns = self.extract_columns(database_obj, table.schema_name, table.table_name)
+            with transaction.atomic():
+                tables = self._save_tables(database_obj, stored, table_rows, row_counts, fingerprints)
+                column_ids = self._save_columns(database_obj, stored, tables, catalog, samples, changed_keys)
+                self._save_relationships(stored, column_ids, fk_rows)
                 
-                # Check for removed columns
-                current_columns = set(col.column_name for col in columns)
-                removed_columns = existing_columns - current_columns
-                
-                # Record removed columns
-                for column_name in removed_columns:
-                    try:
-                        column = ColumnMetadata.objects.get(
-                            table=table,
-                            column_name=column_name
-                        )
-                        self.changes['columns']['removed'].append({
-                            'table': f"{table.schema_name}.{table.table_name}",
-                            'name': column_name
-                        })
-                        column.delete()
-                    except ColumnMetadata.DoesNotExist:
-                        continue  # Column was already deleted
-            
-            # Extract relationships between tables
-            self.extract_relationships(database_obj)
-            
-            # Update the timestamp for metadata update
-            database_obj.last_metadata_update = datetime.now(pytz.UTC)
-            database_obj.save(update_fields=['last_metadata_update'])
+                # Update the timestamp for metadata update
+                database_obj.last_metadata_update = datetime.now(pytz.UTC)
+                database_obj.schema_fingerprint = schema_fingerprint
+                database_obj.save(update_fields=['last_metadata_update', 'schema_fingerprint'])
             
             return True, "Metadata extraction completed successfully", self.changes
         except Exception as e:
             return False, str(e), self.changes
     
-    def extract_tables(self, database_obj, schema_pattern=None):
-        """Extract tables and views from the database"""
+    def extract_fingerprints(self, conn):
+        """
+        A hash per table or view of the catalog data extraction depends on, in one query
+        
+        Covers the pg_class row version (xmin changes on ALTER TABLE, not on VACUUM or ANALYZE,
+        which update pg_class in place), the attribute list, constraint definitions and comments.
+        """
+        with conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT
+                n.nspname,
+                c.relname,
+                md5(concat_ws('|',
+                    c.relkind,
+                    c.xmin::text,
+                    obj_description(c.oid, 'pg_class'),
+                    (SELECT string_agg(concat_ws(':', a.attnum, a.attname, a.atttypid, a.atttypmod, a.attnotnull,
+                                                 col_description(c.oid, a.attnum)), ',' ORDER BY a.attnum)
+                     FROM pg_catalog.pg_attribute a
+                     WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped),
+                    (SELECT string_agg(concat_ws(':', con.conname, pg_get_constraintdef(con.oid)), ',' ORDER BY con.conname)
+                     FROM pg_catalog.pg_constraint con
+                     WHERE con.conrelid = c.oid)
+                ))
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'v', 'm', 'f', 'p')
+                AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+            """)
+            return {(schema_name, table_name): fingerprint for schema_name, table_name, fingerprint in cursor.fetchall()}
+    
+    def schema_fingerprint(self, fingerprints):
+        """Database-wide hash over every table's fingerprint"""
+        digest = hashlib.sha256()
+        for (schema_name, table_name), fingerprint in sorted(fingerprints.items()):
+            digest.update(f"{schema_name}.{table_name}={fingerprint}\n".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def _load_stored(self, database_obj):
+        """The database's current tables, columns and relationships, keyed for diffing"""
+        tables = {(t.schema_name, t.table_name): t for t in TableMetadata.objects.filter(database=database_obj)}
+        table_keys = {table.pk: key for key, table in tables.items()}
+        
+        columns = {}  # (schema, table) -> {column name: ColumnMetadata}
+        for column in ColumnMetadata.objects.filter(table__database=database_obj).defer('embedding_vector'):
+            columns.setdefault(table_keys[column.table_id], {})[column.column_name] = column
+        
+        relationships = {
+            (r.from_column_id, r.to_column_id): r
+            for r in RelationshipMetadata.objects.filter(from_column__table__database=database_obj)
+            .select_related('from_column__table', 'to_column__table')
+        }
+        return {'tables': tables, 'columns': columns, 'relationships': relationships}
+    
+    def extract_tables(self, database_obj, schema_pattern=None, conn=None):
+        """Read the tables and views of the database as (schema, name, type, comment) rows"""
+        if conn is None:
+            with self._connection(database_obj) as conn:
+                return self.extract_tables(database_obj, schema_pattern, conn)
+        
         tables = []
+        with conn.cursor() as cursor:
+            query = """
+            SELECT 
+                table_schema, 
+                table_name, 
+                table_type,
+                obj_description(
+                    (quote_ident(table_schema) || '.' || quote_ident(table_name))::regclass::oid, 
+                    'pg_class'
+                ) as description
+            FROM 
+                information_schema.tables 
+            WHERE 
+                table_schema NOT IN ('pg_catalog', 'information_schema')
+            """
+            
+            params = None
+            if schema_pattern:
+                query += " AND table_schema LIKE %s"
+                params = (schema_pattern,)
+            # A stable order keeps the changes report the same from run to run
+            cursor.execute(query + " ORDER BY table_schema, table_name", params)
+            
+            for schema_name, table_name, table_type, db_description in cursor.fetchall():
+                # Convert PostgreSQL table_type to our format
+                if table_type == 'BASE TABLE':
+                    table_type = 'table'
+                elif table_type == 'VIEW':
+                    table_type = 'view'
+                elif table_type == 'MATERIALIZED VIEW':
+                    table_type = 'materialized_view'
+                tables.append((schema_name, table_name, table_type, db_description))
         
-        try:
-            conn = self.connector.create_connection(database_obj)
-            with conn.cursor() as cursor:
-                query = """
-                SELECT 
-                    table_schema, 
-                    table_name, 
-                    table_type,
-                    obj_description(
-                        (quote_ident(table_schema) || '.' || quote_ident(table_name))::regclass::oid, 
-                        'pg_class'
-                    ) as description
-                FROM 
-                    information_schema.tables 
-                WHERE 
-                    table_schema NOT IN ('pg_catalog', 'information_schema')
-                """
-                
-                if schema_pattern:
-                    query += " AND table_schema LIKE %s"
-                    cursor.execute(query, (schema_pattern,))
-                else:
-                    cursor.execute(query)
-                
-                for row in cursor.fetchall():
-                    schema_name, table_name, table_type, db_description = row
-                    
-                    # Convert PostgreSQL table_type to our format
-                    if table_type == 'BASE TABLE':
-                        table_type = 'table'
-                    elif table_type == 'VIEW':
-                        table_type = 'view'
-                    elif table_type == 'MATERIALIZED VIEW':
-                        table_type = 'materialized_view'
-                    
-                    # Try to find existing table metadata to preserve description
-                    try:
-                        existing_table = TableMetadata.objects.get(
-                            database=database_obj,
-                            schema_name=schema_name,
-                            table_name=table_name
-                        )
-                        # Preserve existing description if it exists and not empty
-                        description = existing_table.description if existing_table.description else db_description
-                    except TableMetadata.DoesNotExist:
-                        description = db_description if db_description else ""
-                    
-                    # Get or create table metadata record
-                    table_meta, created = TableMetadata.objects.update_or_create(
-                        database=database_obj,
-                        schema_name=schema_name,
-                        table_name=table_name,
-                        defaults={
-                            'table_type': table_type,
-                            'description': description
-                        }
+        return tables
+    
+    def estimate_row_counts(self, conn):
+        """
+        Row counts of all tables from the planner statistics, in one query
+        
+        Uses pg_class.reltuples, or pg_stat_user_tables.n_live_tup for tables that were never
+        vacuumed or analyzed; a partitioned table is the sum of its partitions' estimates.
+        """
+        with conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT
+                n.nspname,
+                c.relname,
+                CASE
+                    WHEN c.relkind = 'p' THEN (
+                        SELECT sum(GREATEST(child.reltuples, 0))::bigint
+                        FROM pg_catalog.pg_inherits i
+                        JOIN pg_catalog.pg_class child ON child.oid = i.inhrelid
+                        WHERE i.inhparent = c.oid
                     )
-                    
-                    # Generate default description if none exists
-                    if not table_meta.description:
-                        table_meta.description = self.generate_table_description(table_meta)
-                        table_meta.save(update_fields=['description'])
-                    
-                    # Track changes
-                    if created:
-                        self.changes['tables']['added'].append({
-                            'schema': schema_name,
-                            'name': table_name,
-                            'type': table_type
-                        })
-                    elif table_meta.table_type != table_type:
-                        # Only count as update if table type changed, not description
-                        self.changes['tables']['updated'].append({
-                            'schema': schema_name,
-                            'name': table_name,
-                            'type': table_type,
-                            'changes': {
-                                'type': table_type if table_meta.table_type != table_type else None,
-                            }
-                        })
-                    
-                    # Get row count for tables (not views)
-                    if table_type == 'table':
-                        try:
-                            count_query = f'SELECT COUNT(*) FROM "{schema_name}"."{table_name}"'
-                            cursor.execute(count_query)
-                            row_count = cursor.fetchone()[0]
-                            if table_meta.row_count != row_count:
-                                table_meta.row_count = row_count
-                                table_meta.save(update_fields=['row_count'])
-                        except:
-                            # Skip row count if it fails
-                            pass
-                    
-                    tables.append(table_meta)
-            
-            conn.close()
-            return tables
+                    WHEN c.reltuples < 0 OR (c.reltuples = 0 AND c.relpages = 0) THEN s.n_live_tup
+                    ELSE c.reltuples::bigint
+                END AS estimated_rows
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_catalog.pg_stat_user_tables s ON s.relid = c.oid
+            WHERE c.relkind IN ('r', 'p')
+                AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+            """)
+            return {
+                (schema_name, table_name): count
+                for schema_name, table_name, count in cursor.fetchall()
+                if count is not None
+            }
+    
+    def count_rows_exact(self, conn, keys, time_budget_ms=None):
+        """
+        Exact COUNT(*) for the given (schema, table) keys, each limited to time_budget_ms
         
-        except Exception as e:
-            # Cleanup connection and re-raise
-            if 'conn' in locals() and conn:
-                conn.close()
-            raise e
+        Tables whose count runs out of time (or fails) are left out of the result.
+        """
+        time_budget_ms = time_budget_ms or getattr(settings, 'METADATA_EXACT_COUNT_TIMEOUT_MS', 10000)
+        counts = {}
+        with conn.cursor() as cursor:
+            for schema_name, table_name in keys:
+                try:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", (str(time_budget_ms),))
+                    cursor.execute(f"SELECT COUNT(*) FROM {quote_ident(schema_name)}.{quote_ident(table_name)}")
+                    counts[(schema_name, table_name)] = cursor.fetchone()[0]
+                except Exception as e:
+                    logger.warning("Skipping exact row count for %s.%s: %s", schema_name, table_name, e)
+                finally:
+                    # Ends the transaction, dropping the local timeout and any error state
+                    conn.rollback()
+        return counts
+    
+    def count_rows(self, database_obj, tables, time_budget_ms=None, background=False):
+        """
+        Count rows of the given TableMetadata exactly and store the counts
+        
+        With background=True the counts run on a daemon thread and this returns right away.
+        Returns {table id: row count} for the tables counted within their time budget.
+        """
+        if background:
+            worker = threading.Thread(
+                target=self._count_rows_in_thread, args=(database_obj, tables, time_budget_ms),
+                name='metadata-row-counts', daemon=True
+            )
+            worker.start()
+            return {}
+        
+        with self._connection(database_obj) as conn:
+            counts = self.count_rows_exact(conn, [(t.schema_name, t.table_name) for t in tables], time_budget_ms)
+        
+        counted = []
+        for table in tables:
+            count = counts.get((table.schema_name, table.table_name))
+            if count is not None:
+                table.row_count = count
+                table.row_count_estimated = False
+                counted.append(table)
+        TableMetadata.objects.bulk_update(counted, ['row_count', 'row_count_estimated'])
+        return {table.pk: table.row_count for table in counted}
     
-    def extract_columns(self, database_obj, schema_name, table_name):
-        """Extract column metadata for a specific table"""
-        columns = []
+    def exact_row_counts(self, database_obj, tables):
+        """Exact counts, as {key: (count, False)}, for the TableMetadata that opted in with count_rows_exactly"""
+        keys = sorted((t.schema_name, t.table_name) for t in tables if t.count_rows_exactly)
+        counts = self.run_per_table(database_obj, keys, lambda conn, key: self.count_rows_exact(conn, [key]).get(key))
+        return {key: (count, False) for key, count in counts.items() if count is not None}
+    
+    def refresh_row_counts(self, database_obj, row_counts):
+        """
+        Store new row counts for the database's tables without re-extracting anything else
+        
+        row_counts holds planner estimates as {key: (count, True)}; tables that opted in are
+        counted exactly on top. Only tables whose count changed are written.
+        """
+        tables = list(TableMetadata.objects.filter(database=database_obj))
+        row_counts = dict(row_counts)
+        row_counts.update(self.exact_row_counts(database_obj, tables))
         
+        changed = []
+        for table in tables:
+            count = row_counts.get((table.schema_name, table.table_name))
+            if count is not None and (table.row_count, table.row_count_estimated) != count:
+                table.row_count, table.row_count_estimated = count
+                changed.append(table)
+        TableMetadata.objects.bulk_update(
+            changed, ['row_count', 'row_count_estimated'], batch_size=getattr(settings, 'METADATA_BULK_BATCH_SIZE', 500)
+        )
+        return len(changed)
+    
+    def _count_rows_in_thread(self, database_obj, tables, time_budget_ms):
         try:
-            conn = self.connector.create_connection(database_obj)
-            table = TableMetadata.objects.get(
-                database=database_obj, 
-                schema_name=schema_name, 
-                table_name=table_name
+            self.count_rows(database_obj, tables, time_budget_ms)
+        except Exception:
+            logger.exception("Error counting rows in the background")
+        finally:
+            # This thread opened its own app-DB connection
+            connections.close_all()
+    
+    def sample_new_columns(self, database_obj, catalog, stored):
+        """Sample values for columns without cached samples, one read per table"""
+        unsampled = {}
+        for key, column_rows in sorted(catalog.items()):
+            stored_columns = stored['columns'].get(key, {})
+            column_names = [
+                row[0] for row in column_rows
+                if row[0] not in stored_columns or stored_columns[row[0]].sample_values is None
+            ]
+            if column_names:
+                unsampled[key] = column_names
+        
+        return self.run_per_table(
+            database_obj, list(unsampled),
+            lambda conn, key: self.connector.get_table_sample_values(
+                database_obj, key[0], key[1], unsampled[key], conn=conn
             )
+        )
+    
+    def run_per_table(self, database_obj, keys, work):
+        """
+        Run work(conn, key) for every (schema, table) key on a bounded pool of worker threads
+        
+        Each worker checks out one pooled client connection and takes keys from a shared queue
+        until none are left. Workers are capped by METADATA_EXTRACT_WORKERS, by the client pool
+        size (leaving one connection for other queries) and, across concurrent extractions of
+        the same database, by its extraction slots. Work functions must not use the ORM.
+        Returns {key: result} in the order of keys, whatever order the work finished in.
+        """
+        if not keys:
+            return {}
+        workers = min(
+            getattr(settings, 'METADATA_EXTRACT_WORKERS', 4),
+            max(getattr(settings, 'CLIENT_DB_POOL_MAX_SIZE', 10) - 1, 1),
+            len(keys)
+        )
+        slots = extraction_slots(database_obj.pk)
+        if self.use_replica:
+            # Load the replica list here, so the workers need no ORM access to route
+            replica_router.replicas(database_obj)
+        
+        pending = queue.SimpleQueue()
+        for key in keys:
+            pending.put(key)
+        
+        def worker():
+            results = {}
+            with slots, self._connection(database_obj) as conn:
+                while True:
+                    try:
+                        key = pending.get_nowait()
+                    except queue.Empty:
+                        return results
+                    results[key] = work(conn, key)
+        
+        results = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='metadata-extract') as executor:
+            for future in [executor.submit(worker) for _ in range(workers)]:
+                results.update(future.result())
+        return {key: results[key] for key in keys if key in results}
+    
+    # Every column of every table and view in one pass over pg_catalog. data_type follows
+    # information_schema.columns: 'ARRAY' for arrays, the base type for domains and
+    # 'USER-DEFINED' for types outside pg_catalog. Only relations information_schema would
+    # show are included (tables, views, foreign and partitioned tables the user can access).
+    CATALOG_COLUMNS_QUERY = """
+    SELECT
+        n.nspname,
+        c.relname,
+        a.attname,
+        CASE WHEN t.typtype = 'd' THEN
+            CASE WHEN bt.typelem <> 0 AND bt.typlen = -1 THEN 'ARRAY'
+                 WHEN nbt.nspname = 'pg_catalog' THEN format_type(t.typbasetype, NULL)
+                 ELSE 'USER-DEFINED' END
+        ELSE
+            CASE WHEN t.typelem <> 0 AND t.typlen = -1 THEN 'ARRAY'
+                 WHEN nt.nspname = 'pg_catalog' THEN format_type(a.atttypid, NULL)
+                 ELSE 'USER-DEFINED' END
+        END AS data_type,
+        NOT (a.attnotnull OR (t.typtype = 'd' AND t.typnotnull)) AS is_nullable,
+        pg_get_expr(ad.adbin, ad.adrelid) AS column_default,
+        d.description,
+        EXISTS (
+            SELECT 1 FROM pg_catalog.pg_constraint con
+            WHERE con.conrelid = c.oid AND con.contype = 'p' AND a.attnum = ANY (con.conkey)
+        ) AS is_primary_key,
+        EXISTS (
+            SELECT 1 FROM pg_catalog.pg_constraint con
+            WHERE con.conrelid = c.oid AND con.contype = 'f' AND a.attnum = ANY (con.conkey)
+        ) AS is_foreign_key
+    FROM pg_catalog.pg_attribute a
+    JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+    JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+    JOIN pg_catalog.pg_namespace nt ON nt.oid = t.typnamespace
+    LEFT JOIN pg_catalog.pg_type bt ON t.typtype = 'd' AND bt.oid = t.typbasetype
+    LEFT JOIN pg_catalog.pg_namespace nbt ON nbt.oid = bt.typnamespace
+    LEFT JOIN pg_catalog.pg_attrdef ad ON ad.adrelid = a.attrelid AND ad.adnum = a.attnum
+    LEFT JOIN pg_catalog.pg_description d
+        ON d.objoid = c.oid AND d.classoid = 'pg_catalog.pg_class'::regclass AND d.objsubid = a.attnum
+    WHERE a.attnum > 0
+        AND NOT a.attisdropped
+        AND c.relkind IN ('r', 'v', 'f', 'p')
+        AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+        AND NOT pg_is_other_temp_schema(n.oid)
+        AND (pg_has_role(c.relowner, 'USAGE')
+             OR has_column_privilege(c.oid, a.attnum, 'SELECT, INSERT, UPDATE, REFERENCES'))
+    """
+    
+    def extract_catalog_columns(self, database_obj, schema_pattern=None, table=None, conn=None, tables=None):
+        """
+        Read column metadata for the whole database (or a schema pattern, or some tables) in one query
+        
+        Returns {(schema_name, table_name): [(column_name, data_type, is_nullable, column_default,
+        description, is_primary_key, is_foreign_key), ...]} with columns in table order.
+        table is a (schema_name, table_name) pair, tables a list of them.
+        """
+        if conn is None:
+            with self._connection(database_obj) as conn:
+                return self.extract_catalog_columns(database_obj, schema_pattern, table, conn, tables)
+        
+        query = self.CATALOG_COLUMNS_QUERY
+        params = []
+        if schema_pattern:
+            query += " AND n.nspname LIKE %s"
+            params.append(schema_pattern)
+        if table:
+            query += " AND n.nspname = %s AND c.relname = %s"
+            params.extend(table)
+        if tables:
+            query += " AND (n.nspname, c.relname) IN (SELECT * FROM unnest(%s::text[], %s::text[]))"
+            params.extend([[key[0] for key in tables], [key[1] for key in tables]])
+        query += " ORDER BY n.nspname, c.relname, a.attnum"
+        
+        catalog = {}
+        with conn.cursor() as cursor:
+            cursor.execute(query, params or None)
+            for row in cursor.fetchall():
+                catalog.setdefault((row[0], row[1]), []).append(row[2:])
+        return catalog
+    
+    def extract_relationships(self, database_obj, conn=None):
+        """Read foreign key column pairs as (fk schema, table, column, pk schema, table, column, constraint) rows"""
+        if conn is None:
+            with self._connection(database_obj) as conn:
+                return self.extract_relationships(database_obj, conn)
+        
+        with conn.cursor() as cursor:
+            # conkey and confkey list the columns in matching order, so composite keys pair up
+            # by position (information_schema.constraint_column_usage has no positions)
+            cursor.execute("""
+            SELECT
+                n.nspname AS fk_schema,
+                c.relname AS fk_table,
+                a.attname AS fk_column,
+                fn.nspname AS pk_schema,
+                fc.relname AS pk_table,
+                fa.attname AS pk_column,
+                con.conname
+            FROM pg_catalog.pg_constraint con
+            CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, fattnum, position)
+            JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+            JOIN pg_catalog.pg_class fc ON fc.oid = con.confrelid
+            JOIN pg_catalog.pg_namespace fn ON fn.oid = fc.relnamespace
+            JOIN pg_catalog.pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = k.fattnum
+            WHERE con.contype = 'f'
+                AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+            ORDER BY n.nspname, c.relname, con.conname, k.position
+            """)
+            return cursor.fetchall()
+    
+    def _save_tables(self, database_obj, stored, table_rows, row_counts, fingerprints):
+        """Write table additions, changes and removals; returns the current tables keyed by (schema, name)"""
+        batch_size = getattr(settings, 'METADATA_BULK_BATCH_SIZE', 500)
+        existing = stored['tables']
+        now = timezone.now()
+        added, changed, update_fields = [], [], set()
+        
+        for schema_name, table_name, table_type, db_description in table_rows:
+            row_count, row_count_estimated = row_counts.get((schema_name, table_name), (None, True))
+            table = existing.get((schema_name, table_name))
             
-            with conn.cursor() as cursor:
-                # Get column information
-                cursor.execute("""
-                SELECT 
-                    column_name, 
-                    data_type,
-                    is_nullable,
-                    column_default,
-                    col_description(
-                        (quote_ident(table_schema) || '.' || quote_ident(table_name))::regclass::oid,
-                        ordinal_position
-                    ) as description
-                FROM 
-                    information_schema.columns
-                WHERE 
-                    table_schema = %s AND table_name = %s
-                ORDER BY 
-                    ordinal_position
-                """, (schema_name, table_name))
+            if table is None:
+                table = TableMetadata(
+                    database=database_obj,
+                    schema_name=schema_name,
+                    table_name=table_name,
+                    table_type=table_type,
+                    description=db_description or "",
+                    row_count=row_count,
+                    row_count_estimated=row_count_estimated,
+                    fingerprint=fingerprints.get((schema_name, table_name), '')
+                )
+                # Generate default description if none exists
+                if not table.description:
+                    table.description = self.generate_table_description(table)
+                added.append(table)
+                self.changes['tables']['added'].append({
+                    'schema': schema_name,
+                    'name': table_name,
+                    'type': table_type
+                })
+                continue
+            
+            fields = set()
+            if table.table_type != table_type:
+                # Only count as update if table type changed, not description
+                self.changes['tables']['updated'].append({
+                    'schema': schema_name,
+                    'name': table_name,
+                    'type': table_type,
+                    'changes': {'type': table_type}
+                })
+                table.table_type = table_type
+                fields.add('table_type')
+            # Preserve an existing description; fill an empty one from the database or a default
+            if not table.description:
+                table.description = db_description or self.generate_table_description(table)
+                fields.add('description')
+            if table.fingerprint != fingerprints.get((schema_name, table_name), ''):
+                table.fingerprint = fingerprints.get((schema_name, table_name), '')
+                fields.add('fingerprint')
+            if row_count is not None and (table.row_count, table.row_count_estimated) != (row_count, row_count_estimated):
+                table.row_count = row_count
+                table.row_count_estimated = row_count_estimated
+                fields.update(['row_count', 'row_count_estimated'])
+            if fields:
+                table.updated_at = now
+                changed.append(table)
+                update_fields |= fields
+        
+        current = set((row[0], row[1]) for row in table_rows)
+        removed = [table for key, table in sorted(existing.items()) if key not in current]
+        for table in removed:
+            self.changes['tables']['removed'].append({
+                'schema': table.schema_name,
+                'name': table.table_name
+            })
+        
+        TableMetadata.objects.bulk_create(added, batch_size=batch_size)
+        if changed:
+            TableMetadata.objects.bulk_update(changed, sorted(update_fields) + ['updated_at'], batch_size=batch_size)
+        # Columns and relationships of removed tables go with them (cascade)
+        _delete_in_batches(TableMetadata, [table.pk for table in removed], batch_size)
+        
+        tables = {key: table for key, table in existing.items() if key in current}
+        tables.update({(table.schema_name, table.table_name): table for table in added})
+        if any(table.pk is None for table in added):
+            # The app database could not return the new ids from the bulk insert
+            tables = {
+                (t.schema_name, t.table_name): t for t in TableMetadata.objects.filter(database=database_obj)
+            }
+        return tables
+    
+    def _save_columns(self, database_obj, stored, tables, catalog, samples, changed_keys):
+        """
+        Write column additions, changes and removals for the tables in changed_keys
+        
+        Returns the ids of all the database's columns keyed by (schema, table, column).
+        """
+        batch_size = getattr(settings, 'METADATA_BULK_BATCH_SIZE', 500)
+        now = timezone.now()
+        added, changed, update_fields, removed_ids = [], [], set(), []
+        
+        for (schema_name, table_name), table in sorted(tables.items()):
+            if (schema_name, table_name) not in changed_keys:
+                continue
+            existing = stored['columns'].get((schema_name, table_name), {})
+            table_samples = samples.get((schema_name, table_name), {})
+            current = set()
+            
+            for row in catalog.get((schema_name, table_name), []):
+                column_name, data_type, is_nullable, column_default, db_description, is_primary_key, is_foreign_key = row
+                current.add(column_name)
+                column = existing.get(column_name)
                 
-                for row in cursor.fetchall():
-                    column_name, data_type, is_nullable, column_default, db_description = row
-                    is_nullable = True if is_nullable == 'YES' else False
-                    
-                    # Check if column is primary key
-                    cursor.execute("""
-                    SELECT 
-                        c.column_name
-                    FROM 
-                        information_schema.table_constraints tc
-                    JOIN 
-                        information_schema.constraint_column_usage AS ccu 
-                        USING (constraint_schema, constraint_name)
-                    JOIN 
-                        information_schema.columns AS c 
-                        ON c.table_schema = tc.constraint_schema
-                        AND c.table_name = tc.table_name
-                        AND c.column_name = ccu.column_name
-                    WHERE 
-                        tc.constraint_type = 'PRIMARY KEY'
-                        AND tc.table_schema = %s
-                        AND tc.table_name = %s
-                        AND ccu.column_name = %s
-                    """, (schema_name, table_name, column_name))
-                    
-                    is_primary_key = bool(cursor.fetchone())
-                    
-                    # Check if column is foreign key
-                    cursor.execute("""
-                    SELECT 
-                        ccu.table_schema, 
-                        ccu.table_name, 
-                        ccu.column_name
-                    FROM 
-                        information_schema.table_constraints AS tc
-                    JOIN 
-                        information_schema.constraint_column_usage AS ccu
-                        USING (constraint_schema, constraint_name)
-                    JOIN 
-                        information_schema.key_column_usage AS kcu
-                        USING (constraint_schema, constraint_name)
-                    WHERE 
-                        tc.constraint_type = 'FOREIGN KEY'
-                        AND kcu.table_schema = %s
-                        AND kcu.table_name = %s
-                        AND kcu.column_name = %s
-                    """, (schema_name, table_name, column_name))
-                    
-                    is_foreign_key = bool(cursor.fetchone())
-                    
-                    # Try to find existing column to preserve its description
-                    try:
-                        existing_column = ColumnMetadata.objects.get(
-                            table=table,
-                            column_name=column_name
-                        )
-                        # Preserve existing description if it exists
-                        description = existing_column.description if existing_column.description else db_description
-                    except ColumnMetadata.DoesNotExist:
-                        description = db_description if db_description else ""
-                    
-                    # Create or update column metadata
-                    column_meta, created = ColumnMetadata.objects.update_or_create(
+                if column is None:
+                    column = ColumnMetadata(
                         table=table,
                         column_name=column_name,
-                        defaults={
-                            'data_type': data_type,
-                            'is_nullable': is_nullable,
-                            'is_primary_key': is_primary_key,
-                            'is_foreign_key': is_foreign_key,
-                            'description': description
-                        }
+                        data_type=data_type,
+                        is_nullable=is_nullable,
+                        is_primary_key=is_primary_key,
+                        is_foreign_key=is_foreign_key,
+                        description=db_description or "",
+                        sample_values=table_samples.get(column_name)
                     )
-                    
                     # Generate default description if none exists
-                    if not column_meta.description:
-                        column_meta.description = self.generate_column_description(column_meta)
-                        column_meta.save(update_fields=['description'])
-                    
-                    # Track changes
-                    if created:
-                        self.changes['columns']['added'].append({
-                            'table': f"{schema_name}.{table_name}",
-                            'name': column_name,
-                            'type': data_type
-                        })
-                    else:
-                        changes = {}
-                        if column_meta.data_type != data_type:
-                            changes['type'] = data_type
-                        if column_meta.is_nullable != is_nullable:
-                            changes['nullable'] = is_nullable
-                        if column_meta.is_primary_key != is_primary_key:
-                            changes['primary_key'] = is_primary_key
-                        if column_meta.is_foreign_key != is_foreign_key:
-                            changes['foreign_key'] = is_foreign_key
-                        
-                        # Don't include description in changes since we're preserving it
-                            
-                        if changes:
-                            self.changes['columns']['updated'].append({
-                                'table': f"{schema_name}.{table_name}",
-                                'name': column_name,
-                                'changes': changes
-                            })
-                    
-                    columns.append(column_meta)
+                    if not column.description:
+                        column.description = self.generate_column_description(column, table_samples.get(column_name, []))
+                    added.append(column)
+                    self.changes['columns']['added'].append({
+                        'table': f"{schema_name}.{table_name}",
+                        'name': column_name,
+                        'type': data_type
+                    })
+                    continue
+                
+                fields = set()
+                changes = {}
+                if column.data_type != data_type:
+                    changes['type'] = data_type
+                    column.data_type = data_type
+                    fields.add('data_type')
+                if column.is_nullable != is_nullable:
+                    changes['nullable'] = is_nullable
+                    column.is_nullable = is_nullable
+                    fields.add('is_nullable')
+                if column.is_primary_key != is_primary_key:
+                    changes['primary_key'] = is_primary_key
+                    column.is_primary_key = is_primary_key
+                    fields.add('is_primary_key')
+                if column.is_foreign_key != is_foreign_key:
+                    changes['foreign_key'] = is_foreign_key
+                    column.is_foreign_key = is_foreign_key
+                    fields.add('is_foreign_key')
+                
+                # Don't include description in changes since we're preserving it
+                if changes:
+                    self.changes['columns']['updated'].append({
+                        'table': f"{schema_name}.{table_name}",
+                        'name': column_name,
+                        'changes': changes
+                    })
+                
+                if column_name in table_samples:
+                    column.sample_values = table_samples[column_name]
+                    fields.add('sample_values')
+                if not column.description:
+                    column.description = db_description or self.generate_column_description(
+                        column, column.sample_values or []
+                    )
+                    fields.add('description')
+                if fields:
+                    column.updated_at = now
+                    changed.append(column)
+                    update_fields |= fields
             
-            conn.close()
-            return columns
+            # Record removed columns
+            for column_name, column in sorted(existing.items()):
+                if column_name not in current:
+                    removed_ids.append(column.pk)
+                    self.changes['columns']['removed'].append({
+                        'table': f"{schema_name}.{table_name}",
+                        'name': column_name
+                    })
         
-        except Exception as e:
-            # Cleanup connection and re-raise
-            if 'conn' in locals() and conn:
-                conn.close()
-            raise e
+        ColumnMetadata.objects.bulk_create(added, batch_size=batch_size)
+        if changed:
+            ColumnMetadata.objects.bulk_update(changed, sorted(update_fields) + ['updated_at'], batch_size=batch_size)
+        _delete_in_batches(ColumnMetadata, removed_ids, batch_size)
+        
+        return {
+            (schema_name, table_name, column_name): pk
+            for pk, schema_name, table_name, column_name in ColumnMetadata.objects.filter(table__database=database_obj)
+            .values_list('pk', 'table__schema_name', 'table__table_name', 'column_name')
+        }
     
-    def extract_relationships(self, database_obj):
-        """Extract relationships between tables in the database"""
-        try:
-            conn = self.connector.create_connection(database_obj)
-            with conn.cursor() as cursor:
-                # Query to find foreign key relationships
-                cursor.execute("""
-                SELECT
-                    kcu.table_schema as fk_schema,
-                    kcu.table_name as fk_table,
-                    kcu.column_name as fk_column,
-                    ccu.table_schema as pk_schema,
-                    ccu.table_name as pk_table,
-                    ccu.column_name as pk_column,
-                    tc.constraint_name
-                FROM
-                    information_schema.table_constraints tc
-                JOIN
-                    information_schema.key_column_usage kcu
-                    ON tc.constraint_name = kcu.constraint_name
-                    AND tc.table_schema = kcu.table_schema
-                JOIN
-                    information_schema.constraint_column_usage ccu
-                    ON ccu.constraint_name = tc.constraint_name
-                    AND ccu.table_schema = tc.table_schema
-                WHERE
-                    tc.constraint_type = 'FOREIGN KEY'
-                    AND kcu.table_schema NOT IN ('pg_catalog', 'information_schema')
-                """)
-                
-                for row in cursor.fetchall():
-                    fk_schema, fk_table, fk_column, pk_schema, pk_table, pk_column, constraint_name = row
-                    
-                    try:
-                        # Get the table metadata objects
-                        fk_table_meta = TableMetadata.objects.get(
-                            database=database_obj,
-                            schema_name=fk_schema,
-                            table_name=fk_table
-                        )
-                        
-                        pk_table_meta = TableMetadata.objects.get(
-                            database=database_obj,
-                            schema_name=pk_schema,
-                            table_name=pk_table
-                        )
-                        
-                        # Get the column metadata objects
-                        from_column = ColumnMetadata.objects.get(
-                            table=fk_table_meta,
-                            column_name=fk_column
-                        )
-                        
-                        to_column = ColumnMetadata.objects.get(
-                            table=pk_table_meta,
-                            column_name=pk_column
-                        )
-                        
-                        # Create or update relationship
-                        relationship, created = RelationshipMetadata.objects.update_or_create(
-                            from_column=from_column,
-                            to_column=to_column,
-                            defaults={
-                                'relationship_type': 'many-to-one'  # Assuming foreign keys create many-to-one relationships
-                            }
-                        )
-                    except (TableMetadata.DoesNotExist, ColumnMetadata.DoesNotExist):
-                        # Skip if the tables or columns aren't in our metadata yet
-                        continue
-            
-            conn.close()
-            return True
+    def _save_relationships(self, stored, column_ids, fk_rows):
+        """Write new foreign key relationships and remove those whose constraint is gone"""
+        batch_size = getattr(settings, 'METADATA_BULK_BATCH_SIZE', 500)
+        existing = stored['relationships']
+        current = set()
+        added = []
         
-        except Exception as e:
-            # Cleanup connection and re-raise
-            if 'conn' in locals() and conn:
-                conn.close()
-            raise e
+        for fk_schema, fk_table, fk_column, pk_schema, pk_table, pk_column, constraint_name in fk_rows:
+            from_id = column_ids.get((fk_schema, fk_table, fk_column))
+            to_id = column_ids.get((pk_schema, pk_table, pk_column))
+            if from_id is None or to_id is None:
+                # Skip if the tables or columns aren't in our metadata
+                continue
+            if (from_id, to_id) in current:
+                continue
+            current.add((from_id, to_id))
+            if (from_id, to_id) not in existing:
+                added.append(RelationshipMetadata(
+                    from_column_id=from_id,
+                    to_column_id=to_id,
+                    relationship_type='many-to-one'  # Assuming foreign keys create many-to-one relationships
+                ))
+                self.changes['relationships']['added'].append({
+                    'from': f"{fk_schema}.{fk_table}.{fk_column}",
+                    'to': f"{pk_schema}.{pk_table}.{pk_column}"
+                })
+        
+        removed = [r for key, r in sorted(existing.items()) if key not in current]
+        for relationship in removed:
+            self.changes['relationships']['removed'].append({
+                'from': f"{relationship.from_column.table}.{relationship.from_column.column_name}",
+                'to': f"{relationship.to_column.table}.{relationship.to_column.column_name}"
+            })
+        
+        RelationshipMetadata.objects.bulk_create(added, batch_size=batch_size)
+        # Relationships of deleted columns are already gone (cascade); this is a no-op for them
+        _delete_in_batches(RelationshipMetadata, [r.pk for r in removed], batch_size)
     
     def generate_table_description(self, table_metadata):
         """Generate natural language description of table (placeholder)"""
         return f"Table {table_metadata.schema_name}.{table_metadata.table_name} containing data related to {table_metadata.table_name.lower().replace('_', ' ')}."
     
-    def generate_column_description(self, column_metadata):
+    def refresh_sample_values(self, table_metadata):
+        """Re-sample all columns of a table in one read and cache the values on its ColumnMetadata"""
+        columns = list(table_metadata.columns.all())
+        samples = self.connector.get_table_sample_values(
+            table_metadata.database,
+            table_metadata.schema_name,
+            table_metadata.table_name,
+            [column.column_name for column in columns]
+        )
+        if samples:
+            for column in columns:
+                column.sample_values = samples.get(column.column_name, [])
+            ColumnMetadata.objects.bulk_update(columns, ['sample_values'])
+        return samples
+    
+    def generate_column_description(self, column_metadata, sample_values=None):
         """Generate natural language description of column (placeholder)"""
         column_type = f"of type {column_metadata.data_type}"
         nullability = "nullable" if column_metadata.is_nullable else "not nullable"
@@ -603,21 +1880,15 @@ class MetadataExtractor:
         elif column_metadata.is_foreign_key:
             key_info = " and references another table"
             
-        # Get sample values for the column
-        sample_values = []
-        try:
-            connector = DatabaseConnector()
-            table = column_metadata.table
-            database = table.database
-            sample_values = connector.get_column_sample_values(
-                database,
-                table.schema_name,
-                table.table_name,
-                column_metadata.column_name,
-                limit=10
-            )
-        except Exception as e:
-            print(f"Error getting sample values for default description: {str(e)}")
+        # Sample values cached at extraction; sample the whole table if this column has none yet
+        if sample_values is None:
+            sample_values = column_metadata.sample_values
+        if sample_values is None:
+            try:
+                sample_values = self.refresh_sample_values(column_metadata.table).get(column_metadata.column_name, [])
+            except Exception as e:
+                logger.warning("Error getting sample values for default description: %s", e)
+                sample_values = []
         
         # Include sample values in description if available
         sample_text = ""
@@ -0,0 +1,127 @@
+import hashlib
+import sqlparse
+from sqlparse import tokens as T
+
+
+def quote_ident(name):
+    """Quote a SQL identifier (table or column name) for PostgreSQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def parse_statements(query):
+    """Split a SQL string into parsed statements, ignoring empty ones (e.g. a trailing semicolon)"""
+    return [
+        statement for statement in sqlparse.parse(query)
+        if statement.token_first(skip_ws=True, skip_cm=True) is not None
+    ]
+
+
+# Statements that can only read, when nothing inside them writes
+READ_STATEMENTS = ('SELECT', 'WITH', 'VALUES', 'TABLE')
+
+# Built-in functions that write (sequences, large objects, notifications) or need a
+# transaction id, so they fail in a READ ONLY transaction and on replicas
+WRITE_FUNCTIONS = frozenset([
+    'nextval', 'setval', 'lo_creat', 'lo_create', 'lo_import', 'lo_unlink', 'lo_from_bytea', 'lo_put',
+    'pg_notify', 'txid_current', 'pg_current_xact_id',
+])
+
+
+def is_select(query):
+    """
+    True when the query is a single statement that only reads data: SELECT, WITH ... SELECT,
+    VALUES or TABLE, possibly parenthesized or combined with UNION/INTERSECT/EXCEPT
+
+    Calls to the built-in WRITE_FUNCTIONS make it a write. User-defined functions that write
+    cannot be told apart from reads, so queries calling them must be sent with use_primary.
+    """
+    statements = parse_statements(query)
+    if len(statements) != 1:
+        return False
+
+    tokens = [
+        token for token in statements[0].flatten()
+        if not (token.is_whitespace or token.ttype in T.Comment)
+    ]
+    first = next((token for token in tokens if not token.match(T.Punctuation, '(')), None)
+    if first is None or not first.is_keyword or first.normalized not in READ_STATEMENTS:
+        return False
+
+    previous = None
+    function = None
+    for token in tokens:
+        # Data-modifying CTEs and FOR UPDATE locking clauses
+        if token.ttype in T.Keyword.DML and token.normalized in ('INSERT', 'UPDATE', 'DELETE', 'MERGE'):
+            return False
+        # SELECT ... INTO creates a table
+        if token.ttype in T.Keyword and token.normalized == 'INTO':
+            return False
+        # FOR SHARE / FOR NO KEY UPDATE / FOR KEY SHARE take row locks
+        if previous == 'FOR' and token.normalized in ('SHARE', 'NO', 'KEY'):
+            return False
+        if token.match(T.Punctuation, '(') and function in WRITE_FUNCTIONS:
+            return False
+        previous = token.normalized if token.ttype in T.Keyword else None
+        if token.ttype in T.Name:
+            function = token.value.lower()
+        elif token.ttype in T.Literal.String.Symbol:
+            function = token.value[1:-1]
+        else:
+            function = None
+    return True
+
+
+def normalize_sql(query):
+    """Canonical form of a query for caching: no comments, collapsed whitespace, upper-case keywords"""
+    statements = []
+    for statement in parse_statements(query):
+        parts = []
+        pending_space = False
+        for token in statement.flatten():
+            # Comments and whitespace only separate tokens; string literals are kept verbatim
+            if token.is_whitespace or token.ttype in T.Comment:
+                pending_space = True
+                continue
+            if token.match(T.Punctuation, ';'):
+                continue
+            if pending_space and parts:
+                parts.append(' ')
+            pending_space = False
+            parts.append(token.normalized if token.ttype in T.Keyword else token.value)
+        statements.append(''.join(parts))
+    return '; '.join(statements)
+
+
+def sql_fingerprint(query):
+    """Stable hash of the normalized query text"""
+    return hashlib.sha256(normalize_sql(query).encode('utf-8')).hexdigest()
+
+
+def is_explainable(query):
+    """True when the query is a single read (see is_select) or SELECT/INSERT/UPDATE/DELETE, which EXPLAIN accepts"""
+    statements = parse_statements(query)
+    return len(statements) == 1 and (
+        statements[0].get_type() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') or is_select(query)
+    )
+
+
+def has_limit(query):
+    """True when the outermost statement already has a LIMIT or FETCH clause"""
+    statement = parse_statements(query)[0]
+    return any(token.is_keyword and token.normalized in ('LIMIT', 'FETCH') for token in statement.tokens)
+
+
+def strip_statement(query):
+    """
+    A single statement without its trailing semicolon, comments and whitespace, so it can be
+    wrapped in a subquery or have clauses appended (a trailing -- comment would swallow them)
+    """
+    tokens = list(parse_statements(query)[0].flatten())
+    while tokens and (tokens[-1].is_whitespace or tokens[-1].ttype in T.Comment or tokens[-1].match(T.Punctuation, ';')):
+        tokens.pop()
+    return ''.join(token.value for token in tokens)
+
+
+def add_limit(query, limit):
+    """Append LIMIT to a single statement, dropping the trailing semicolon and comments first"""
+    return strip_statement(query) + f"\nLIMIT {int(limit)}"
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStatusTracker:
+    """Keeps ClientDatabase.connection_status in memory and writes back only real transitions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = {}    # database id -> latest status seen in this process
+        self._persisted = {}  # database id -> status last known to be stored
+        self._pending = {}    # database id -> status waiting to be flushed (latest wins)
+        self._thread = None
+        self._pid = None
+
+    def set(self, database_obj, status):
+        """Record a status change; the database row is updated later by the flusher"""
+        # Remember what the row held when this instance was loaded, before we mutate it
+        baseline = database_obj.__dict__.setdefault('_stored_connection_status', database_obj.connection_status)
+        database_obj.connection_status = status
+
+        pk = database_obj.pk
+        with self._lock:
+            if pk not in self._pending:
+                # When the instance and our last flush disagree (e.g. the instance was loaded
+                # before that flush) the stored value is unknown and any status gets written
+                self._persisted[pk] = baseline if self._persisted.get(pk, baseline) == baseline else None
+            self._current[pk] = status
+            if status != self._persisted[pk]:
+                self._pending[pk] = status
+            else:
+                # Back to the stored value, nothing to write
+                self._pending.pop(pk, None)
+
+        self._ensure_flusher()
+
+    def get(self, pk, default=None):
+        """Current in-memory status for a database, falling back to the stored value"""
+        with self._lock:
+            return self._current.get(pk, default)
+
+    def flush(self):
+        """Write pending transitions to the app database"""
+        from .models import ClientDatabase
+
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+
+        failed = {}
+        for pk, status in pending.items():
+            try:
+                ClientDatabase.objects.filter(pk=pk).update(connection_status=status)
+            except Exception as e:
+                logger.warning("Could not persist connection status for database %s: %s", pk, e)
+                failed[pk] = status
+                continue
+            with self._lock:
+                self._persisted[pk] = status
+
+        if failed:
+            with self._lock:
+                # Keep newer transitions recorded while we were flushing
+                for pk, status in failed.items():
+                    self._pending.setdefault(pk, status)
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='connection-status-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        interval = getattr(settings, 'CLIENT_DB_STATUS_FLUSH_INTERVAL', 5)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            finally:
+                # This thread owns its own app-DB connection; don't let it go stale
+                close_old_connections()
+
+
+# Shared by every DatabaseConnector in this process
+connection_status_tracker = ConnectionStatusTracker()
+atexit.register(connection_status_tracker.flush)
@@ -0,0 +1,225 @@
+"""Stand-ins for psycopg2 connections and the clock, so client database code can run without a server"""
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from psycopg2 import extensions
+
+from databases.cache import QueryResultCache
+from databases.models import ClientDatabase
+from databases.plans import PlanCache
+from databases.services import DatabaseConnector
+from databases.workload import WorkloadScheduler
+
+TEXT_OID = 25
+
+
+def client_database(pk=1, **fields):
+    """An unsaved ClientDatabase, for code that only reads its settings"""
+    fields = dict({'name': 'db', 'host': 'localhost', 'database_name': 'db', 'username': 'u', 'password': 'p'}, **fields)
+    return ClientDatabase(pk=pk, **fields)
+
+
+def create_client_database(username='owner', **fields):
+    """A ClientDatabase row (and its owner) for tests that never actually connect to it"""
+    owner, _ = get_user_model().objects.get_or_create(username=username)
+    database = client_database(pk=None, owner=owner, **fields)
+    database.save()
+    return database
+
+
+class FakeClock:
+    """Replaces time.monotonic so TTLs and timeouts can be stepped through"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeCursor:
+    def __init__(self, connection, name=None):
+        self.connection = connection
+        self.name = name
+        self.itersize = 2000
+        self.description = None
+        self.rowcount = -1
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.closed_cursors.append(self.name)
+
+    def execute(self, query, params=None):
+        connection = self.connection
+        if isinstance(query, bytes):
+            # psycopg2.extras helpers send pre-mogrified bytes
+            query = query.decode('utf-8')
+        connection.executed.append((query, params))
+        if not connection.autocommit:
+            connection.status = extensions.TRANSACTION_STATUS_INTRANS
+        response = connection.responder(query, params)
+        if isinstance(response, Exception):
+            connection.status = extensions.TRANSACTION_STATUS_INERROR
+            raise response
+        columns, rows = response if response is not None else (None, [])
+        if columns is None:
+            self.description = None
+            self.rowcount = len(rows) if isinstance(rows, list) else rows
+            self._rows = []
+        else:
+            self.description = [
+                column if isinstance(column, tuple) else (column, TEXT_OID, None, None, None, None, None)
+                for column in columns
+            ]
+            self._rows = list(rows)
+            self.rowcount = len(self._rows)
+
+    def mogrify(self, query, params=None):
+        if isinstance(query, bytes):
+            query = query.decode('utf-8')
+        if params is not None:
+            query = query % tuple(repr(param) for param in params)
+        return query.encode('utf-8')
+
+    def copy_expert(self, sql, file, size=8192):
+        """COPY is answered by responder(sql, file), which writes to or reads from file itself"""
+        self.execute(sql, file)
+
+    def executemany(self, query, params_list):
+        for params in params_list:
+            self.execute(query, params)
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchmany(self, size=None):
+        size = size or self.itersize
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+
+class FakeConnection:
+    """
+    Records every statement it runs. responder(query, params) answers them with
+    (columns, rows) for a result set, (None, rowcount) for a command, None for nothing,
+    or an exception instance to raise.
+    """
+
+    def __init__(self, responder=None, backend_pid=4242):
+        self.responder = responder or (lambda query, params: None)
+        self.backend_pid = backend_pid
+        self.executed = []
+        self.closed_cursors = []
+        self.autocommit = False
+        self.closed = 0
+        self.cancelled = 0
+        self.encoding = 'UTF8'
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.commits = 0
+        self.parameters = {'DateStyle': 'ISO, MDY'}
+        self.info = SimpleNamespace(parameter_status=self.parameters.get)
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def get_backend_pid(self):
+        return self.backend_pid
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self.commits += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cancel(self):
+        self.cancelled += 1
+
+    @property
+    def queries(self):
+        return [query for query, _ in self.executed]
+
+
+def explain_result(total_cost=10.0, rows=100, **plan):
+    """A responder answer for EXPLAIN (FORMAT JSON)"""
+    root = dict({'Node Type': 'Seq Scan', 'Total Cost': total_cost, 'Startup Cost': 0.0, 'Plan Rows': rows}, **plan)
+    return ['QUERY PLAN'], [([{'Plan': root}],)]
+
+
+class FakeConnectorMixin:
+    """
+    For tests of DatabaseConnector: connection() and read_connection() hand out FakeConnections
+    from the responder, with endpoint set to 'primary' or 'read'. The process-wide cache,
+    scheduler and status tracker are replaced with fresh ones (the status tracker with a mock,
+    so nothing is written)
+    """
+
+    responder = None
+
+    def setUp(self):
+        super().setUp()
+        self.connections = []
+        self.connector = DatabaseConnector()
+
+        def endpoint(kind):
+            @contextmanager
+            def checkout(connector, database_obj, *args, **kwargs):
+                conn = FakeConnection(lambda query, params: self.respond(query, params))
+                conn.endpoint = kind
+                self.connections.append(conn)
+                yield conn
+            return checkout
+
+        self.result_cache = QueryResultCache()
+        self.plan_cache = PlanCache()
+        self.scheduler = WorkloadScheduler()
+        self.status_tracker = mock.Mock()
+        for patcher in [
+            mock.patch.object(DatabaseConnector, 'connection', endpoint('primary')),
+            mock.patch.object(DatabaseConnector, 'read_connection', endpoint('read')),
+            # The real casters only register on psycopg2 cursors
+            mock.patch('databases.services.register_casters'),
+            mock.patch('databases.services.query_result_cache', self.result_cache),
+            mock.patch('databases.services.plan_cache', self.plan_cache),
+            mock.patch('databases.services.workload_scheduler', self.scheduler),
+            mock.patch('databases.views.workload_scheduler', self.scheduler),
+            mock.patch('databases.services.connection_status_tracker', self.status_tracker),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def respond(self, query, params):
+        if 'set_config' in query:
+            return ['set_config'], [('',)]
+        return self.responder(query, params) if self.responder else None
+
+    @property
+    def queries(self):
+        return [query for conn in self.connections for query in conn.queries]
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from databases.workload import QueueTimeout, WorkloadScheduler
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database
+from .test_streaming import numbers
+
+
+class AsyncExecuteQueryTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+
+    def test_result_matches_the_sync_path_and_the_slot_is_released(self):
+        self.responder = numbers(2)
+        result = asyncio.run(self.connector.aexecute_query(self.database, "SELECT id FROM t", execution_id='run-1'))
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['execution_id'], 'run-1')
+        self.assertEqual(len(result['rows']), 2)
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+    def test_cancelled_task_cancels_the_statement(self):
+        started, finish = threading.Event(), threading.Event()
+
+        def respond(query, params):
+            started.set()
+            finish.wait(5)
+            return ['id'], [(1,)]
+        self.responder = respond
+
+        async def run_and_cancel():
+            task = asyncio.ensure_future(
+                self.connector.aexecute_query(self.database, "SELECT pg_sleep(60)", execution_id='run-1'))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        with mock.patch.object(self.connector, 'cancel_execution', side_effect=lambda *args: finish.set()) as cancel:
+            asyncio.run(run_and_cancel())
+        cancel.assert_called_once_with(self.database, 'run-1')
+
+
+class AdmissionTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = WorkloadScheduler()
+        self.database = client_database()
+
+    def test_abandoned_admission_cannot_be_entered_and_releases_once(self):
+        admission = asyncio.run(self.scheduler.aadmit(self.database, 1))
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 1)
+        admission.abandon()
+        admission.abandon()
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+        with self.assertRaises(QueueTimeout):
+            with admission:
+                pass
+
+    def test_entered_admission_is_not_released_by_abandon(self):
+        admission = asyncio.run(self.scheduler.aadmit(self.database, 1))
+        with admission:
+            admission.abandon()
+            self.assertEqual(self.scheduler.stats(self.database)['running'], 1)
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+
+class ExecuteQueryAsyncViewTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.url = reverse('database-execute-query-async', args=[self.database.pk])
+        self.auth = {'HTTP_AUTHORIZATION': f"Bearer {RefreshToken.for_user(self.database.owner).access_token}"}
+
+    def test_requires_authentication(self):
+        response = self.client.post(self.url, {'query': 'SELECT 1'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_other_users_database_is_not_found(self):
+        other = create_client_database(username='other')
+        response = self.client.post(reverse('database-execute-query-async', args=[other.pk]),
+                                    {'query': 'SELECT 1'}, content_type='application/json', **self.auth)
+        self.assertEqual(response.status_code, 404)
+
+    def test_runs_the_query(self):
+        self.responder = numbers(3)
+        response = self.client.post(self.url, {'query': 'SELECT id FROM t'}, content_type='application/json',
+                                    **self.auth)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['rows'], [[0], [1], [2]])
@@ -0,0 +1,92 @@
+import json
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database
+
+
+class ExecuteBatchTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+        self.responder = self.respond_to_batch
+
+    def respond_to_batch(self, query, params):
+        if query.startswith('SELECT'):
+            return ['id'], [(1,), (2,)]
+        if 'RETURNING' in query:
+            return ['id'], [(len(self.queries),)]
+        if query.startswith('FAIL'):
+            return RuntimeError('syntax error at or near "FAIL"')
+        return None, 1
+
+    def batch_queries(self):
+        return [query for query in self.queries if 'set_config' not in query]
+
+    def test_statements_run_in_one_committed_transaction(self):
+        result = self.connector.execute_batch(self.database, [
+            {'query': "INSERT INTO t VALUES (%s)", 'params': [1]},
+            {'query': "SELECT id FROM t"},
+        ])
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['results'][0]['affected_rows'], 1)
+        self.assertEqual(result['results'][1]['rows'], [(1,), (2,)])
+        conn = self.connections[0]
+        self.assertEqual((conn.commits, conn.rollbacks), (1, 0))
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+    def test_failing_statement_rolls_back_the_batch(self):
+        result = self.connector.execute_batch(self.database, [
+            {'query': "INSERT INTO t VALUES (1)"},
+            {'query': "FAIL"},
+        ])
+
+        self.assertFalse(result['success'])
+        self.assertEqual((result['failed_statement'], result['rolled_back']), (1, True))
+        self.assertEqual(result['error_type'], 'syntax_error')
+        self.assertEqual(self.connections[0].commits, 0)
+
+    def test_params_list_is_sent_in_pages_with_execute_batch(self):
+        result = self.connector.execute_batch(self.database, [
+            {'query': "UPDATE t SET v = %s WHERE id = %s", 'params_list': [[1, 1], [2, 2], [3, 3]]},
+        ])
+        self.assertEqual(result['results'][0]['rows_submitted'], 3)
+        self.assertEqual(self.batch_queries(), [
+            "UPDATE t SET v = 1 WHERE id = 1;UPDATE t SET v = 2 WHERE id = 2;UPDATE t SET v = 3 WHERE id = 3"
+        ])
+
+    def test_values_expands_the_rows_into_one_statement(self):
+        self.connector.execute_batch(self.database, [
+            {'query': "INSERT INTO t (id, name) VALUES %s", 'params_list': [[1, 'a'], [2, 'b']], 'values': True},
+        ])
+        self.assertEqual(self.batch_queries(), ["INSERT INTO t (id, name) VALUES (1,'a'),(2,'b')"])
+
+    def test_returning_statements_run_once_per_parameter_set(self):
+        result = self.connector.execute_batch(self.database, [
+            {'query': "INSERT INTO t VALUES (%s) RETURNING id", 'params_list': [[1], [2]]},
+        ])
+        self.assertEqual(len(self.batch_queries()), 2)
+        self.assertIn('affected_rows', result['results'][0])
+
+    def test_read_only_batch_does_not_invalidate_the_cache(self):
+        key = self.result_cache.make_key(self.database.pk, "SELECT 1")
+        self.result_cache.put(key, {'columns': [], 'rows': []})
+        self.connector.execute_batch(self.database, [{'query': "SELECT id FROM t"}])
+        self.assertIsNotNone(self.result_cache.get(key)[0])
+        self.connector.execute_batch(self.database, [{'query': "DELETE FROM t"}])
+        self.assertIsNone(self.result_cache.get(key)[0])
+
+
+class ExecuteBatchViewTests(FakeConnectorMixin, TestCase):
+    def test_failed_batch_reports_the_rollback(self):
+        database = create_client_database()
+        client = APIClient()
+        client.force_authenticate(database.owner)
+        self.responder = lambda query, params: RuntimeError("boom")
+        response = client.post(reverse('clientdatabase-execute-batch', args=[database.pk]),
+                               {'statements': [{'query': 'DELETE FROM t'}]}, format='json')
+        data = json.loads(response.content)
+        self.assertEqual((data['success'], data['rolled_back'], data['failed_statement']), (False, True, 0))
@@ -0,0 +1,112 @@
+from unittest import mock
+
+import psycopg2
+from django.test import SimpleTestCase, override_settings
+
+from databases.breaker import CLOSED, HALF_OPEN, OPEN, BreakerRegistry, CircuitBreaker, CircuitOpen
+from databases.pool import pool_registry
+from databases.services import DatabaseConnector
+
+from .fakes import FakeClock, client_database
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('databases.breaker.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def open_breaker(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+        self.assertEqual(self.breaker.retry_in(), 30)
+
+    def test_lets_one_probe_through_after_reset_timeout(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        self.assertTrue(self.breaker.available())
+
+        self.breaker.before_call()
+        self.assertFalse(self.breaker.available())
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.before_call()
+
+    def test_released_probe_lets_the_next_caller_probe(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.before_call()
+        self.breaker.release_probe()
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_force_skips_the_wait(self):
+        self.open_breaker()
+        self.breaker.before_call(force=True)
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CLOSED)
+
+
+@override_settings(CLIENT_DB_BREAKER_FAILURE_THRESHOLD=2)
+class ConnectionBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = BreakerRegistry()
+        self.connect = mock.Mock(side_effect=psycopg2.OperationalError("could not connect"))
+        for patcher in [
+            mock.patch('databases.services.breaker_registry', self.registry),
+            mock.patch('databases.services.connection_status_tracker'),
+            mock.patch('databases.pool.psycopg2.connect', self.connect),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.connector = DatabaseConnector()
+        self.database = client_database(pk=9001)
+        self.addCleanup(pool_registry.discard, self.database.pk)
+
+    def test_open_breaker_fails_fast_without_connecting(self):
+        for _ in range(2):
+            with self.assertRaises(psycopg2.OperationalError):
+                with self.connector.connection(self.database):
+                    pass
+        with self.assertRaises(CircuitOpen):
+            with self.connector.connection(self.database):
+                pass
+        self.assertEqual(self.connect.call_count, 2)
+
+        result = self.connector.execute_query(self.database, "DELETE FROM t")
+        self.assertEqual(result['error_type'], 'connection_error')
+        self.assertEqual(self.connect.call_count, 2)
+
+    def test_probe_connects_even_while_open(self):
+        self.registry.get(self.database.pk).record_failure()
+        self.registry.get(self.database.pk).record_failure()
+        with self.assertRaises(psycopg2.OperationalError):
+            with self.connector.connection(self.database, probe=True):
+                pass
+        self.assertEqual(self.connect.call_count, 1)
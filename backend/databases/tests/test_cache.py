@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.cache import LRUCache, QueryResultCache
+
+from .fakes import FakeClock, FakeConnectorMixin, client_database, create_client_database
+from .test_streaming import numbers
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used_entries_to_stay_within_max_bytes(self):
+        cache = LRUCache(max_bytes=100, ttl=60)
+        cache.set('a', 1, 40)
+        cache.set('b', 2, 40)
+        cache.get('a')
+        cache.set('c', 3, 40)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.size_bytes, 80)
+
+    def test_rejects_a_value_larger_than_the_cache(self):
+        cache = LRUCache(max_bytes=100, ttl=60)
+        self.assertFalse(cache.set('a', 1, 101))
+        self.assertEqual(len(cache), 0)
+
+    def test_replacing_a_key_counts_its_size_once(self):
+        cache = LRUCache(max_bytes=100, ttl=60)
+        cache.set('a', 1, 60)
+        cache.set('a', 2, 70)
+        self.assertEqual((cache.get('a'), cache.size_bytes), (2, 70))
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        with mock.patch('databases.cache.time.monotonic', clock):
+            cache = LRUCache(max_bytes=100, ttl=10)
+            cache.set('a', 1, 10)
+            clock.advance(9)
+            self.assertEqual(cache.get('a'), 1)
+            clock.advance(2)
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_delete_where(self):
+        cache = LRUCache(max_bytes=100, ttl=60)
+        for key in [(1, 'x'), (1, 'y'), (2, 'x')]:
+            cache.set(key, key, 10)
+        self.assertEqual(cache.delete_where(lambda key: key[0] == 1), 2)
+        self.assertEqual(len(cache), 1)
+
+
+class QueryResultCacheTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+        self.responder = numbers(3)
+
+    def test_equivalent_select_is_served_from_the_cache(self):
+        first = self.connector.execute_query(self.database, "SELECT id FROM t")
+        second = self.connector.execute_query(self.database, "select  id\nFROM t -- again")
+
+        self.assertFalse(first['cache']['hit'])
+        self.assertTrue(second['cache']['hit'])
+        self.assertEqual(second['rows'], first['rows'])
+        self.assertNotEqual(second['execution_id'], first['execution_id'])
+        self.assertEqual(self.queries.count("SELECT id FROM t"), 1)
+
+    def test_write_invalidates_the_databases_results(self):
+        self.connector.execute_query(self.database, "SELECT id FROM t")
+        self.connector.execute_query(self.database, "UPDATE t SET id = id + 1")
+        result = self.connector.execute_query(self.database, "SELECT id FROM t")
+        self.assertFalse(result['cache']['hit'])
+
+    def test_bypass_runs_the_query_and_refreshes_the_entry(self):
+        self.connector.execute_query(self.database, "SELECT id FROM t")
+        self.responder = numbers(1)
+        fresh = self.connector.execute_query(self.database, "SELECT id FROM t", bypass_cache=True)
+        cached = self.connector.execute_query(self.database, "SELECT id FROM t")
+
+        self.assertFalse(fresh['cache']['hit'])
+        self.assertEqual(cached['rows'], fresh['rows'])
+        self.assertEqual(len(cached['rows']), 1)
+
+    def test_truncated_result_is_not_cached(self):
+        self.database.max_result_rows = 2
+        self.connector.execute_query(self.database, "SELECT id FROM t")
+        self.assertEqual(len(self.result_cache._cache), 0)
+
+
+class ClientDatabaseCacheInvalidationTests(TestCase):
+    def setUp(self):
+        self.database = create_client_database()
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+        self.url = reverse('clientdatabase-detail', args=[self.database.pk])
+        self.cache = QueryResultCache()
+        patcher = mock.patch('databases.views.query_result_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache.put(self.cache.make_key(self.database.pk, "SELECT 1"), {'columns': ['x'], 'rows': [[1]]})
+
+    def test_editing_the_connection_drops_its_cached_results(self):
+        response = self.client.patch(self.url, {'host': 'elsewhere'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.cache._cache), 0)
+
+    def test_deleting_the_database_drops_its_cached_results(self):
+        response = self.client.delete(self.url)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(len(self.cache._cache), 0)
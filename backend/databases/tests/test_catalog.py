@@ -0,0 +1,98 @@
+from django.test import SimpleTestCase, TestCase
+
+from databases.models import ColumnMetadata, RelationshipMetadata
+from databases.services import MetadataExtractor
+
+from .fakes import FakeConnection, FakeConnectorMixin, create_client_database
+
+CATALOG = [
+    ('public', 'author', 'id', 'integer', False, None, None, True, False),
+    ('public', 'author', 'name', 'text', True, None, 'Pen name', False, False),
+    ('public', 'book', 'id', 'integer', False, None, None, True, False),
+    ('public', 'book', 'author_id', 'integer', True, None, None, False, True),
+    ('sales', 'order_line', 'order_id', 'integer', False, None, None, True, True),
+    ('sales', 'order_line', 'line_no', 'integer', False, None, None, True, True),
+    ('sales', 'orders', 'id', 'integer', False, None, None, True, False),
+    ('sales', 'orders', 'line_count', 'integer', False, None, None, False, False),
+]
+FOREIGN_KEYS = [
+    ('public', 'book', 'author_id', 'public', 'author', 'id', 'book_author_fk'),
+    # A composite key comes back one row per column pair, matched by position
+    ('sales', 'order_line', 'order_id', 'sales', 'orders', 'id', 'line_order_fk'),
+    ('sales', 'order_line', 'line_no', 'sales', 'orders', 'line_count', 'line_order_fk'),
+]
+
+
+def catalog_database(query, params):
+    """Responder for a client catalog with the tables, columns and keys above"""
+    tables = sorted(set(row[:2] for row in CATALOG))
+    if 'md5(' in query:
+        return ['nspname', 'relname', 'md5'], [(schema, table, 'f') for schema, table in tables]
+    if 'n_live_tup' in query:
+        return ['nspname', 'relname', 'rows'], [(schema, table, 5) for schema, table in tables]
+    if 'information_schema.tables' in query:
+        return ['schema', 'name', 'type', 'description'], [(schema, table, 'BASE TABLE', None) for schema, table in tables]
+    if 'pg_catalog.pg_attribute a' in query and 'pg_get_expr' in query:
+        return [f'c{i}' for i in range(9)], CATALOG
+    if 'pg_catalog.pg_constraint con' in query and "contype = 'f'" in query:
+        return [f'c{i}' for i in range(7)], FOREIGN_KEYS
+    if 'relkind' in query and 'reltuples' in query:
+        return ['reltuples', 'relkind'], [(5, 'r')]
+
+
+class CatalogColumnsTests(SimpleTestCase):
+    def setUp(self):
+        self.conn = FakeConnection(catalog_database)
+
+    def test_columns_of_every_table_come_from_one_query(self):
+        catalog = MetadataExtractor().extract_catalog_columns(None, conn=self.conn)
+
+        self.assertEqual(len(self.conn.executed), 1)
+        self.assertEqual(sorted(catalog), [('public', 'author'), ('public', 'book'),
+                                           ('sales', 'order_line'), ('sales', 'orders')])
+        self.assertEqual(catalog[('public', 'author')][1], ('name', 'text', True, None, 'Pen name', False, False))
+        self.assertTrue(self.conn.queries[0].endswith("ORDER BY n.nspname, c.relname, a.attnum"))
+
+    def test_schema_pattern_and_table_filters(self):
+        extractor = MetadataExtractor()
+        extractor.extract_catalog_columns(None, schema_pattern='sal%', conn=self.conn)
+        extractor.extract_catalog_columns(None, table=('sales', 'orders'), conn=self.conn)
+
+        self.assertIn(" AND n.nspname LIKE %s", self.conn.queries[0])
+        self.assertEqual(self.conn.executed[0][1], ['sal%'])
+        self.assertEqual(self.conn.executed[1][1], ['sales', 'orders'])
+
+    def test_foreign_keys_come_from_pg_catalog(self):
+        rows = MetadataExtractor().extract_relationships(None, conn=self.conn)
+        self.assertEqual(rows, FOREIGN_KEYS)
+        self.assertIn('FROM pg_catalog.pg_constraint', self.conn.queries[0])
+
+
+class FullExtractionTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.responder = catalog_database
+
+    def test_columns_keys_and_comments_are_stored_without_per_column_queries(self):
+        success, message, changes = MetadataExtractor().extract_full_metadata(self.database)
+        self.assertTrue(success, message)
+
+        catalog_queries = [query for query in self.queries if 'information_schema.columns' in query
+                           or 'information_schema.key_column_usage' in query or 'pg_get_expr' in query]
+        self.assertEqual(len(catalog_queries), 1)
+        self.assertEqual(len(changes['columns']['added']), len(CATALOG))
+
+        name = ColumnMetadata.objects.get(table__table_name='author', column_name='name')
+        self.assertEqual(name.description, 'Pen name')
+        book_author = ColumnMetadata.objects.get(table__table_name='book', column_name='author_id')
+        self.assertTrue(book_author.is_foreign_key)
+        self.assertFalse(book_author.is_primary_key)
+
+    def test_composite_foreign_keys_link_matching_columns_only(self):
+        MetadataExtractor().extract_full_metadata(self.database)
+        pairs = sorted(
+            (r.from_column.column_name, r.to_column.column_name)
+            for r in RelationshipMetadata.objects.filter(from_column__table__table_name='order_line')
+        )
+        self.assertEqual(pairs, [('line_no', 'line_count'), ('order_id', 'id')])
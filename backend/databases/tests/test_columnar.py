@@ -0,0 +1,97 @@
+import json
+import unittest
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.columnar import arrow_stream, to_columnar
+from databases.limits import ResultBudget
+
+from .fakes import FakeConnectorMixin, create_client_database
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+def id_and_name(count):
+    """Responder answering with an integer id and a text name column"""
+    columns = [('id', 23, None, None, None, None, None), 'name']
+    return lambda query, params: (columns, [(i, f"n{i}") for i in range(count)])
+
+
+def read_arrow(chunks):
+    return pyarrow.ipc.open_stream(b''.join(chunks))
+
+
+class ToColumnarTests(SimpleTestCase):
+    def test_rows_are_pivoted_into_one_array_per_column(self):
+        result = to_columnar({'columns': ['id', 'name'], 'rows': [[1, 'a'], [2, 'b']], 'success': True})
+        self.assertEqual(result['data'], [[1, 2], ['a', 'b']])
+        self.assertEqual((result['format'], result['row_count'], result['success']), ('columnar', 2, True))
+        self.assertNotIn('rows', result)
+
+    def test_empty_result_keeps_an_array_per_column(self):
+        self.assertEqual(to_columnar({'columns': ['id', 'name'], 'rows': []})['data'], [[], []])
+
+
+@unittest.skipUnless(pyarrow, "pyarrow is not installed")
+class ArrowStreamTests(SimpleTestCase):
+    def test_batches_become_typed_record_batches(self):
+        chunks = arrow_stream(['id', 'tags', 'price'], ['integer', 'jsonb', 'numeric'],
+                              iter([[(1, ['a'], 1.5)], [(2, None, None)]]))
+        reader = read_arrow(chunks)
+        table = reader.read_all()
+
+        self.assertEqual(str(reader.schema.field('id').type), 'int32')
+        self.assertEqual(table.column('tags').to_pylist(), ['["a"]', None])
+        self.assertEqual(table.column('price').to_pylist(), [1.5, None])
+
+    def test_truncated_stream_ends_with_a_flagged_empty_batch(self):
+        budget = ResultBudget(max_rows=1, max_bytes=10 ** 6)
+        chunks = arrow_stream(['id'], ['integer'], iter([budget.take([(1,), (2,)])]), budget)
+        reader = read_arrow(chunks)
+        last = None
+        while True:
+            try:
+                last = reader.read_next_batch_with_custom_metadata()
+            except StopIteration:
+                break
+        self.assertEqual(last.batch.num_rows, 0)
+        self.assertEqual(last.custom_metadata[b'truncated'], b'true')
+        self.assertEqual(last.custom_metadata[b'limit'], b'max_rows')
+
+
+class ColumnarFormatViewTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+        self.url = reverse('clientdatabase-execute-query', args=[self.database.pk])
+
+    def test_columnar_format(self):
+        self.responder = id_and_name(2)
+        response = self.client.post(self.url, {'query': 'SELECT id, name FROM t', 'format': 'columnar'},
+                                    format='json')
+        data = json.loads(response.content)
+        self.assertEqual(data['data'], [[0, 1], ['n0', 'n1']])
+        self.assertEqual(data['column_types'], ['integer', 'text'])
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_arrow_format_streams_ipc(self):
+        self.responder = id_and_name(3)
+        response = self.client.post(self.url, {'query': 'SELECT id, name FROM t', 'format': 'arrow'},
+                                    format='json')
+        table = read_arrow(response.streaming_content).read_all()
+        self.assertEqual(table.column('id').to_pylist(), [0, 1, 2])
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+    def test_arrow_format_without_pyarrow_is_refused(self):
+        with mock.patch('databases.views.arrow_available', return_value=False):
+            response = self.client.post(self.url, {'query': 'SELECT 1', 'format': 'arrow'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_type'], 'format_unavailable')
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from databases.conversion import (
+    BYTEA_TEXT, INTERVAL, INTERVAL_ARRAY, NUMERIC_FLOAT, NUMERIC_FLOAT_ARRAY, NUMERIC_TEXT, TEXT_CASTERS,
+    TIMESTAMP_TEXT, ConversionPlan, column_types, register_casters
+)
+
+INTEGER, TEXT = 23, 25
+
+
+def description(*oids):
+    return [(f"c{index}", oid, None, None, None, None, None) for index, oid in enumerate(oids)]
+
+
+class CasterTests(SimpleTestCase):
+    def test_timestamps_keep_seconds_precision_wall_time(self):
+        self.assertEqual(TIMESTAMP_TEXT('2024-01-02 03:04:05.123+00', None), '2024-01-02 03:04:05')
+        self.assertIsNone(TIMESTAMP_TEXT(None, None))
+
+    def test_timestamp_arrays_use_the_element_caster(self):
+        timestamp_array = TEXT_CASTERS[3]
+        self.assertEqual(timestamp_array('{"2024-01-02 03:04:05.5",NULL}', None), ['2024-01-02 03:04:05', None])
+
+    def test_numeric_is_a_float_unless_exact_text_is_asked_for(self):
+        self.assertEqual(NUMERIC_FLOAT('1.50', None), 1.5)
+        self.assertEqual(NUMERIC_FLOAT_ARRAY('{1.5,NULL}', None), [1.5, None])
+        self.assertEqual(NUMERIC_TEXT('1.50', None), '1.50')
+
+    def test_bytea_stays_hex_text(self):
+        self.assertEqual(BYTEA_TEXT('\\x00ff', None), '\\x00ff')
+
+    def test_register_casters_picks_the_numeric_caster(self):
+        cursor = object()
+        with mock.patch('databases.conversion.extensions.register_type') as register_type:
+            register_casters(cursor, exact_numeric=True)
+        registered = [call.args[0] for call in register_type.call_args_list]
+        # Type objects compare equal by OID, so check identity
+        self.assertTrue(any(caster is NUMERIC_TEXT for caster in registered))
+        self.assertFalse(any(caster is NUMERIC_FLOAT for caster in registered))
+        self.assertTrue(all(call.args[1] is cursor for call in register_type.call_args_list))
+
+
+class ConversionPlanTests(SimpleTestCase):
+    def test_batch_with_nothing_to_convert_is_returned_as_is(self):
+        rows = [(1, 'a'), (2, 'b')]
+        self.assertIs(ConversionPlan(description(INTEGER, TEXT)).rows(rows), rows)
+
+    def test_only_interval_columns_are_converted(self):
+        plan = ConversionPlan(description(INTEGER, INTERVAL, INTERVAL_ARRAY))
+        rows = plan.rows([(1, timedelta(minutes=1, seconds=30), [timedelta(seconds=1), None]), (2, None, None)])
+        self.assertEqual(rows, [[1, '90.0', ['1.0', None]], [2, None, None]])
+
+    def test_column_types_names_known_oids(self):
+        self.assertEqual(column_types(description(INTEGER, 1700, 999999)), ['integer', 'numeric', 'unknown'])
+        self.assertEqual(column_types(None), [])
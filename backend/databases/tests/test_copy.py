@@ -0,0 +1,167 @@
+import gzip
+import io
+import threading
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.copyio import CopyAborted
+from databases.models import TableMetadata
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database
+
+
+def copy_rows(*lines):
+    """Responder answering COPY ... TO STDOUT with the given CSV lines"""
+    def respond(query, file):
+        if query.startswith('COPY'):
+            for line in lines:
+                file.write(line)
+    return respond
+
+
+class CopyExportTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database(statement_timeout=1000)
+
+    def copy_statement(self):
+        return next(query for query in self.queries if query.startswith('COPY'))
+
+    def test_csv_is_streamed_from_copy(self):
+        self.responder = copy_rows('id\n', '1\n', '2\n')
+        data = b''.join(self.connector.copy_export(self.database, "SELECT id FROM t WHERE id > %s", [0]))
+
+        self.assertEqual(data, b'id\n1\n2\n')
+        self.assertEqual(self.copy_statement(),
+                         "COPY (SELECT id FROM t WHERE id > 0) TO STDOUT WITH (FORMAT csv, HEADER)")
+
+    def test_compressed_export_is_gzip(self):
+        self.responder = copy_rows('id\n', '1\n')
+        data = b''.join(self.connector.copy_export(self.database, "SELECT id FROM t", compress=True))
+        self.assertEqual(gzip.decompress(data), b'id\n1\n')
+
+    def test_trailing_comment_is_not_wrapped_into_the_copy(self):
+        self.responder = copy_rows('id\n')
+        list(self.connector.copy_export(self.database, "SELECT id FROM t; -- every id"))
+        self.assertEqual(self.copy_statement(), "COPY (SELECT id FROM t) TO STDOUT WITH (FORMAT csv, HEADER)")
+
+    def test_export_does_not_use_the_database_statement_timeout(self):
+        self.responder = copy_rows('id\n')
+        list(self.connector.copy_export(self.database, "SELECT id FROM t"))
+        self.assertEqual(self.connections[0].executed[0][1][0], '0')
+
+        with override_settings(QUERY_EXPORT_STATEMENT_TIMEOUT_MS=600000):
+            list(self.connector.copy_export(self.database, "SELECT id FROM t"))
+        self.assertEqual(self.connections[1].executed[0][1][0], '600000')
+
+    @override_settings(QUERY_EXPORT_CHUNK_BYTES=4, QUERY_EXPORT_QUEUE_CHUNKS=1)
+    def test_consumer_stopping_early_cancels_and_closes_the_connection(self):
+        stopped = threading.Event()
+
+        def respond(query, file):
+            if query.startswith('COPY'):
+                try:
+                    while True:
+                        file.write('row\n')
+                except CopyAborted:
+                    stopped.set()
+                    raise
+        self.responder = respond
+
+        chunks = self.connector.copy_export(self.database, "SELECT id FROM t")
+        next(chunks)
+        chunks.close()
+
+        self.assertTrue(stopped.is_set())
+        conn = self.connections[0]
+        self.assertEqual(conn.cancelled, 1)
+        self.assertTrue(conn.closed)
+
+    def test_only_selects_can_be_exported(self):
+        with self.assertRaises(ValueError):
+            list(self.connector.copy_export(self.database, "DELETE FROM t"))
+
+
+def copy_in(rowcount):
+    """Responder answering COPY ... FROM STDIN by reading the whole upload"""
+    def respond(query, file):
+        if query.startswith('COPY'):
+            received.append(file.read())
+            return None, rowcount
+    received = []
+    respond.received = received
+    return respond
+
+
+class CopyImportTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database(statement_timeout=1000)
+
+    def test_csv_upload_is_fed_to_copy_and_committed(self):
+        self.responder = copy_in(2)
+        result = self.connector.copy_import(self.database, 'public', 'my table', io.BytesIO(b'id\n1\n2\n'),
+                                            delimiter=';', columns=['id'])
+
+        self.assertTrue(result['success'])
+        self.assertEqual((result['rows'], result['bytes']), (2, 7))
+        self.assertEqual(self.responder.received, [b'id\n1\n2\n'])
+        self.assertEqual(self.queries[-1],
+                         'COPY "public"."my table" ("id") FROM STDIN WITH (FORMAT csv, HEADER true, DELIMITER \';\')')
+        self.assertEqual(self.connections[0].commits, 1)
+
+    def test_import_does_not_use_the_database_statement_timeout(self):
+        self.responder = copy_in(0)
+        with override_settings(QUERY_IMPORT_STATEMENT_TIMEOUT_MS=120000):
+            self.connector.copy_import(self.database, 'public', 't', io.BytesIO(b'id\n'))
+        self.assertEqual(self.connections[0].executed[0][1][0], '120000')
+
+    def test_import_invalidates_cached_results(self):
+        self.responder = copy_in(1)
+        key = self.result_cache.make_key(self.database.pk, "SELECT 1")
+        self.result_cache.put(key, {'columns': [], 'rows': []})
+        self.connector.copy_import(self.database, 'public', 't', io.BytesIO(b'id\n1\n'))
+        self.assertIsNone(self.result_cache.get(key)[0])
+
+    def test_file_that_is_not_parquet_is_reported_as_invalid(self):
+        result = self.connector.copy_import(self.database, 'public', 't', io.BytesIO(b'not parquet'),
+                                            file_format='parquet')
+        self.assertEqual(result['error_type'], 'invalid_file')
+        self.status_tracker.set.assert_not_called()
+
+
+class ImportDataViewTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+        self.url = reverse('clientdatabase-import-data', args=[self.database.pk])
+        self.responder = copy_in(3)
+
+    def import_into(self, table):
+        upload = SimpleUploadedFile('rows.csv', b'id\n1\n2\n3\n')
+        with mock.patch('databases.views.MetadataExtractor.count_rows') as count_rows:
+            response = self.client.post(self.url, {'file': upload, 'table_id': table.pk}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        table.refresh_from_db()
+        return count_rows
+
+    def test_exact_row_count_grows_by_the_imported_rows(self):
+        table = TableMetadata.objects.create(database=self.database, table_name='t', table_type='table',
+                                             row_count=10, row_count_estimated=False)
+        count_rows = self.import_into(table)
+        self.assertEqual(table.row_count, 13)
+        count_rows.assert_not_called()
+
+    def test_missing_or_estimated_row_count_is_recounted(self):
+        for row_count in (None, 10):
+            table = TableMetadata.objects.create(database=self.database, table_name=f't{row_count}',
+                                                 table_type='table', row_count=row_count)
+            count_rows = self.import_into(table)
+            self.assertEqual(table.row_count, row_count)
+            count_rows.assert_called_once_with(self.database, [table], background=True)
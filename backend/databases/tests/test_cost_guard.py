@@ -0,0 +1,130 @@
+import json
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.limits import CostLimitExceeded, check_plan_estimate, cost_policy
+from databases.sqltools import add_limit, has_limit
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database, explain_result
+from .test_copy import copy_rows
+from .test_streaming import numbers
+
+
+def planned(total_cost, answer=None):
+    """Responder answering EXPLAIN with the given cost and anything else with answer"""
+    return lambda query, params: explain_result(total_cost=total_cost) if query.startswith('EXPLAIN') else answer
+
+
+class LimitRewriteTests(SimpleTestCase):
+    def test_has_limit_only_looks_at_the_outer_statement(self):
+        self.assertTrue(has_limit("select * from t limit 5;"))
+        self.assertTrue(has_limit("SELECT * FROM t OFFSET 10 ROWS FETCH FIRST 5 ROWS ONLY"))
+        self.assertFalse(has_limit("SELECT * FROM t"))
+        self.assertFalse(has_limit("SELECT * FROM (SELECT * FROM t LIMIT 1) s"))
+
+    def test_add_limit_drops_trailing_semicolon_and_comments(self):
+        self.assertEqual(add_limit("SELECT * FROM t; -- all of it\n", 100), "SELECT * FROM t\nLIMIT 100")
+
+
+class CheckPlanEstimateTests(SimpleTestCase):
+    def setUp(self):
+        self.policy = cost_policy(client_database(cost_guard_mode='reject', max_plan_cost=100, max_plan_rows=1000))
+
+    def test_estimate_within_thresholds_passes(self):
+        self.assertFalse(check_plan_estimate(self.policy, {'total_cost': 50, 'estimated_rows': 10}))
+
+    def test_reject_mode_refuses_even_with_an_override(self):
+        with self.assertRaises(CostLimitExceeded) as raised:
+            check_plan_estimate(self.policy, {'total_cost': 500, 'estimated_rows': 5000}, override=True)
+        self.assertIn("estimated cost 500 exceeds 100", str(raised.exception))
+        self.assertFalse(raised.exception.override_required)
+
+    def test_override_mode_needs_the_flag(self):
+        self.policy['mode'] = 'override'
+        with self.assertRaises(CostLimitExceeded) as raised:
+            check_plan_estimate(self.policy, {'total_cost': 500, 'estimated_rows': 1})
+        self.assertTrue(raised.exception.override_required)
+        self.assertTrue(check_plan_estimate(self.policy, {'total_cost': 500, 'estimated_rows': 1}, override=True))
+
+
+class ExecuteQueryCostGuardTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database(cost_guard_mode='override', max_plan_cost=100)
+
+    def test_expensive_statement_is_refused_before_it_runs(self):
+        self.responder = planned(5000, answer=(['id'], [(1,)]))
+        result = self.connector.execute_query(self.database, "SELECT * FROM a, b")
+
+        self.assertEqual(result['error_type'], 'cost_limit_exceeded')
+        self.assertEqual(result['cost_guard'], {'total_cost': 5000, 'estimated_rows': 100, 'overridden': False,
+                                                'override_required': True})
+        self.assertFalse(any(query.startswith('SELECT *') for query in self.queries))
+
+    def test_override_runs_it(self):
+        self.responder = planned(5000, answer=(['id'], [(1,)]))
+        result = self.connector.execute_query(self.database, "SELECT * FROM a, b", override_cost_guard=True)
+        self.assertTrue(result['success'])
+        self.assertTrue(result['cost_guard']['overridden'])
+
+    def test_auto_limit_is_added_to_selects_without_one(self):
+        self.database.auto_limit = 10
+        self.responder = planned(1, answer=(['id'], [(1,)]))
+        result = self.connector.execute_query(self.database, "SELECT id FROM t;")
+        self.assertEqual(result['rewritten_query'], "SELECT id FROM t\nLIMIT 10")
+
+        result = self.connector.execute_query(self.database, "UPDATE t SET id = 1")
+        self.assertNotIn('rewritten_query', result)
+
+    def test_guard_off_does_not_plan(self):
+        self.database.cost_guard_mode = 'off'
+        self.responder = numbers(1)
+        self.connector.execute_query(self.database, "SELECT id FROM t")
+        self.assertFalse(any(query.startswith('EXPLAIN') for query in self.queries))
+
+
+class GuardedEndpointTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database(cost_guard_mode='reject', max_plan_cost=100, max_result_rows=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+
+    def post(self, action, data):
+        return self.client.post(reverse(f'clientdatabase-{action}', args=[self.database.pk]), data, format='json')
+
+    def test_stream_is_cut_at_the_row_budget(self):
+        def respond(query, params):
+            return explain_result(total_cost=1) if query.startswith('EXPLAIN') else numbers(5)(query, params)
+        self.responder = respond
+        response = self.post('stream-query', {'query': 'SELECT id FROM t'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(lines[1:3], [[0], [1]])
+        self.assertEqual((lines[-1]['truncated'], lines[-1]['limit']), (True, 'max_rows'))
+
+    def test_stream_over_the_cost_threshold_is_refused(self):
+        self.responder = planned(5000)
+        response = self.post('stream-query', {'query': 'SELECT * FROM a, b'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_type'], 'cost_limit_exceeded')
+
+    def test_export_over_the_cost_threshold_is_refused(self):
+        self.responder = planned(5000)
+        response = self.post('export', {'query': 'SELECT * FROM a, b'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_type'], 'cost_limit_exceeded')
+        self.assertFalse(any(query.startswith('COPY') for query in self.queries))
+
+    def test_export_gets_the_auto_limit(self):
+        self.database.auto_limit = 10
+        self.database.save()
+        copy = copy_rows('id\n', '1\n')
+        self.responder = lambda query, params: explain_result(total_cost=1) if query.startswith('EXPLAIN') \
+            else copy(query, params)
+        response = self.post('export', {'query': 'SELECT id FROM t'})
+
+        self.assertEqual(b''.join(response.streaming_content), b'id\n1\n')
+        self.assertIn("COPY (SELECT id FROM t\nLIMIT 10) TO STDOUT WITH (FORMAT csv, HEADER)", self.queries)
@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.executions import ExecutionRegistry, application_name
+
+from .fakes import FakeConnectorMixin, create_client_database
+
+
+class ExecutionRegistryTests(SimpleTestCase):
+    def test_same_execution_id_on_two_databases_is_kept_apart(self):
+        registry = ExecutionRegistry()
+        registry.register(1, 'run', 101, "SELECT 1")
+        registry.register(2, 'run', 202, "SELECT 2")
+        registry.mark_cancelled(2, 'run')
+
+        self.assertEqual(registry.get(1, 'run')['backend_pid'], 101)
+        self.assertFalse(registry.get(1, 'run')['cancel_requested'])
+        self.assertTrue(registry.get(2, 'run')['cancel_requested'])
+        registry.unregister(2, 'run')
+        self.assertIsNone(registry.get(2, 'run'))
+        self.assertEqual([e['query'] for e in registry.running(1)], ["SELECT 1"])
+
+    def test_application_name_is_scoped_and_fits_postgres(self):
+        name = application_name(7, 'x' * 500)
+        self.assertTrue(name.startswith('dbms-query:7:'))
+        self.assertLessEqual(len(name), 63)
+        self.assertNotEqual(name, application_name(8, 'x' * 500))
+
+
+class CancelExecutionTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.registry = ExecutionRegistry()
+        patcher = mock.patch('databases.services.execution_registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_query_is_registered_only_while_it_runs(self):
+        seen = []
+
+        def respond(query, params):
+            seen.append(self.registry.get(self.database.pk, 'run-1'))
+            return ['id'], [(1,)]
+        self.responder = respond
+        self.connector.execute_query(self.database, "SELECT id FROM t", execution_id='run-1', owner_id=5)
+
+        self.assertEqual((seen[0]['query'], seen[0]['owner_id']), ("SELECT id FROM t", 5))
+        self.assertIsNone(self.registry.get(self.database.pk, 'run-1'))
+        _, params = self.connections[0].executed[0]
+        self.assertEqual(params[1], application_name(self.database.pk, 'run-1'))
+
+    def test_cancel_signals_the_backend_running_the_execution(self):
+        self.registry.register(self.database.pk, 'run-1', 4242, "SELECT pg_sleep(60)")
+        self.responder = lambda query, params: (['pg_cancel_backend'], [(True,)])
+
+        self.assertTrue(self.connector.cancel_execution(self.database, 'run-1'))
+        query, params = self.connections[0].executed[-1]
+        self.assertIn('pg_cancel_backend', query)
+        self.assertEqual(params, (application_name(self.database.pk, 'run-1'),))
+        self.assertTrue(self.registry.get(self.database.pk, 'run-1')['cancel_requested'])
+
+    def test_cancel_with_no_matching_backend_reports_failure(self):
+        self.responder = lambda query, params: (['pg_cancel_backend'], [])
+        self.assertFalse(self.connector.cancel_execution(self.database, 'run-1'))
+
+    def test_cancel_view_returns_404_when_nothing_was_running(self):
+        self.responder = lambda query, params: (['pg_cancel_backend'], [])
+        client = APIClient()
+        client.force_authenticate(self.database.owner)
+        response = client.post(reverse('clientdatabase-cancel-query', args=[self.database.pk]),
+                               {'execution_id': 'run-1'}, format='json')
+        self.assertEqual(response.status_code, 404)
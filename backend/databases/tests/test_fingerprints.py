@@ -0,0 +1,88 @@
+from django.test import SimpleTestCase
+
+from databases.models import ColumnMetadata, TableMetadata
+from databases.services import MetadataExtractor
+
+from .fakes import FakeConnection
+from .test_persistence import ExtractionTestCase
+
+
+class SchemaFingerprintTests(SimpleTestCase):
+    def test_database_hash_covers_every_table_in_any_order(self):
+        extractor = MetadataExtractor()
+        fingerprints = {('public', 'a'): '1', ('public', 'b'): '2'}
+        digest = extractor.schema_fingerprint(fingerprints)
+
+        self.assertEqual(extractor.schema_fingerprint(dict(reversed(list(fingerprints.items())))), digest)
+        self.assertNotEqual(extractor.schema_fingerprint({**fingerprints, ('public', 'c'): '3'}), digest)
+        self.assertNotEqual(extractor.schema_fingerprint({('public', 'a'): '1', ('public', 'b'): '3'}), digest)
+
+    def test_table_fingerprints_come_from_one_catalog_query(self):
+        conn = FakeConnection(lambda query, params: (['nspname', 'relname', 'md5'], [('public', 'a', 'f1')]))
+        self.assertEqual(MetadataExtractor().extract_fingerprints(conn), {('public', 'a'): 'f1'})
+        self.assertEqual(len(conn.executed), 1)
+        self.assertIn('c.xmin', conn.queries[0])
+
+    def test_catalog_read_can_be_limited_to_some_tables(self):
+        conn = FakeConnection(lambda query, params: ([f'c{i}' for i in range(9)], []))
+        MetadataExtractor().extract_catalog_columns(None, tables=[('public', 'a'), ('sales', 'b')], conn=conn)
+        query, params = conn.executed[0]
+        self.assertIn("(n.nspname, c.relname) IN (SELECT * FROM unnest(%s::text[], %s::text[]))", query)
+        self.assertEqual(params, [['public', 'sales'], ['a', 'b']])
+
+
+class IncrementalRefreshTests(ExtractionTestCase):
+    def test_fingerprints_are_stored(self):
+        self.extract()
+        self.assertEqual(TableMetadata.objects.get(table_name='author').fingerprint, 'a1')
+        self.assertEqual(self.database.schema_fingerprint, MetadataExtractor().schema_fingerprint(self.fingerprints))
+        self.assertEqual(self.catalog_reads, [None])
+
+    def test_only_changed_tables_are_read_and_diffed(self):
+        self.extract()
+        self.fingerprints[('public', 'author')] = 'a2'
+        self.columns[('public', 'author')] = [('id', 'bigint', False, None, None, True, False),
+                                              ('email', 'text', True, None, None, False, False)]
+        # Not picked up: the table's fingerprint did not change
+        self.columns[('public', 'book')].append(('title', 'text', True, None, None, False, False))
+        del self.fingerprints[('public', 'summary')]
+        self.tables.pop()
+
+        _, changes = self.extract()
+        self.assertEqual(self.catalog_reads[-1], [('public', 'author')])
+        self.assertEqual(changes['tables']['removed'], [{'schema': 'public', 'name': 'summary'}])
+        self.assertEqual(changes['columns']['added'], [{'table': 'public.author', 'name': 'email', 'type': 'text'}])
+        self.assertEqual(changes['columns']['updated'],
+                         [{'table': 'public.author', 'name': 'id', 'changes': {'type': 'bigint'}}])
+        self.assertEqual(changes['columns']['removed'], [{'table': 'public.author', 'name': 'name'}])
+        self.assertFalse(ColumnMetadata.objects.filter(column_name='title').exists())
+        # Relationships to unchanged tables are kept
+        self.assertEqual(changes['relationships'], {'added': [], 'updated': [], 'removed': []})
+
+    def test_new_tables_are_read(self):
+        self.extract()
+        self.tables.append(('public', 'review', 'table', None))
+        self.fingerprints[('public', 'review')] = 'r1'
+        self.columns[('public', 'review')] = [('id', 'integer', False, None, None, True, False)]
+
+        _, changes = self.extract()
+        self.assertEqual(self.catalog_reads[-1], [('public', 'review')])
+        self.assertEqual(changes['tables']['added'], [{'schema': 'public', 'name': 'review', 'type': 'table'}])
+
+    def test_unchanged_schema_only_refreshes_row_counts(self):
+        self.extract()
+        self.estimates[('public', 'book')] = 25
+
+        message, changes = self.extract()
+        self.assertIn('unchanged', message)
+        self.assertEqual(len(self.catalog_reads), 1)
+        self.assertEqual(changes['tables'], {'added': [], 'updated': [], 'removed': []})
+        self.assertEqual(TableMetadata.objects.get(table_name='book').row_count, 25)
+
+    def test_force_reads_everything(self):
+        self.extract()
+        self.columns[('public', 'book')].append(('title', 'text', True, None, None, False, False))
+
+        _, changes = self.extract(force=True)
+        self.assertEqual(self.catalog_reads, [None, None])
+        self.assertEqual(changes['columns']['added'], [{'table': 'public.book', 'name': 'title', 'type': 'text'}])
@@ -0,0 +1,71 @@
+import psycopg2.errors
+from django.test import SimpleTestCase, override_settings
+
+from databases.limits import ResultBudget, query_limits
+
+from .fakes import FakeConnectorMixin, client_database
+from .test_streaming import numbers
+
+
+class ResultBudgetTests(SimpleTestCase):
+    def test_batches_are_cut_at_the_row_limit(self):
+        budget = ResultBudget(max_rows=5, max_bytes=10 ** 6)
+        self.assertEqual(len(budget.take([(i,) for i in range(3)])), 3)
+        self.assertEqual(len(budget.take([(i,) for i in range(3)])), 2)
+        self.assertEqual(budget.exceeded, 'max_rows')
+        self.assertEqual(budget.take([(1,)]), [])
+        self.assertEqual(budget.limit_value(), 5)
+
+    def test_batches_are_cut_at_the_byte_budget(self):
+        row = ('x' * 96,)
+        budget = ResultBudget(max_rows=1000, max_bytes=len(repr(row)) * 10)
+        kept = budget.take([row] * 25)
+        self.assertEqual(len(kept), 10)
+        self.assertEqual(budget.exceeded, 'max_bytes')
+        self.assertLessEqual(budget.bytes, budget.max_bytes)
+
+
+class QueryLimitsTests(SimpleTestCase):
+    @override_settings(QUERY_STATEMENT_TIMEOUT_MS=1000, QUERY_MAX_ROWS=50, QUERY_MAX_BYTES=4096)
+    def test_settings_apply_unless_the_database_overrides_them(self):
+        self.assertEqual(query_limits(client_database()),
+                         {'statement_timeout': 1000, 'max_rows': 50, 'max_bytes': 4096})
+        database = client_database(statement_timeout=250, max_result_rows=7)
+        self.assertEqual(query_limits(database),
+                         {'statement_timeout': 250, 'max_rows': 7, 'max_bytes': 4096})
+
+
+class ExecuteQueryLimitTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database(statement_timeout=1500)
+
+    def test_statement_timeout_is_set_for_the_transaction_only(self):
+        self.responder = numbers(1)
+        self.connector.execute_query(self.database, "SELECT id FROM t")
+        query, params = self.connections[0].executed[0]
+        self.assertIn("set_config('statement_timeout', %s, true)", query)
+        self.assertEqual(params[0], '1500')
+
+    def test_result_over_the_row_cap_is_truncated(self):
+        self.database.max_result_rows = 4
+        self.responder = numbers(10)
+        result = self.connector.execute_query(self.database, "SELECT id FROM t")
+
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['rows']), 4)
+        self.assertEqual((result['truncated'], result['limit']), (True, 'max_rows'))
+
+    def test_on_limit_error_fails_instead(self):
+        self.database.max_result_rows = 4
+        self.responder = numbers(10)
+        result = self.connector.execute_query(self.database, "SELECT id FROM t", on_limit='error')
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error_type'], 'limit_exceeded')
+
+    def test_statement_timeout_is_reported_as_timeout_error(self):
+        self.responder = lambda query, params: psycopg2.errors.QueryCanceled(
+            "canceling statement due to statement timeout")
+        result = self.connector.execute_query(self.database, "SELECT pg_sleep(60)")
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error_type'], 'timeout_error')
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from databases.services import MetadataExtractor
+
+from .fakes import FakeConnection, FakeConnectorMixin, client_database
+from .test_persistence import ExtractionTestCase
+
+
+class ConcurrencyProbe:
+    """Work function that records how many calls overlap, finishing later keys first"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.connections = set()
+
+    def __call__(self, conn, key):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.connections.add(id(conn))
+        time.sleep(0.02 / (key + 1))
+        with self.lock:
+            self.running -= 1
+        return key * 10
+
+
+@override_settings(METADATA_EXTRACT_WORKERS=3, CLIENT_DB_POOL_MAX_SIZE=10)
+class RunPerTableTests(FakeConnectorMixin, SimpleTestCase):
+    def test_results_follow_the_key_order(self):
+        probe = ConcurrencyProbe()
+        results = MetadataExtractor().run_per_table(client_database(pk=101), list(range(8)), probe)
+
+        self.assertEqual(list(results.items()), [(key, key * 10) for key in range(8)])
+        self.assertEqual(probe.peak, 3)
+        # One pooled connection per worker, reused for all of its keys
+        self.assertEqual(len(self.connections), 3)
+
+    def test_workers_leave_a_pool_connection_free(self):
+        probe = ConcurrencyProbe()
+        with override_settings(CLIENT_DB_POOL_MAX_SIZE=3):
+            MetadataExtractor().run_per_table(client_database(pk=102), list(range(8)), probe)
+        self.assertEqual(len(self.connections), 2)
+
+    def test_concurrent_extractions_share_the_database_cap(self):
+        probe = ConcurrencyProbe()
+        database = client_database(pk=103)
+        threads = [
+            threading.Thread(target=MetadataExtractor().run_per_table, args=(database, list(range(6)), probe))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(probe.peak, 3)
+
+    def test_no_keys_opens_no_connection(self):
+        self.assertEqual(MetadataExtractor().run_per_table(client_database(pk=104), [], ConcurrencyProbe()), {})
+        self.assertEqual(self.connections, [])
+
+    def test_work_failure_is_raised(self):
+        def work(conn, key):
+            raise RuntimeError("permission denied")
+        with self.assertRaises(RuntimeError):
+            MetadataExtractor().run_per_table(client_database(pk=105), [1, 2], work)
+
+
+class DeterministicChangesTests(ExtractionTestCase):
+    def test_tables_are_read_in_a_stable_order(self):
+        conn = FakeConnection(lambda query, params: (['s', 't', 'type', 'd'], []))
+        MetadataExtractor().extract_tables(None, schema_pattern='sales', conn=conn)
+        self.assertTrue(conn.queries[0].endswith("AND table_schema LIKE %s ORDER BY table_schema, table_name"))
+
+    def test_changes_are_reported_in_name_order(self):
+        self.tables.reverse()
+        self.columns = {key: list(reversed(rows)) for key, rows in reversed(list(self.columns.items()))}
+        _, changes = self.extract()
+        self.assertEqual([c['name'] for c in changes['columns']['added']], ['name', 'id', 'author_id', 'id', 'total'])
+
+        self.tables = []
+        self.fingerprints = {}
+        _, changes = self.extract()
+        self.assertEqual([t['name'] for t in changes['tables']['removed']], ['author', 'book', 'summary'])
@@ -0,0 +1,122 @@
+from contextlib import nullcontext
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from databases.models import ColumnMetadata, RelationshipMetadata, TableMetadata
+from databases.services import MetadataExtractor
+
+from .fakes import create_client_database
+
+
+class ExtractionTestCase(TestCase):
+    """
+    Runs extract_full_metadata against a client catalog held in attributes, without a client
+    database: fingerprints, estimates, tables, columns and foreign_keys are what the catalog
+    queries would return
+    """
+
+    def setUp(self):
+        self.database = create_client_database()
+        self.fingerprints = {('public', 'author'): 'a1', ('public', 'book'): 'b1', ('public', 'summary'): 'v1'}
+        self.tables = [('public', 'author', 'table', None), ('public', 'book', 'table', None),
+                       ('public', 'summary', 'view', None)]
+        self.columns = {
+            ('public', 'author'): [('id', 'integer', False, None, None, True, False),
+                                   ('name', 'text', True, None, None, False, False)],
+            ('public', 'book'): [('id', 'integer', False, None, None, True, False),
+                                 ('author_id', 'integer', True, None, None, False, True)],
+            ('public', 'summary'): [('total', 'bigint', True, None, None, False, False)],
+        }
+        self.foreign_keys = [('public', 'book', 'author_id', 'public', 'author', 'id', 'book_author_fk')]
+        self.estimates = {('public', 'author'): 10, ('public', 'book'): 20}
+        self.exact_counts = {}
+        self.catalog_reads = []
+
+    def extract_catalog_columns(self, database_obj, tables=None, conn=None):
+        self.catalog_reads.append(tables)
+        return {key: list(rows) for key, rows in self.columns.items() if tables is None or key in tables}
+
+    def extract(self, force=False):
+        extractor = MetadataExtractor()
+        with mock.patch.multiple(
+            extractor,
+            _connection=lambda database_obj: nullcontext(None),
+            extract_fingerprints=lambda conn: dict(self.fingerprints),
+            estimate_row_counts=lambda conn: dict(self.estimates),
+            extract_tables=lambda database_obj, conn=None: list(self.tables),
+            extract_catalog_columns=self.extract_catalog_columns,
+            extract_relationships=lambda database_obj, conn=None: list(self.foreign_keys),
+            sample_new_columns=lambda database_obj, catalog, stored: {},
+            count_rows_exact=lambda conn, keys: {key: self.exact_counts[key] for key in keys if key in self.exact_counts},
+        ):
+            success, message, changes = extractor.extract_full_metadata(self.database, force=force)
+        self.assertTrue(success, message)
+        self.database.refresh_from_db()
+        return message, changes
+
+
+class MetadataPersistenceTests(ExtractionTestCase):
+    def test_first_extraction_reports_everything_added(self):
+        _, changes = self.extract()
+        self.assertEqual(sorted(t['name'] for t in changes['tables']['added']), ['author', 'book', 'summary'])
+        self.assertEqual(len(changes['columns']['added']), 5)
+        self.assertEqual(changes['relationships']['added'],
+                         [{'from': 'public.book.author_id', 'to': 'public.author.id'}])
+        self.assertEqual(RelationshipMetadata.objects.count(), 1)
+
+    def test_reextracting_the_same_catalog_writes_nothing(self):
+        self.extract()
+        with CaptureQueriesContext(connection) as queries:
+            _, changes = self.extract(force=True)
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        # Only the extraction timestamp on the database itself
+        self.assertEqual(len(writes), 1)
+        self.assertIn('databases_clientdatabase', writes[0])
+        self.assertEqual(changes['columns'], {'added': [], 'updated': [], 'removed': []})
+
+    def test_changes_are_written_and_descriptions_kept(self):
+        self.extract()
+        ColumnMetadata.objects.filter(column_name='name').update(description='Written by a person')
+        self.columns[('public', 'author')] = [('id', 'bigint', False, None, None, True, False),
+                                              ('name', 'text', False, None, None, False, False)]
+        self.columns[('public', 'book')].pop()
+        self.foreign_keys = []
+
+        _, changes = self.extract(force=True)
+        self.assertEqual(changes['columns']['updated'], [
+            {'table': 'public.author', 'name': 'id', 'changes': {'type': 'bigint'}},
+            {'table': 'public.author', 'name': 'name', 'changes': {'nullable': False}},
+        ])
+        self.assertEqual(changes['columns']['removed'], [{'table': 'public.book', 'name': 'author_id'}])
+        self.assertEqual(changes['relationships']['removed'],
+                         [{'from': 'public.book.author_id', 'to': 'public.author.id'}])
+        self.assertEqual(ColumnMetadata.objects.get(column_name='name').description, 'Written by a person')
+        self.assertEqual(RelationshipMetadata.objects.count(), 0)
+
+    def test_removed_tables_take_their_columns_along(self):
+        self.extract()
+        self.tables.pop()
+        del self.fingerprints[('public', 'summary')]
+
+        _, changes = self.extract()
+        self.assertEqual(changes['tables']['removed'], [{'schema': 'public', 'name': 'summary'}])
+        self.assertFalse(TableMetadata.objects.filter(table_name='summary').exists())
+        self.assertFalse(ColumnMetadata.objects.filter(column_name='total').exists())
+
+    def test_app_database_queries_do_not_grow_with_the_schema(self):
+        def query_count():
+            TableMetadata.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.extract(force=True)
+            return len(queries)
+
+        small = query_count()
+        # Small enough to stay within one bulk insert batch on SQLite
+        for index in range(30):
+            key = ('public', f"t{index}")
+            self.tables.append(key + ('table', None))
+            self.columns[key] = [(f"c{column}", 'text', True, None, None, False, False) for column in range(2)]
+        self.assertEqual(query_count(), small)
@@ -0,0 +1,127 @@
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.models import TableMetadata
+from databases.plans import PlanCache, digest_plan
+from databases.sqltools import is_explainable
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database, explain_result
+
+
+def seq_scan(relation, rows, schema=None, **node):
+    node = dict({'Node Type': 'Seq Scan', 'Relation Name': relation, 'Plan Rows': rows,
+                 'Total Cost': 100.0, 'Startup Cost': 0.0}, **node)
+    if schema:
+        node['Schema'] = schema
+    return node
+
+
+@override_settings(EXPLAIN_LARGE_TABLE_ROWS=1000)
+class DigestPlanTests(SimpleTestCase):
+    def test_verbose_scans_are_matched_to_known_row_counts_by_schema(self):
+        plan = [{'Plan': {
+            'Node Type': 'Hash Join', 'Total Cost': 300.0, 'Startup Cost': 1.0, 'Plan Rows': 10,
+            'Plans': [seq_scan('orders', 10, schema='sales'), seq_scan('orders', 10, schema='archive')],
+        }}]
+        summary = digest_plan(plan, {'sales.orders': 50000, 'archive.orders': 20})
+
+        self.assertEqual([scan['relation'] for scan in summary['large_seq_scans']], ['sales.orders'])
+        self.assertEqual(summary['warnings'], ["Sequential scan on sales.orders (~50,000 rows)"])
+        self.assertEqual(summary['slowest_nodes'][0]['exclusive'], 100.0)
+
+    def test_scan_without_a_schema_is_not_guessed_to_be_public(self):
+        summary = digest_plan([{'Plan': seq_scan('orders', 5)}], {'public.orders': 50000})
+        self.assertEqual(summary['slowest_nodes'][0]['relation'], 'orders')
+        self.assertEqual(summary['large_seq_scans'], [])
+
+    def test_unknown_tables_fall_back_to_the_planner_estimate(self):
+        plan = [{'Plan': seq_scan('events', 5, schema='public', **{'Rows Removed by Filter': 90000})}]
+        self.assertEqual(digest_plan(plan)['large_seq_scans'], [])
+        plan = [{'Plan': seq_scan('events', 5000, schema='public', Filter='(id > 1)')}]
+        self.assertEqual(digest_plan(plan)['large_seq_scans'],
+                         [{'relation': 'public.events', 'table_rows': 5000, 'filter': '(id > 1)'}])
+
+    def test_analyzed_plans_rank_nodes_by_their_own_time(self):
+        plan = [{'Plan': {
+            'Node Type': 'Nested Loop', 'Total Cost': 10.0, 'Plan Rows': 1, 'Actual Total Time': 50.0,
+            'Actual Loops': 1, 'Actual Rows': 3,
+            'Plans': [seq_scan('t', 1, schema='public', **{'Actual Total Time': 4.0, 'Actual Loops': 10})],
+        }}, ]
+        plan[0]['Planning Time'], plan[0]['Execution Time'] = 0.5, 51.0
+        summary = digest_plan(plan)
+
+        self.assertTrue(summary['analyzed'])
+        self.assertEqual([node['exclusive'] for node in summary['slowest_nodes']], [40.0, 10.0])
+        self.assertEqual((summary['actual_rows'], summary['execution_time_ms']), (3, 51.0))
+
+
+class IsExplainableTests(SimpleTestCase):
+    def test_explainable_statements(self):
+        for query in ["SELECT 1", "WITH x AS (SELECT 1) SELECT * FROM x", "UPDATE t SET a = 1",
+                      "INSERT INTO t VALUES (1)", "DELETE FROM t", "(SELECT 1) UNION (SELECT 2)", "TABLE t"]:
+            with self.subTest(query=query):
+                self.assertTrue(is_explainable(query))
+
+    def test_other_statements(self):
+        for query in ["VACUUM t", "CREATE TABLE t (a int)", "SELECT 1; SELECT 2", "SELECT 1; COMMIT", ""]:
+            with self.subTest(query=query):
+                self.assertFalse(is_explainable(query))
+
+
+class PlanCacheTests(SimpleTestCase):
+    def test_key_changes_with_the_schema_version(self):
+        cache = PlanCache()
+        database = client_database()
+        key = cache.make_key(database, "SELECT 1")
+        database.last_metadata_update = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.assertNotEqual(cache.make_key(database, "SELECT 1"), key)
+        self.assertEqual(cache.make_key(database, "select 1 -- same"), cache.make_key(database, "SELECT 1"))
+
+
+class ExplainQueryTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+        self.responder = lambda query, params: explain_result(Schema='public', **{'Relation Name': 't'})
+
+    def explains(self):
+        return [query for query in self.queries if query.startswith('EXPLAIN')]
+
+    def test_plain_plans_are_verbose_and_cached(self):
+        first = self.connector.explain_query(self.database, "SELECT * FROM t")
+        second = self.connector.explain_query(self.database, "select * from t")
+
+        self.assertEqual(self.explains(), ["EXPLAIN (FORMAT JSON, VERBOSE) SELECT * FROM t"])
+        self.assertEqual((first['cached'], second['cached']), (False, True))
+        self.assertEqual(first['summary']['slowest_nodes'][0]['relation'], 'public.t')
+
+    def test_analyze_runs_in_a_rolled_back_transaction_and_is_not_cached(self):
+        self.connector.explain_query(self.database, "DELETE FROM t", analyze=True, buffers=True)
+        self.connector.explain_query(self.database, "DELETE FROM t", analyze=True, buffers=True)
+
+        self.assertEqual(self.explains(), ["EXPLAIN (FORMAT JSON, VERBOSE, ANALYZE, BUFFERS) DELETE FROM t"] * 2)
+        self.assertTrue(all(conn.endpoint == 'primary' and conn.rollbacks for conn in self.connections))
+
+    def test_statements_explain_cannot_take_are_refused(self):
+        result = self.connector.explain_query(self.database, "SELECT 1; COMMIT")
+        self.assertEqual(result['error_type'], 'invalid_query')
+        self.assertEqual(self.queries, [])
+
+
+class ExplainViewTests(FakeConnectorMixin, TestCase):
+    def test_known_row_counts_flag_large_seq_scans(self):
+        database = create_client_database()
+        TableMetadata.objects.create(database=database, schema_name='sales', table_name='orders',
+                                     table_type='table', row_count=5000000)
+        self.responder = lambda query, params: explain_result(rows=10, Schema='sales', **{'Relation Name': 'orders'})
+        client = APIClient()
+        client.force_authenticate(database.owner)
+
+        response = client.post(reverse('clientdatabase-explain', args=[database.pk]),
+                               {'query': 'SELECT * FROM sales.orders WHERE id = 1', 'include_plan': False},
+                               format='json')
+        self.assertEqual(response.data['summary']['warnings'], ["Sequential scan on sales.orders (~5,000,000 rows)"])
+        self.assertNotIn('plan', response.data)
@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from databases.pool import ConnectionPool, PoolRegistry, PoolTimeout, credentials_fingerprint
+
+from .fakes import FakeClock, FakeConnection
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+        patcher = mock.patch('databases.pool.psycopg2.connect', side_effect=self.connect)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def connect(self, **params):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_returned_connection_is_reused(self):
+        pool = ConnectionPool({'host': 'h'}, max_size=2)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_return_rolls_back_and_discards_session_state(self):
+        pool = ConnectionPool({'host': 'h'})
+        conn = pool.getconn()
+        with conn.cursor() as cursor:
+            cursor.execute("SET search_path TO other")
+        pool.putconn(conn)
+
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(conn.queries[-1], "DISCARD ALL")
+        self.assertFalse(conn.autocommit)
+
+    def test_return_restores_iso_datestyle_after_discard(self):
+        pool = ConnectionPool({'host': 'h'})
+        conn = pool.getconn()
+        conn.parameters['DateStyle'] = 'SQL, DMY'
+        pool.putconn(conn)
+        self.assertEqual(conn.queries[-2:], ["DISCARD ALL", "SET DateStyle TO 'ISO'"])
+
+    def test_connection_that_cannot_be_reset_is_closed(self):
+        pool = ConnectionPool({'host': 'h'})
+        conn = pool.getconn()
+        conn.responder = lambda query, params: RuntimeError("server gone")
+        pool.putconn(conn)
+
+        self.assertTrue(conn.closed)
+        self.assertEqual((pool.stats()['size'], pool.stats()['idle']), (0, 0))
+        self.assertIsNot(pool.getconn(), conn)
+
+    def test_connection_in_unknown_state_is_closed(self):
+        pool = ConnectionPool({'host': 'h'})
+        conn = pool.getconn()
+        conn.status = extensions.TRANSACTION_STATUS_UNKNOWN
+        pool.putconn(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(conn.queries, [])
+
+    def test_exhausted_pool_times_out(self):
+        pool = ConnectionPool({'host': 'h'}, max_size=1, timeout=0.01)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_failed_connect_gives_the_slot_back(self):
+        pool = ConnectionPool({'host': 'h'}, max_size=1, timeout=0.01)
+        with mock.patch('databases.pool.psycopg2.connect', side_effect=OSError("refused")):
+            with self.assertRaises(OSError):
+                pool.getconn()
+        self.assertEqual(pool.stats()['size'], 0)
+        pool.getconn()
+
+    def test_idle_connections_are_evicted_down_to_min_size(self):
+        clock = FakeClock()
+        with mock.patch('databases.pool.time.monotonic', clock):
+            pool = ConnectionPool({'host': 'h'}, min_size=1, max_size=3, max_idle=60)
+            connections = [pool.getconn() for _ in range(3)]
+            for conn in connections:
+                pool.putconn(conn)
+            clock.advance(61)
+            pool.prune()
+
+        self.assertEqual(pool.stats()['size'], 1)
+        self.assertEqual(sum(1 for conn in connections if conn.closed), 2)
+
+    def test_stale_idle_connection_is_replaced_when_its_health_check_fails(self):
+        clock = FakeClock()
+        with mock.patch('databases.pool.time.monotonic', clock):
+            pool = ConnectionPool({'host': 'h'}, health_check_after=30)
+            conn = pool.getconn()
+            pool.putconn(conn)
+            conn.responder = lambda query, params: RuntimeError("terminated")
+            clock.advance(31)
+            replacement = pool.getconn()
+
+        self.assertIsNot(replacement, conn)
+        self.assertEqual(pool.stats()['health_check_failures'], 1)
+
+
+class PoolRegistryTests(SimpleTestCase):
+    def test_owners_with_the_same_credentials_share_a_pool(self):
+        registry = PoolRegistry()
+        params = {'host': 'h', 'user': 'u', 'password': 'p'}
+        self.assertIs(registry.get_pool(1, params), registry.get_pool(2, dict(params)))
+
+    def test_changed_credentials_rebuild_the_owners_pool(self):
+        registry = PoolRegistry()
+        old = registry.get_pool(1, {'host': 'h', 'password': 'old'})
+        new = registry.get_pool(1, {'host': 'h', 'password': 'new'})
+        self.assertIsNot(old, new)
+        with self.assertRaises(PoolTimeout):
+            old.getconn()
+
+    def test_discard_keeps_a_pool_another_owner_still_uses(self):
+        registry = PoolRegistry()
+        params = {'host': 'h'}
+        pool = registry.get_pool(1, params)
+        registry.get_pool(2, params)
+        registry.discard(1)
+        self.assertIsNone(registry.stats(1))
+        self.assertIsNotNone(registry.stats(2))
+        registry.discard(2)
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+    def test_fingerprint_hides_the_password(self):
+        fingerprint = credentials_fingerprint({'host': 'h', 'password': 'secret'})
+        self.assertNotIn('secret', fingerprint)
+        self.assertNotEqual(fingerprint, credentials_fingerprint({'host': 'h', 'password': 'other'}))
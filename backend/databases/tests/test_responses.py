@@ -0,0 +1,76 @@
+import datetime
+import decimal
+import gzip
+import json
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases import responses
+from databases.responses import encode_json, query_result_response
+
+from .fakes import FakeConnectorMixin, create_client_database
+from .test_streaming import numbers
+
+
+class EncodeJsonTests(SimpleTestCase):
+    def test_values_render_the_way_the_drf_encoder_does(self):
+        data = {'n': decimal.Decimal('1.5'), 'd': datetime.timedelta(seconds=90), 'b': b'ab', 1: 'key'}
+        self.assertEqual(json.loads(encode_json(data)), {'n': 1.5, 'd': '90.0', 'b': 'ab', '1': 'key'})
+
+    def test_integers_beyond_64_bits_fall_back_to_the_standard_encoder(self):
+        self.assertEqual(json.loads(encode_json([2 ** 70])), [2 ** 70])
+
+    def test_without_orjson_the_standard_encoder_is_used(self):
+        with mock.patch.object(responses, 'orjson', None):
+            self.assertEqual(encode_json({'a': [1, None]}), b'{"a":[1,null]}')
+
+
+@override_settings(QUERY_RESPONSE_COMPRESS_MIN_BYTES=100)
+class QueryResultResponseTests(SimpleTestCase):
+    def setUp(self):
+        self.result = {'columns': ['id'], 'rows': [[i] for i in range(100)], 'success': True}
+
+    def respond(self, accept_encoding):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return query_result_response(request, self.result)
+
+    def test_large_body_is_gzipped_when_accepted(self):
+        response = self.respond('gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.result)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_brotli_is_preferred_when_installed(self):
+        fake_brotli = mock.Mock(compress=lambda body, quality: b'br:' + body)
+        with mock.patch.object(responses, 'brotli', fake_brotli):
+            response = self.respond('gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertTrue(response.content.startswith(b'br:'))
+
+    def test_refused_codings_are_not_used(self):
+        with mock.patch.object(responses, 'brotli', None):
+            response = self.respond('br, gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_small_body_is_sent_as_is(self):
+        self.result = {'rows': []}
+        self.assertFalse(self.respond('gzip').has_header('Content-Encoding'))
+
+
+class ExecuteQueryViewTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+        self.url = reverse('clientdatabase-execute-query', args=[self.database.pk])
+
+    def test_result_is_encoded_without_a_serializer(self):
+        self.responder = numbers(2)
+        response = self.client.post(self.url, {'query': 'SELECT id FROM t'}, format='json')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        data = json.loads(response.content)
+        self.assertEqual((data['columns'], data['rows']), (['id'], [[0], [1]]))
@@ -0,0 +1,136 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+from django.test import SimpleTestCase, override_settings
+
+from databases.results import ResultStore, _spill_dir
+from databases.sqltools import strip_statement
+
+from .fakes import FakeConnectorMixin, client_database
+from .test_streaming import numbers
+
+
+class SpillDirTestMixin:
+    def setUp(self):
+        super().setUp()
+        self.spill_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_root)
+        self.spill_path = os.path.join(self.spill_root, 'results')
+        settings_override = override_settings(QUERY_RESULT_SPILL_DIR=self.spill_path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ResultStoreTests(SpillDirTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+
+    def test_spill_dir_is_private_to_this_user(self):
+        _spill_dir()
+        info = os.stat(self.spill_path)
+        self.assertEqual(stat.S_IMODE(info.st_mode), 0o700)
+        self.assertEqual(info.st_uid, os.getuid())
+
+    def test_loose_spill_dir_is_tightened(self):
+        os.makedirs(self.spill_path, mode=0o777)
+        os.chmod(self.spill_path, 0o777)
+        _spill_dir()
+        self.assertEqual(stat.S_IMODE(os.stat(self.spill_path).st_mode), 0o700)
+
+    def test_symlinked_spill_dir_is_refused(self):
+        os.symlink(self.spill_root, self.spill_path)
+        with self.assertRaises(PermissionError):
+            _spill_dir()
+
+    def test_pages_are_read_back_by_offset(self):
+        writer = ResultStore.create(self.database, ['id'], 'SELECT id FROM t')
+        writer.write([[1], [2], [3]])
+        writer.write([[4]])
+        spilled = writer.close()
+
+        self.assertEqual(spilled.read(1, 2), [[2], [3]])
+        self.assertEqual(spilled.read(3, 10), [[4]])
+        self.assertEqual(spilled.read(4, 10), [])
+
+    def test_result_is_readable_while_it_is_still_being_written(self):
+        writer = ResultStore.create(self.database, ['id'], 'SELECT id FROM t')
+        writer.write([[1], [2]])
+        spilled = ResultStore.get(writer.handle, self.database)
+        self.assertFalse(spilled.complete)
+        self.assertEqual(spilled.total_rows, 2)
+        writer.close()
+
+    def test_handle_is_scoped_to_its_database(self):
+        writer = ResultStore.create(self.database, ['id'], 'SELECT id FROM t')
+        writer.close()
+        self.assertIsNone(ResultStore.get(writer.handle, client_database(pk=2)))
+        self.assertIsNone(ResultStore.get('../etc/passwd', self.database))
+
+    @override_settings(QUERY_RESULT_TTL=-1)
+    def test_expired_result_is_deleted(self):
+        writer = ResultStore.create(self.database, ['id'], 'SELECT id FROM t')
+        writer.write([[1]])
+        writer.close()
+        self.assertIsNone(ResultStore.get(writer.handle, self.database))
+        self.assertEqual(os.listdir(self.spill_path), [])
+
+
+@override_settings(QUERY_RESULT_PAGE_WAIT=5)
+class PagedQueryTests(SpillDirTestMixin, FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+
+    def run_paged(self, query="SELECT id FROM t", page_size=2):
+        result = self.connector.execute_query(self.database, query, page_size=page_size)
+        for thread in threading.enumerate():
+            if thread.name.startswith('result-spill-'):
+                thread.join(5)
+        return result
+
+    def test_first_page_is_returned_with_a_handle_for_the_rest(self):
+        self.responder = numbers(5)
+        result = self.run_paged()
+
+        self.assertEqual([list(row) for row in result['rows']], [[0], [1]])
+        self.assertTrue(result['has_more'])
+        page = self.connector.fetch_result_page(self.database, result['result_handle'], offset=2, limit=2)
+        self.assertEqual(page['rows'], [[2], [3]])
+        self.assertEqual(page['total_rows'], 5)
+        last = self.connector.fetch_result_page(self.database, result['result_handle'], offset=4, limit=2)
+        self.assertEqual((last['rows'], last['has_more']), ([[4]], False))
+
+    def test_result_that_fits_one_page_has_no_handle(self):
+        self.responder = numbers(2)
+        result = self.run_paged(page_size=5)
+        self.assertNotIn('result_handle', result)
+        self.assertEqual((result['total_rows'], result['has_more']), (2, False))
+
+    def test_spill_holds_the_workload_slot_until_it_finishes(self):
+        self.responder = numbers(5)
+        self.run_paged()
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+        self.assertTrue(self.connections[0].closed_cursors[-1].startswith('page_'))
+
+    def test_keyset_page_wraps_a_query_ending_in_a_comment(self):
+        self.responder = numbers(5)
+        result = self.run_paged("SELECT id FROM t; -- all ids")
+        self.connector.fetch_keyset_page(self.database, result['result_handle'], 'id', after=3, limit=10)
+
+        self.assertEqual(
+            self.queries[-1],
+            'SELECT * FROM (SELECT id FROM t) AS _keyset_page WHERE "id" > %s ORDER BY "id" LIMIT %s'
+        )
+
+
+class StripStatementTests(SimpleTestCase):
+    def test_trailing_semicolon_and_comments_are_dropped(self):
+        self.assertEqual(strip_statement("SELECT 1 ; -- done\n"), "SELECT 1")
+        self.assertEqual(strip_statement("SELECT 1 /* a */;\n/* b */"), "SELECT 1")
+
+    def test_comments_inside_the_statement_are_kept(self):
+        self.assertEqual(strip_statement("SELECT 1 -- one\nFROM t"), "SELECT 1 -- one\nFROM t")
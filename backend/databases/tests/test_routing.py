@@ -0,0 +1,93 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from databases.services import DatabaseConnector
+from databases.sqltools import is_select
+
+from .fakes import FakeConnection, FakeConnectorMixin, client_database
+from .test_streaming import numbers
+
+
+class IsSelectTests(SimpleTestCase):
+    def test_reads(self):
+        for query in [
+            "SELECT * FROM t",
+            "-- latest\nselect id from t;",
+            "WITH recent AS (SELECT * FROM t) SELECT * FROM recent",
+            "(SELECT 1) UNION (SELECT 2)",
+            "(VALUES (1)) EXCEPT TABLE t",
+            "VALUES (1), (2)",
+            "TABLE t",
+            "SELECT nextval FROM counters",
+        ]:
+            with self.subTest(query=query):
+                self.assertTrue(is_select(query))
+
+    def test_writes(self):
+        for query in [
+            "INSERT INTO t VALUES (1)",
+            "SELECT 1; DELETE FROM t",
+            "WITH gone AS (DELETE FROM t RETURNING *) SELECT * FROM gone",
+            "SELECT * INTO copy FROM t",
+            "SELECT * FROM t FOR UPDATE",
+            "SELECT * FROM t FOR KEY SHARE",
+            "SELECT nextval('t_id_seq')",
+            "SELECT pg_catalog.setval('t_id_seq', 1)",
+            "SELECT \"lo_import\"('/tmp/x')",
+            "(SELECT txid_current())",
+            "",
+        ]:
+            with self.subTest(query=query):
+                self.assertFalse(is_select(query))
+
+
+class QueryRoutingTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+        self.responder = numbers(1)
+
+    def test_reads_use_the_read_endpoint(self):
+        self.connector.execute_query(self.database, "(SELECT id FROM a) UNION (SELECT id FROM b)")
+        self.assertEqual(self.connections[-1].endpoint, 'read')
+
+    def test_writing_functions_go_to_the_primary_and_commit(self):
+        self.connector.execute_query(self.database, "SELECT setval('t_id_seq', 10)")
+        conn = self.connections[-1]
+        self.assertEqual((conn.endpoint, conn.commits), ('primary', 1))
+
+    def test_use_primary_runs_a_select_as_a_write(self):
+        key = self.result_cache.make_key(self.database.pk, "SELECT 1")
+        self.result_cache.put(key, {'columns': [], 'rows': []})
+        result = self.connector.execute_query(self.database, "SELECT archive_old_rows()", use_primary=True)
+
+        conn = self.connections[-1]
+        self.assertEqual((conn.endpoint, conn.commits), ('primary', 1))
+        self.assertEqual(len(result['rows']), 1)
+        # Treated as a write: not cached, and the database's cached reads are dropped
+        self.assertIsNone(self.result_cache.get(key)[0])
+        self.assertEqual(len(self.result_cache._cache), 0)
+
+
+class ReadConnectionTests(SimpleTestCase):
+    def test_unavailable_replica_is_logged_and_the_primary_used_read_only(self):
+        connector = DatabaseConnector()
+        primary = FakeConnection()
+
+        @contextmanager
+        def connection(database_obj):
+            yield primary
+
+        replica = SimpleNamespace(pk=5, host='replica', port=5432)
+        with mock.patch('databases.services.replica_router.candidates', return_value=[replica]), \
+                mock.patch.object(connector, 'get_replica_pool', side_effect=OSError("refused")), \
+                mock.patch.object(connector, 'connection', connection), \
+                self.assertLogs('databases.services', 'WARNING') as logs:
+            with connector.read_connection(client_database()) as conn:
+                self.assertIs(conn, primary)
+
+        self.assertIn("Replica replica:5432 unavailable", logs.output[0])
+        self.assertEqual(primary.queries, ["SET TRANSACTION READ ONLY"])
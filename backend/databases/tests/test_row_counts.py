@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.models import TableMetadata
+from databases.services import MetadataExtractor
+
+from .fakes import FakeConnection, FakeConnectorMixin, create_client_database
+from .test_persistence import ExtractionTestCase
+
+
+def counts(**tables):
+    """Responder answering COUNT(*) per table name, raising for tables given an exception"""
+    def respond(query, params):
+        if query.startswith('SELECT COUNT(*)'):
+            answer = tables[query.rsplit('.', 1)[1].strip('"')]
+            return answer if isinstance(answer, Exception) else (['count'], [(answer,)])
+    return respond
+
+
+class CountRowsExactTests(SimpleTestCase):
+    def test_each_count_gets_its_own_time_budget_and_transaction(self):
+        conn = FakeConnection(counts(a=5, b=7))
+        result = MetadataExtractor().count_rows_exact(conn, [('public', 'a'), ('public', 'b')], time_budget_ms=250)
+
+        self.assertEqual(result, {('public', 'a'): 5, ('public', 'b'): 7})
+        self.assertEqual(conn.executed[0], ("SELECT set_config('statement_timeout', %s, true)", ('250',)))
+        self.assertEqual(conn.queries[1], 'SELECT COUNT(*) FROM "public"."a"')
+        self.assertEqual(conn.rollbacks, 2)
+
+    def test_count_that_runs_out_of_time_is_skipped(self):
+        conn = FakeConnection(counts(a=RuntimeError("canceling statement due to statement timeout"), b=7))
+        with self.assertLogs('databases.services', 'WARNING') as logs:
+            result = MetadataExtractor().count_rows_exact(conn, [('public', 'a'), ('public', 'b')])
+        self.assertEqual(result, {('public', 'b'): 7})
+        self.assertIn("Skipping exact row count for public.a", logs.output[0])
+
+
+class ExtractionRowCountTests(ExtractionTestCase):
+    def test_counts_are_planner_estimates_by_default(self):
+        self.extract()
+        book = TableMetadata.objects.get(table_name='book')
+        self.assertEqual((book.row_count, book.row_count_estimated), (20, True))
+        self.assertIsNone(TableMetadata.objects.get(table_name='summary').row_count)
+
+    def test_tables_that_opted_in_are_counted_exactly(self):
+        self.extract()
+        TableMetadata.objects.filter(table_name='book').update(count_rows_exactly=True)
+        self.exact_counts[('public', 'book')] = 23
+
+        self.extract(force=True)
+        book = TableMetadata.objects.get(table_name='book')
+        self.assertEqual((book.row_count, book.row_count_estimated), (23, False))
+        author = TableMetadata.objects.get(table_name='author')
+        self.assertEqual((author.row_count, author.row_count_estimated), (10, True))
+
+    def test_exact_count_that_fails_keeps_the_estimate(self):
+        self.extract()
+        TableMetadata.objects.filter(table_name='book').update(count_rows_exactly=True)
+        self.estimates[('public', 'book')] = 21
+
+        self.extract()
+        book = TableMetadata.objects.get(table_name='book')
+        self.assertEqual((book.row_count, book.row_count_estimated), (21, True))
+
+
+class CountRowsViewTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+        self.url = reverse('clientdatabase-count-rows', args=[self.database.pk])
+        self.orders = TableMetadata.objects.create(database=self.database, table_name='orders', table_type='table',
+                                                   row_count=90)
+        self.events = TableMetadata.objects.create(database=self.database, table_name='events', table_type='table',
+                                                   row_count=1000)
+        TableMetadata.objects.create(database=self.database, table_name='totals', table_type='view')
+
+    def test_exact_counts_replace_estimates_of_base_tables(self):
+        self.responder = counts(orders=100, events=RuntimeError("canceling statement due to statement timeout"))
+        with self.assertLogs('databases.services', 'WARNING'):
+            response = self.client.post(self.url, {'background': False, 'always': True}, format='json')
+
+        self.assertEqual(response.data['row_counts'], {self.orders.pk: 100})
+        self.assertEqual(response.data['skipped'], [self.events.pk])
+        self.orders.refresh_from_db()
+        self.assertEqual((self.orders.row_count, self.orders.row_count_estimated), (100, False))
+        self.assertEqual(TableMetadata.objects.filter(count_rows_exactly=True).count(), 2)
+
+    def test_background_counts_return_right_away(self):
+        with mock.patch.object(MetadataExtractor, 'count_rows', return_value={}) as count_rows:
+            response = self.client.post(self.url, {'table_ids': [self.orders.pk]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(count_rows.call_args.args[1], [self.orders])
+        self.assertTrue(count_rows.call_args.kwargs['background'])
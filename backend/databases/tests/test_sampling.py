@@ -0,0 +1,93 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from databases.models import ColumnMetadata, TableMetadata
+from databases.services import MetadataExtractor
+
+from .fakes import FakeConnection, FakeConnectorMixin, create_client_database
+
+
+def table(reltuples, rows, relkind='r', sampled=None):
+    """Responder for a table with the given planner estimate, answering reads with rows"""
+    def respond(query, params):
+        if 'pg_class' in query:
+            return ['reltuples', 'relkind'], [(reltuples, relkind)]
+        if 'TABLESAMPLE' in query:
+            return ['id', 'name'], rows if sampled is None else sampled
+        if query.startswith('SELECT "id"'):
+            return ['id', 'name'], rows
+    return respond
+
+
+@override_settings(METADATA_SAMPLE_ROWS=100)
+class TableSampleTests(FakeConnectorMixin, SimpleTestCase):
+    def sample(self, responder, limit=10):
+        self.conn = FakeConnection(responder)
+        return self.connector.get_table_sample_values(None, 'public', 'users', ['id', 'name'], limit, conn=self.conn)
+
+    def test_large_tables_are_read_with_tablesample_in_one_query(self):
+        samples = self.sample(table(1000000, [(1, 'a'), (2, 'a'), (3, None), (1, 'b')]))
+
+        self.assertEqual(samples, {'id': [1, 2, 3], 'name': ['a', 'b']})
+        reads = [(query, params) for query, params in self.conn.executed if 'FROM "public"."users"' in query]
+        self.assertEqual(reads, [('SELECT "id", "name" FROM "public"."users" TABLESAMPLE SYSTEM (%s) LIMIT %s',
+                                  (0.02, 100))])
+
+    def test_output_formats_are_pinned_before_reading(self):
+        self.sample(table(10, []))
+        self.assertEqual(self.conn.queries[0],
+                         "SELECT set_config('DateStyle', 'ISO', true), set_config('bytea_output', 'hex', true)")
+
+    def test_small_tables_and_views_use_a_plain_limit(self):
+        for reltuples, relkind in [(50, 'r'), (10 ** 6, 'v')]:
+            with self.subTest(relkind=relkind):
+                self.sample(table(reltuples, [(1, 'a')], relkind=relkind))
+                self.assertFalse(any('TABLESAMPLE' in query for query in self.conn.queries))
+
+    def test_empty_sample_falls_back_to_a_limit_read(self):
+        samples = self.sample(table(1000000, [(7, 'x')], sampled=[]))
+        self.assertEqual(samples, {'id': [7], 'name': ['x']})
+
+    def test_samples_are_capped_per_column(self):
+        samples = self.sample(table(10, [(i, 'n' * 300) for i in range(20)]), limit=3)
+        self.assertEqual(samples['id'], [0, 1, 2])
+        self.assertEqual(samples['name'], ['n' * 200])
+
+    def test_failure_rolls_back_and_is_logged(self):
+        with self.assertLogs('databases.services', 'WARNING') as logs:
+            samples = self.sample(lambda query, params: RuntimeError("permission denied"))
+        self.assertEqual(samples, {})
+        self.assertEqual(self.conn.rollbacks, 1)
+        self.assertIn("Error sampling public.users: permission denied", logs.output[0])
+
+    def test_no_columns_reads_nothing(self):
+        self.assertEqual(self.connector.get_table_sample_values(None, 'public', 'users', []), {})
+        self.assertEqual(self.connections, [])
+
+
+class SampleCachingTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        database = create_client_database()
+        self.table = TableMetadata.objects.create(database=database, table_name='users', table_type='table')
+        self.id_column = ColumnMetadata.objects.create(table=self.table, column_name='id', data_type='integer')
+        self.name_column = ColumnMetadata.objects.create(table=self.table, column_name='name', data_type='text')
+        self.responder = table(10, [(1, 'ann'), (2, 'bob')])
+
+    def test_refresh_caches_samples_on_every_column(self):
+        MetadataExtractor().refresh_sample_values(self.table)
+        self.name_column.refresh_from_db()
+        self.assertEqual(self.name_column.sample_values, ['ann', 'bob'])
+        self.assertEqual(len(self.connections), 1)
+
+    def test_description_uses_cached_samples_without_connecting(self):
+        self.id_column.sample_values = [5, 6]
+        description = MetadataExtractor().generate_column_description(self.id_column)
+        self.assertIn('5', description)
+        self.assertEqual(self.connections, [])
+
+    def test_description_samples_the_table_once_when_nothing_is_cached(self):
+        extractor = MetadataExtractor()
+        extractor.generate_column_description(self.id_column)
+        self.name_column.refresh_from_db()
+        self.assertEqual(self.name_column.sample_values, ['ann', 'bob'])
+        self.assertEqual(len(self.connections), 1)
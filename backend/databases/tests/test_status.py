@@ -0,0 +1,69 @@
+from unittest import mock
+
+from django.db import DatabaseError
+from django.db.models import QuerySet
+from django.test import TestCase
+
+from databases.models import ClientDatabase
+from databases.serializers import ClientDatabaseSerializer
+from databases.status import ConnectionStatusTracker
+
+from .fakes import create_client_database
+
+
+@mock.patch.object(ConnectionStatusTracker, '_ensure_flusher')
+class ConnectionStatusTrackerTests(TestCase):
+    def setUp(self):
+        self.tracker = ConnectionStatusTracker()
+        self.database = create_client_database()
+
+    def stored_status(self):
+        return ClientDatabase.objects.get(pk=self.database.pk).connection_status
+
+    def test_status_is_written_on_flush_not_on_set(self, ensure_flusher):
+        with self.assertNumQueries(0):
+            self.tracker.set(self.database, 'connected')
+            self.tracker.set(self.database, 'error')
+        self.assertEqual(self.tracker.get(self.database.pk), 'error')
+
+        self.tracker.flush()
+        self.assertEqual(self.stored_status(), 'error')
+        with self.assertNumQueries(0):
+            self.tracker.flush()
+
+    def test_returning_to_the_stored_status_writes_nothing(self, ensure_flusher):
+        stored = self.database.connection_status
+        self.tracker.set(self.database, 'connected')
+        self.tracker.set(self.database, stored)
+        with self.assertNumQueries(0):
+            self.tracker.flush()
+
+    def test_repeated_status_is_only_written_once(self, ensure_flusher):
+        self.tracker.set(self.database, 'connected')
+        self.tracker.flush()
+        self.tracker.set(ClientDatabase.objects.get(pk=self.database.pk), 'connected')
+        with self.assertNumQueries(0):
+            self.tracker.flush()
+
+    def test_transition_after_a_flush_is_not_lost(self, ensure_flusher):
+        # The same instance sets a status, a flush runs, then it goes back to its loaded value
+        self.tracker.set(self.database, 'connected')
+        self.tracker.flush()
+        self.tracker.set(self.database, 'disconnected')
+        self.tracker.flush()
+        self.assertEqual(self.stored_status(), 'disconnected')
+
+    def test_failed_write_is_retried_on_the_next_flush(self, ensure_flusher):
+        self.tracker.set(self.database, 'error')
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError("locked")):
+            self.tracker.flush()
+        self.assertNotEqual(self.stored_status(), 'error')
+
+        self.tracker.flush()
+        self.assertEqual(self.stored_status(), 'error')
+
+    def test_serializer_reports_the_in_memory_status(self, ensure_flusher):
+        with mock.patch('databases.serializers.connection_status_tracker', self.tracker):
+            self.tracker.set(self.database, 'connected')
+            data = ClientDatabaseSerializer(ClientDatabase.objects.get(pk=self.database.pk)).data
+        self.assertEqual(data['connection_status'], 'connected')
@@ -0,0 +1,107 @@
+import json
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.limits import CostLimitExceeded, QueryLimitExceeded, ResultBudget
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database, explain_result
+
+
+def numbers(count):
+    """Responder answering SELECTs with an id column counting up to count"""
+    def respond(query, params):
+        if query.startswith('EXPLAIN'):
+            return explain_result()
+        return ['id'], [(i,) for i in range(count)]
+    return respond
+
+
+class StreamQueryTests(FakeConnectorMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = client_database()
+
+    def test_yields_columns_then_batches_from_a_named_cursor(self):
+        self.responder = numbers(5)
+        items = list(self.connector.stream_query(self.database, "SELECT id FROM t", batch_size=2))
+
+        self.assertEqual(items, [['id'], [(0,), (1,)], [(2,), (3,)], [(4,)]])
+        conn = self.connections[0]
+        self.assertTrue(conn.closed_cursors[-1].startswith('stream_'))
+
+    def test_with_types_reports_column_types(self):
+        self.responder = numbers(1)
+        header = next(self.connector.stream_query(self.database, "SELECT id FROM t", with_types=True))
+        self.assertEqual(header, (['id'], ['text']))
+
+    def test_failure_is_raised_and_recorded(self):
+        self.responder = lambda query, params: RuntimeError("relation does not exist")
+        with self.assertRaises(RuntimeError):
+            list(self.connector.stream_query(self.database, "SELECT * FROM missing"))
+        self.status_tracker.set.assert_called_with(self.database, 'error')
+
+    def test_guarded_stream_stops_at_the_row_budget(self):
+        self.responder = numbers(10)
+        budget = ResultBudget(max_rows=3, max_bytes=10 ** 6)
+        items = list(self.connector.stream_query(self.database, "SELECT id FROM t", batch_size=2,
+                                                 guarded=True, budget=budget))
+        self.assertEqual(sum(len(batch) for batch in items[1:]), 3)
+        self.assertEqual(budget.exceeded, 'max_rows')
+
+    def test_guarded_stream_can_fail_at_the_budget(self):
+        self.responder = numbers(10)
+        self.database.max_result_rows = 3
+        with self.assertRaises(QueryLimitExceeded):
+            list(self.connector.stream_query(self.database, "SELECT id FROM t", guarded=True, on_limit='error'))
+
+    def test_guarded_stream_applies_auto_limit_and_cost_guard(self):
+        self.database.auto_limit = 50
+        self.database.cost_guard_mode = 'reject'
+        self.database.max_plan_cost = 100
+        self.responder = lambda query, params: explain_result(total_cost=5000) if query.startswith('EXPLAIN') else None
+
+        with self.assertRaises(CostLimitExceeded):
+            list(self.connector.stream_query(self.database, "SELECT id FROM t", guarded=True))
+        self.assertTrue(self.queries[-1].startswith('EXPLAIN'))
+        self.assertTrue(self.queries[-1].endswith('LIMIT 50'))
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+    def test_guarded_stream_holds_a_workload_slot_while_streaming(self):
+        self.responder = numbers(4)
+        batches = self.connector.stream_query(self.database, "SELECT id FROM t", batch_size=2, guarded=True)
+        next(batches)
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 1)
+        list(batches)
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+
+class StreamQueryViewTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database()
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+        self.url = reverse('clientdatabase-stream-query', args=[self.database.pk])
+
+    def test_ndjson_stream_ends_with_a_status_line(self):
+        self.responder = numbers(3)
+        response = self.client.post(self.url, {'query': 'SELECT id FROM t', 'batch_size': 2}, format='json')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(lines[0], {'columns': ['id']})
+        self.assertEqual(lines[1:4], [[0], [1], [2]])
+        self.assertEqual(lines[-1]['success'], True)
+
+    def test_csv_stream(self):
+        self.responder = numbers(2)
+        response = self.client.post(self.url, {'query': 'SELECT id FROM t', 'format': 'csv'}, format='json')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(b''.join(response.streaming_content).decode().splitlines(), ['id', '0', '1'])
+
+    def test_failing_query_gets_an_error_response(self):
+        self.responder = lambda query, params: RuntimeError("syntax error")
+        response = self.client.post(self.url, {'query': 'SELEC 1'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data['success'])
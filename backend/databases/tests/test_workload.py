@@ -0,0 +1,129 @@
+import asyncio
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from databases.workload import QueueTimeout, WorkloadScheduler
+
+from .fakes import FakeConnectorMixin, client_database, create_client_database
+from .test_copy import copy_rows
+from .test_streaming import numbers
+
+
+@override_settings(WORKLOAD_MAX_CONCURRENCY=1, WORKLOAD_OWNER_WEIGHTS={'1': 2})
+class WorkloadSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.scheduler = WorkloadScheduler()
+        self.database = client_database()
+
+    def test_free_slot_is_granted_without_queueing(self):
+        self.assertEqual(self.scheduler.acquire(self.database, 1), 0.0)
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 1)
+        self.scheduler.release(self.database)
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+    def test_freed_slots_go_to_owners_in_weighted_round_robin(self):
+        self.scheduler.acquire(self.database, 1)
+        granted = []
+        for owner_id, name in [(1, 'a1'), (1, 'a2'), (1, 'a3'), (2, 'b1'), (2, 'b2')]:
+            self.scheduler._enqueue(self.database, owner_id, on_grant=lambda name=name: granted.append(name))
+        self.assertEqual(self.scheduler.stats(self.database)['queued_by_owner'], {'1': 3, '2': 2})
+
+        for _ in range(5):
+            self.scheduler.release(self.database)
+        # Owner 1 has weight 2, owner 2 the default of 1
+        self.assertEqual(granted, ['a1', 'a2', 'b1', 'a3', 'b2'])
+
+    def test_busy_database_does_not_hold_up_other_databases(self):
+        busy = client_database(pk=2, max_concurrent_queries=1)
+        with override_settings(WORKLOAD_MAX_CONCURRENCY=2):
+            self.scheduler.acquire(busy, 1)
+            granted = []
+            self.scheduler._enqueue(busy, 1, on_grant=lambda: granted.append('busy'))
+            self.scheduler._enqueue(self.database, 1, on_grant=lambda: granted.append('other'))
+        self.assertEqual(granted, ['other'])
+
+    def test_wait_that_runs_out_raises_queue_timeout(self):
+        self.scheduler.acquire(self.database, 1)
+        with self.assertRaises(QueueTimeout):
+            self.scheduler.acquire(self.database, 2, timeout=0.01)
+        stats = self.scheduler.stats(self.database)
+        self.assertEqual((stats['queued'], stats['timeouts'], stats['running']), (0, 1, 1))
+
+        # The timed out waiter left the queue, so the next release frees the slot
+        self.scheduler.release(self.database)
+        self.assertEqual(self.scheduler.acquire(self.database, 2), 0.0)
+
+    def test_async_acquire_waits_on_the_event_loop(self):
+        async def run():
+            self.scheduler.acquire(self.database, 1)
+            waiting = asyncio.ensure_future(self.scheduler.aacquire(self.database, 2, timeout=5))
+            await asyncio.sleep(0.01)
+            self.assertFalse(waiting.done())
+            self.scheduler.release(self.database)
+            return await waiting
+
+        self.assertGreater(asyncio.run(run()), 0.0)
+        stats = self.scheduler.stats(self.database)
+        self.assertEqual((stats['running'], stats['admitted']), (1, 2))
+        self.assertGreater(stats['max_wait_ms'], 0.0)
+
+    def test_async_timeout_and_cancel_leave_the_queue(self):
+        async def run():
+            self.scheduler.acquire(self.database, 1)
+            with self.assertRaises(QueueTimeout):
+                await self.scheduler.aacquire(self.database, 2, timeout=0.01)
+            waiting = asyncio.ensure_future(self.scheduler.aacquire(self.database, 2, timeout=5))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+
+        asyncio.run(run())
+        stats = self.scheduler.stats(self.database)
+        self.assertEqual((stats['queued'], stats['timeouts'], stats['running']), (0, 1, 1))
+
+
+@override_settings(WORKLOAD_QUEUE_TIMEOUT=0.01)
+class AdmittedEndpointTests(FakeConnectorMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.database = create_client_database(max_concurrent_queries=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.database.owner)
+
+    def post(self, action, data):
+        return self.client.post(reverse(f'clientdatabase-{action}', args=[self.database.pk]), data, format='json')
+
+    def test_execute_query_waits_for_a_slot(self):
+        self.responder = numbers(1)
+        with self.scheduler.admit(self.database, 99):
+            response = self.post('execute-query', {'query': 'SELECT id FROM t'})
+        self.assertEqual(response.json()['error_type'], 'queue_timeout')
+        self.assertEqual(self.queries, [])
+
+    def test_stream_waits_for_a_slot(self):
+        self.responder = numbers(1)
+        with self.scheduler.admit(self.database, 99):
+            response = self.post('stream-query', {'query': 'SELECT id FROM t'})
+        self.assertEqual((response.status_code, response.data['error_type']), (400, 'queue_timeout'))
+
+    def test_export_waits_for_a_slot(self):
+        self.responder = copy_rows('id\n')
+        with self.scheduler.admit(self.database, 99):
+            response = self.post('export', {'query': 'SELECT id FROM t'})
+        self.assertEqual((response.status_code, response.data['error_type']), (400, 'queue_timeout'))
+
+    def test_export_holds_its_slot_until_the_last_byte(self):
+        self.responder = copy_rows('id\n', '1\n')
+        response = self.post('export', {'query': 'SELECT id FROM t'})
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 1)
+        self.assertEqual(b''.join(response.streaming_content), b'id\n1\n')
+        self.assertEqual(self.scheduler.stats(self.database)['running'], 0)
+
+    def test_workload_stats(self):
+        self.responder = numbers(1)
+        self.post('execute-query', {'query': 'SELECT id FROM t'})
+        stats = self.client.get(reverse('clientdatabase-workload-stats', args=[self.database.pk])).data
+        self.assertEqual((stats['admitted'], stats['running'], stats['max_concurrency']), (1, 0, 1))
@@ -1,10 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import DatabaseViewSet
+from .views import DatabaseViewSet, DatabaseReplicaViewSet
+from .async_views import execute_query_async
 
 router = DefaultRouter()
 router.register(r'databases', DatabaseViewSet)
+router.register(r'replicas', DatabaseReplicaViewSet)
 
 urlpatterns = [
+    # Async variant of databases/<pk>/execute_query/ for ASGI deployments
+    path('databases/<int:pk>/execute_query_async/', execute_query_async, name='database-execute-query-async'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
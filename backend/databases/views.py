@@ -1,16 +1,74 @@
+import csv
+import itertools
+import json
+from django.conf import settings
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import ClientDatabase, TableMetadata, ColumnMetadata, RelationshipMetadata
+from .models import ClientDatabase, DatabaseReplica, TableMetadata, ColumnMetadata, RelationshipMetadata
 from .serializers import (
     ClientDatabaseSerializer,
+    DatabaseReplicaSerializer,
     QueryExecutionSerializer,
-    ConnectionTestSerializer,
-    QueryResultSerializer
+    QueryStreamSerializer,
+    QueryExportSerializer,
+    DataImportSerializer,
+    BatchExecutionSerializer,
+    ExplainSerializer,
+    MetadataExtractionSerializer,
+    RowCountSerializer,
+    ResultPageSerializer,
+    CancelQuerySerializer,
+    ConnectionTestSerializer
 )
 from .services import DatabaseConnector, MetadataExtractor, MetadataVectorizer
+from .pool import pool_registry, replica_owner_key
+from .routing import replica_router
+from .breaker import breaker_registry
+from .plans import plan_cache
+from .cache import query_result_cache
+from .workload import workload_scheduler
+from .limits import ResultBudget, query_limits
+from .responses import encode_json, query_result_response
+from .columnar import ARROW_CONTENT_TYPE, arrow_available, arrow_stream, to_columnar
+
+
+class _EchoBuffer:
+    """File-like object whose write() hands the value back, so csv.writer can feed a generator"""
+    
+    def write(self, value):
+        return value
+
+
+def _ndjson_stream(connector, columns, batches, budget=None):
+    """Encode streamed batches as newline-delimited JSON: a header, one array per row, then a status line"""
+    yield json.dumps({'columns': columns}) + '\n'
+    row_count = 0
+    try:
+        for batch in batches:
+            row_count += len(batch)
+            yield b''.join(encode_json(row) + b'\n' for row in batch)
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({'success': False, 'status': f"Error: {str(e)}", 'error_type': connector.classify_error(e)}) + '\n'
+        return
+    result = {'success': True, 'status': f"Query returned {row_count} rows"}
+    if budget is not None and budget.exceeded:
+        result.update(truncated=True, limit=budget.exceeded)
+        result['status'] += f" (truncated at the {budget.exceeded} limit of {budget.limit_value()})"
+    yield json.dumps(result) + '\n'
+
+
+def _csv_stream(columns, batches):
+    """Encode streamed batches as CSV with a header row"""
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow(columns)
+    for batch in batches:
+        yield ''.join(writer.writerow(row) for row in batch)
 
 class DatabaseViewSet(viewsets.ModelViewSet):
     """CRUD operations for database connections"""
@@ -27,6 +85,24 @@ class DatabaseViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
     
+    def perform_update(self, serializer):
+        database = serializer.save()
+        # Close pooled connections opened with the old host/credentials right away
+        pool_registry.discard(database.pk)
+        breaker_registry.reset(database.pk)
+        # Plans and cached results may differ on the new host
+        plan_cache.invalidate(database.pk)
+        query_result_cache.invalidate(database.pk)
+    
+    def perform_destroy(self, instance):
+        pool_registry.discard(instance.pk)
+        plan_cache.invalidate(instance.pk)
+        query_result_cache.invalidate(instance.pk)
+        for replica_id in instance.replicas.values_list('pk', flat=True):
+            pool_registry.discard(replica_owner_key(replica_id))
+        replica_router.invalidate(instance.pk)
+        instance.delete()
+    
     @action(detail=True, methods=['post'])
     def test_connection(self, request, pk=None):
         """Test database connection"""
@@ -41,6 +117,25 @@ class DatabaseViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def pool_stats(self, request, pk=None):
+        """Get connection pool usage for this database"""
+        database = self.get_object()
+        connector = DatabaseConnector()
+        stats = connector.get_pool_stats(database)
+        
+        if stats is None:
+            # No pool yet: nothing has connected to this database in this process
+            stats = {'size': 0, 'in_use': 0, 'idle': 0, 'waits': 0, 'wait_time': 0.0}
+        
+        return Response(stats)
+    
+    @action(detail=True, methods=['get'])
+    def workload_stats(self, request, pk=None):
+        """Get running and queued query counts and queue wait times for this database"""
+        database = self.get_object()
+        return Response(workload_scheduler.stats(database))
+    
     @action(detail=True, methods=['post'])
     def execute_query(self, request, pk=None):
         """Execute SQL query on the database"""
@@ -49,10 +144,20 @@ class DatabaseViewSet(viewsets.ModelViewSet):
         query_serializer.is_valid(raise_exception=True)
         
         connector = DatabaseConnector()
+        if query_serializer.validated_data['format'] == 'arrow':
+            return self._arrow_response(request, connector, database, query_serializer.validated_data)
+        
         result = connector.execute_query(
             database,
             query_serializer.validated_data['query'],
-            query_serializer.validated_data.get('params')
+            query_serializer.validated_data.get('params'),
+            page_size=query_serializer.validated_data.get('page_size', settings.QUERY_RESULT_PAGE_SIZE),
+            bypass_cache=query_serializer.validated_data['bypass_cache'],
+            on_limit=query_serializer.validated_data['on_limit'],
+            execution_id=query_serializer.validated_data.get('execution_id'),
+            override_cost_guard=query_serializer.validated_data['override_cost_guard'],
+            use_primary=query_serializer.validated_data['use_primary'],
+            owner_id=request.user.id
         )
         
         # Ensure that error_type is included in the response
@@ -60,17 +165,320 @@ class DatabaseViewSet(viewsets.ModelViewSet):
             if "error_type" not in result:
                 # Set a default error type if none is provided by the connector
                 result["error_type"] = "execution_error"
-                
-        result_serializer = QueryResultSerializer(data=result)
-        result_serializer.is_valid(raise_exception=True)
-        return Response(result_serializer.data)
+        
+        if query_serializer.validated_data['format'] == 'columnar':
+            result = to_columnar(result)
+        
+        # Rows are already JSON-ready; skip per-row serializer validation for large results
+        return query_result_response(request, result)
+    
+    def _arrow_response(self, request, connector, database, data):
+        """
+        Stream a query result as Arrow IPC, built batch by batch from a server-side cursor
+        
+        A result cut off at the row or byte budget ends with an empty batch flagged truncated.
+        """
+        if not arrow_available():
+            return Response({
+                'success': False,
+                'status': 'Error: the arrow format needs the pyarrow package on the server',
+                'error_type': 'format_unavailable'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Same admission, cost guard and row/byte budget as the JSON formats
+        limits = query_limits(database)
+        budget = ResultBudget(limits['max_rows'], limits['max_bytes'])
+        batches = connector.stream_query(
+            database,
+            data['query'],
+            data.get('params'),
+            execution_id=data.get('execution_id'),
+            owner_id=request.user.id,
+            with_types=True,
+            guarded=True,
+            budget=budget,
+            on_limit=data['on_limit'],
+            override_cost_guard=data['override_cost_guard']
+        )
+        try:
+            # Start the query before sending headers so failures still get a normal error response
+            columns, types = next(batches)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'status': f"Error: {str(e)}",
+                'error_type': connector.classify_error(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return StreamingHttpResponse(arrow_stream(columns, types, batches, budget), content_type=ARROW_CONTENT_TYPE)
+    
+    @action(detail=True, methods=['post'])
+    def execute_batch(self, request, pk=None):
+        """Execute several statements in order, in one transaction, and return every result"""
+        database = self.get_object()
+        batch_serializer = BatchExecutionSerializer(data=request.data)
+        batch_serializer.is_valid(raise_exception=True)
+        data = batch_serializer.validated_data
+        
+        connector = DatabaseConnector()
+        result = connector.execute_batch(
+            database,
+            data['statements'],
+            execution_id=data.get('execution_id'),
+            owner_id=request.user.id,
+            on_limit=data['on_limit']
+        )
+        return query_result_response(request, result)
+    
+    @action(detail=True, methods=['post'])
+    def explain(self, request, pk=None):
+        """Return the query plan for a SQL string with a digest of its cost hot spots"""
+        database = self.get_object()
+        explain_serializer = ExplainSerializer(data=request.data)
+        explain_serializer.is_valid(raise_exception=True)
+        data = explain_serializer.validated_data
+        
+        # Known row counts from the extracted metadata, to flag seq scans on large tables
+        table_rows = {
+            f"{schema_name}.{table_name}": row_count
+            for schema_name, table_name, row_count in TableMetadata.objects.filter(
+                database=database, row_count__isnull=False
+            ).values_list('schema_name', 'table_name', 'row_count')
+        }
+        
+        connector = DatabaseConnector()
+        result = connector.explain_query(
+            database,
+            data['query'],
+            data.get('params'),
+            analyze=data['analyze'],
+            buffers=data['buffers'],
+            table_rows=table_rows,
+            execution_id=data.get('execution_id'),
+            owner_id=request.user.id
+        )
+        if not data['include_plan']:
+            result.pop('plan', None)
+        
+        if not result['success']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=True, methods=['post'])
+    def cancel_query(self, request, pk=None):
+        """Cancel a running query by its execution id"""
+        database = self.get_object()
+        cancel_serializer = CancelQuerySerializer(data=request.data)
+        cancel_serializer.is_valid(raise_exception=True)
+        execution_id = cancel_serializer.validated_data['execution_id']
+        
+        connector = DatabaseConnector()
+        try:
+            cancelled = connector.cancel_execution(database, execution_id)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'message': f"Error cancelling query: {str(e)}",
+                'error_type': connector.classify_error(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        if not cancelled:
+            return Response({
+                'success': False,
+                'message': f'No running query with execution id {execution_id}'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'success': True,
+            'message': 'Cancellation requested',
+            'execution_id': execution_id
+        })
+    
+    @action(detail=True, methods=['get'])
+    def running_queries(self, request, pk=None):
+        """List queries currently running against this database (in this worker process)"""
+        database = self.get_object()
+        connector = DatabaseConnector()
+        return Response(connector.get_running_queries(database))
+    
+    @action(detail=True, methods=['post'])
+    def purge_cache(self, request, pk=None):
+        """Drop cached query results for this database"""
+        database = self.get_object()
+        connector = DatabaseConnector()
+        purged = connector.purge_cache(database)
+        
+        return Response({
+            'success': True,
+            'message': f'Purged {purged} cached results',
+            'purged': purged
+        })
+    
+    @action(detail=True, methods=['get'])
+    def results(self, request, pk=None):
+        """Get another page of a query result by result handle (offset or keyset paging)"""
+        database = self.get_object()
+        page_serializer = ResultPageSerializer(data=request.query_params)
+        page_serializer.is_valid(raise_exception=True)
+        data = page_serializer.validated_data
+        
+        connector = DatabaseConnector()
+        if data.get('key_column'):
+            result = connector.fetch_keyset_page(
+                database, data['handle'], data['key_column'], data.get('after'), data.get('limit')
+            )
+        else:
+            result = connector.fetch_result_page(database, data['handle'], data['offset'], data.get('limit'))
+        
+        if result is None:
+            return Response({
+                'success': False,
+                'status': 'Result handle not found or expired; run the query again',
+                'error_type': 'result_expired'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        if data['format'] == 'columnar':
+            result = to_columnar(result)
+        return query_result_response(request, result)
+    
+    @action(detail=True, methods=['post'])
+    def stream_query(self, request, pk=None):
+        """
+        Execute SQL query and stream the rows back as NDJSON or CSV
+        
+        A result cut off at the row or byte budget is flagged truncated in the NDJSON status
+        line; a CSV stream just ends, so use on_limit='error' to detect it there.
+        """
+        database = self.get_object()
+        stream_serializer = QueryStreamSerializer(data=request.data)
+        stream_serializer.is_valid(raise_exception=True)
+        data = stream_serializer.validated_data
+        
+        # Same admission, cost guard and row/byte budget as execute_query
+        limits = query_limits(database)
+        budget = ResultBudget(limits['max_rows'], limits['max_bytes'])
+        connector = DatabaseConnector()
+        batches = connector.stream_query(
+            database,
+            data['query'],
+            data.get('params'),
+            batch_size=data['batch_size'],
+            execution_id=data.get('execution_id'),
+            owner_id=request.user.id,
+            # CSV keeps numeric values exact instead of going through float
+            exact_numeric=data['format'] == 'csv',
+            guarded=True,
+            budget=budget,
+            on_limit=data['on_limit'],
+            override_cost_guard=data['override_cost_guard']
+        )
+        
+        try:
+            # Start the query before sending headers so failures still get a normal error response
+            columns = next(batches)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'status': f"Error: {str(e)}",
+                'error_type': connector.classify_error(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if data['format'] == 'csv':
+            response = StreamingHttpResponse(_csv_stream(columns, batches), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="query_results.csv"'
+        else:
+            response = StreamingHttpResponse(_ndjson_stream(connector, columns, batches, budget), content_type='application/x-ndjson')
+        return response
+    
+    @action(detail=True, methods=['post'])
+    def export(self, request, pk=None):
+        """Export a SELECT as CSV using COPY, streamed straight to the response"""
+        database = self.get_object()
+        export_serializer = QueryExportSerializer(data=request.data)
+        export_serializer.is_valid(raise_exception=True)
+        data = export_serializer.validated_data
+        
+        connector = DatabaseConnector()
+        chunks = connector.copy_export(
+            database,
+            data['query'],
+            data.get('params'),
+            compress=data['compress'],
+            execution_id=data.get('execution_id'),
+            owner_id=request.user.id,
+            guarded=True,
+            override_cost_guard=data['override_cost_guard']
+        )
+        
+        try:
+            # Wait for the first bytes so a failing query still gets a normal error response
+            first_chunk = next(chunks, b'')
+        except Exception as e:
+            return Response({
+                'success': False,
+                'status': f"Error: {str(e)}",
+                'error_type': 'invalid_query' if isinstance(e, ValueError) else connector.classify_error(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if data['compress']:
+            response = StreamingHttpResponse(itertools.chain([first_chunk], chunks), content_type='application/gzip')
+            response['Content-Disposition'] = 'attachment; filename="query_results.csv.gz"'
+        else:
+            response = StreamingHttpResponse(itertools.chain([first_chunk], chunks), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="query_results.csv"'
+        return response
+    
+    @action(detail=True, methods=['post'])
+    def import_data(self, request, pk=None):
+        """Bulk load an uploaded CSV or Parquet file into a table with COPY FROM"""
+        database = self.get_object()
+        import_serializer = DataImportSerializer(data=request.data)
+        import_serializer.is_valid(raise_exception=True)
+        data = import_serializer.validated_data
+        table = get_object_or_404(TableMetadata, pk=data['table_id'], database=database)
+        
+        if data['format'] == 'parquet' and not arrow_available():
+            return Response({
+                'success': False,
+                'status': 'Error: Parquet imports need the pyarrow package on the server',
+                'error_type': 'format_unavailable'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        connector = DatabaseConnector()
+        result = connector.copy_import(
+            database,
+            table.schema_name,
+            table.table_name,
+            data['file'],
+            file_format=data['format'],
+            header=data['header'],
+            delimiter=data['delimiter'],
+            columns=data.get('columns'),
+            execution_id=data.get('execution_id'),
+            owner_id=request.user.id
+        )
+        if not result['success']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        
+        # COPY adds rows only, so an exact row count just grows by what was loaded; a missing
+        # or estimated one is replaced by an exact count taken in the background
+        updated = TableMetadata.objects.filter(
+            pk=table.pk, row_count__isnull=False, row_count_estimated=False
+        ).update(row_count=F('row_count') + result['rows'])
+        if not updated:
+            MetadataExtractor().count_rows(database, [table], background=True)
+        return Response(result)
     
     @action(detail=True, methods=['post'])
     def extract_metadata(self, request, pk=None):
         """Extract schema metadata from the database"""
         database = self.get_object()
-        extractor = MetadataExtractor()
-        success, message, changes = extractor.extract_full_metadata(database)
+        extraction_serializer = MetadataExtractionSerializer(data=request.data)
+        extraction_serializer.is_valid(raise_exception=True)
+        data = extraction_serializer.validated_data
+        
+        extractor = MetadataExtractor(use_replica=data['use_replica'])
+        success, message, changes = extractor.extract_full_metadata(database, force=data['force'])
         
         # Generate ER diagram after metadata extraction
         if success:
@@ -83,6 +491,42 @@ class DatabaseViewSet(viewsets.ModelViewSet):
             'changes': changes
         })
     
+    @action(detail=True, methods=['post'])
+    def count_rows(self, request, pk=None):
+        """Replace estimated row counts with exact COUNT(*) results, each within a time budget"""
+        database = self.get_object()
+        count_serializer = RowCountSerializer(data=request.data)
+        count_serializer.is_valid(raise_exception=True)
+        data = count_serializer.validated_data
+        
+        tables = TableMetadata.objects.filter(database=database)
+        if 'table_ids' in data:
+            tables = tables.filter(pk__in=data['table_ids'])
+        else:
+            tables = tables.filter(table_type='table')
+        tables = list(tables)
+        
+        if data['always']:
+            TableMetadata.objects.filter(pk__in=[t.pk for t in tables]).update(count_rows_exactly=True)
+        
+        extractor = MetadataExtractor()
+        counts = extractor.count_rows(
+            database, tables, time_budget_ms=data.get('time_budget_ms'), background=data['background']
+        )
+        if data['background']:
+            return Response({
+                'success': True,
+                'message': f"Counting rows of {len(tables)} tables in the background"
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        return Response({
+            'success': True,
+            'message': f"Counted {len(counts)} of {len(tables)} tables",
+            'row_counts': counts,
+            # Tables that ran out of time keep their estimate
+            'skipped': [t.pk for t in tables if t.pk not in counts]
+        })
+    
     @action(detail=True, methods=['post'])
     def update_embeddings(self, request, pk=None):
         """Update embeddings for database metadata"""
@@ -130,6 +574,7 @@ class DatabaseViewSet(viewsets.ModelViewSet):
                 'table_type': table.table_type,
                 'description': table.description,
                 'row_count': table.row_count,
+                'row_count_estimated': table.row_count_estimated,
                 'columns': column_data
             })
         
@@ -257,7 +702,6 @@ class DatabaseViewSet(viewsets.ModelViewSet):
         
         try:
             from llm_agent.services import get_metadata_description
-            connector = DatabaseConnector()
             
             # Prepare context data for AI
             context = {}
@@ -307,13 +751,10 @@ class DatabaseViewSet(viewsets.ModelViewSet):
                 
                 # Get sample distinct values to provide better context for AI
                 try:
-                    sample_values = connector.get_column_sample_values(
-                        database, 
-                        table.schema_name, 
-                        table.table_name, 
-                        column.column_name, 
-                        limit=10
-                    )
+                    # Cached at extraction; otherwise sample the whole table once and cache it
+                    sample_values = column.sample_values
+                    if sample_values is None:
+                        sample_values = MetadataExtractor().refresh_sample_values(table).get(column.column_name, [])
                     
                     if sample_values:
                         context['sample_values'] = sample_values
@@ -375,3 +816,33 @@ class DatabaseViewSet(viewsets.ModelViewSet):
                 return Response(result["diagram_data"])
             else:
                 return Response({"error": result["error"]}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DatabaseReplicaViewSet(viewsets.ModelViewSet):
+    """CRUD operations for read replicas of the user's databases"""
+    queryset = DatabaseReplica.objects.all()
+    serializer_class = DatabaseReplicaSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        queryset = DatabaseReplica.objects.filter(database__owner=self.request.user)
+        database_id = self.request.query_params.get('database')
+        if database_id:
+            queryset = queryset.filter(database_id=database_id)
+        return queryset
+    
+    def perform_create(self, serializer):
+        replica = serializer.save()
+        replica_router.invalidate(replica.database_id)
+    
+    def perform_update(self, serializer):
+        replica = serializer.save()
+        # Close pooled connections opened with the old host/credentials right away
+        pool_registry.discard(replica_owner_key(replica.pk))
+        breaker_registry.reset(replica_owner_key(replica.pk))
+        replica_router.invalidate(replica.database_id)
+    
+    def perform_destroy(self, instance):
+        pool_registry.discard(replica_owner_key(instance.pk))
+        replica_router.invalidate(instance.database_id)
+        instance.delete()
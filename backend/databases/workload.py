@@ -0,0 +1,275 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class QueueTimeout(Exception):
+    """Raised when a query waited longer than WORKLOAD_QUEUE_TIMEOUT for an execution slot"""
+
+
+class _Waiter:
+    def __init__(self, database_id, owner_id):
+        self.database_id = database_id
+        self.owner_id = owner_id
+        self.enqueued_at = time.monotonic()
+        self.granted = threading.Event()
+        self.on_grant = None  # called with the scheduler lock held once the slot is granted
+
+
+class _DatabaseStats:
+    def __init__(self):
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=200)
+
+
+class WorkloadScheduler:
+    """
+    Admission control for client database queries in this process
+
+    A query needs a free slot both on its database (max_concurrent_queries, or
+    WORKLOAD_MAX_CONCURRENCY_PER_DATABASE) and in the process (WORKLOAD_MAX_CONCURRENCY).
+    When none is free it queues under its owner. Freed slots go to owners in weighted round
+    robin: each owner is served up to its weight (WORKLOAD_OWNER_WEIGHTS, default 1) queued
+    queries in turn, so one user's burst cannot starve everyone else's queries. A query that
+    waits longer than the timeout gives up with QueueTimeout.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running_total = 0
+        self._queues = OrderedDict()  # owner id -> deque of waiters, in owner turn order
+        self._served = {}  # owner id -> grants in the owner's current turn
+        self._limits = {}  # database id -> max concurrency
+        self._stats = {}  # database id -> _DatabaseStats
+
+    def _max_total(self):
+        return getattr(settings, 'WORKLOAD_MAX_CONCURRENCY', 32)
+
+    def _weight(self, owner_id):
+        weights = getattr(settings, 'WORKLOAD_OWNER_WEIGHTS', {})
+        return max(int(weights.get(str(owner_id), 1)), 1)
+
+    def _database_stats(self, database_id):
+        stats = self._stats.get(database_id)
+        if stats is None:
+            stats = self._stats[database_id] = _DatabaseStats()
+        return stats
+
+    def _has_capacity(self, database_id):
+        return (self._running_total < self._max_total()
+                and self._database_stats(database_id).running < self._limits[database_id])
+
+    def _start(self, database_id, waited):
+        self._running_total += 1
+        stats = self._database_stats(database_id)
+        stats.running += 1
+        stats.admitted += 1
+        stats.total_wait += waited
+        stats.max_wait = max(stats.max_wait, waited)
+        stats.recent_waits.append(waited)
+
+    def _dispatch(self):
+        """Hand free slots to queued queries, owner by owner (called with the lock held)"""
+        while self._queues and self._running_total < self._max_total():
+            for _ in range(len(self._queues)):
+                owner_id, waiters = next(iter(self._queues.items()))
+                # The owner's oldest query whose database has room; others may be for a busy database
+                waiter = next((w for w in waiters if self._has_capacity(w.database_id)), None)
+                if waiter is not None:
+                    break
+                # Nothing runnable for this owner right now, try the next one
+                self._queues.move_to_end(owner_id)
+                self._served[owner_id] = 0
+            else:
+                return
+
+            waiters.remove(waiter)
+            self._database_stats(waiter.database_id).queued -= 1
+            self._start(waiter.database_id, time.monotonic() - waiter.enqueued_at)
+            waiter.granted.set()
+            if waiter.on_grant is not None:
+                waiter.on_grant()
+
+            self._served[owner_id] = self._served.get(owner_id, 0) + 1
+            if not waiters:
+                del self._queues[owner_id]
+                self._served.pop(owner_id, None)
+            elif self._served[owner_id] >= self._weight(owner_id):
+                # Turn used up, go to the back of the line
+                self._queues.move_to_end(owner_id)
+                self._served[owner_id] = 0
+
+    def _enqueue(self, database_obj, owner_id, on_grant=None):
+        """Take a slot or join the owner's queue; returns the waiter, or None when admitted at once"""
+        database_id = database_obj.pk
+        with self._lock:
+            self._limits[database_id] = (database_obj.max_concurrent_queries
+                                         or getattr(settings, 'WORKLOAD_MAX_CONCURRENCY_PER_DATABASE', 8))
+            # Run straight away only when nobody is already waiting ahead of us
+            if not self._queues and self._has_capacity(database_id):
+                self._start(database_id, 0.0)
+                return None
+            waiter = _Waiter(database_id, owner_id)
+            waiter.on_grant = on_grant
+            self._queues.setdefault(waiter.owner_id, deque()).append(waiter)
+            self._database_stats(database_id).queued += 1
+            self._dispatch()
+            return waiter
+
+    def _withdraw(self, waiter, timed_out=False):
+        """Take a waiter out of its queue; returns True if it was granted a slot in the meantime"""
+        with self._lock:
+            if waiter.granted.is_set():
+                return True
+            waiters = self._queues[waiter.owner_id]
+            waiters.remove(waiter)
+            if not waiters:
+                del self._queues[waiter.owner_id]
+                self._served.pop(waiter.owner_id, None)
+            stats = self._database_stats(waiter.database_id)
+            stats.queued -= 1
+            if timed_out:
+                stats.timeouts += 1
+            return False
+
+    def acquire(self, database_obj, owner_id, timeout=None):
+        """Wait for an execution slot; returns the seconds spent queued"""
+        if timeout is None:
+            timeout = getattr(settings, 'WORKLOAD_QUEUE_TIMEOUT', 30)
+        waiter = self._enqueue(database_obj, owner_id)
+        if waiter is None:
+            return 0.0
+
+        # Granted just as the wait ran out also counts
+        if waiter.granted.wait(timeout) or self._withdraw(waiter, timed_out=True):
+            return time.monotonic() - waiter.enqueued_at
+        raise QueueTimeout(f"Query waited more than {timeout}s for a free execution slot")
+
+    async def aacquire(self, database_obj, owner_id, timeout=None):
+        """Like acquire, but waits on the event loop, so a queued query holds no thread"""
+        if timeout is None:
+            timeout = getattr(settings, 'WORKLOAD_QUEUE_TIMEOUT', 30)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        waiter = self._enqueue(database_obj, owner_id,
+                               on_grant=lambda: loop.call_soon_threadsafe(_resolve, granted))
+        if waiter is None:
+            return 0.0
+
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), timeout)
+        except asyncio.TimeoutError:
+            if not self._withdraw(waiter, timed_out=True):
+                raise QueueTimeout(f"Query waited more than {timeout}s for a free execution slot")
+        except asyncio.CancelledError:
+            if self._withdraw(waiter):
+                # Granted while being cancelled, nobody will use it
+                self.release(database_obj)
+            raise
+        return time.monotonic() - waiter.enqueued_at
+
+    def release(self, database_obj):
+        with self._lock:
+            self._running_total -= 1
+            self._database_stats(database_obj.pk).running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, database_obj, owner_id, timeout=None):
+        """Hold an execution slot for the duration of the block; yields the seconds spent queued"""
+        waited = self.acquire(database_obj, owner_id, timeout)
+        try:
+            yield waited
+        finally:
+            self.release(database_obj)
+
+    async def aadmit(self, database_obj, owner_id, timeout=None):
+        """Wait on the event loop for a slot; returns an Admission to hand to the thread running the query"""
+        try:
+            waited = await self.aacquire(database_obj, owner_id, timeout)
+        except QueueTimeout as e:
+            return Admission(self, database_obj, error=e)
+        return Admission(self, database_obj, waited)
+
+    def stats(self, database_obj):
+        """Queue depth, concurrency and wait time metrics for a database in this process"""
+        with self._lock:
+            stats = self._database_stats(database_obj.pk)
+            recent = sorted(stats.recent_waits)
+            queued_by_owner = {}
+            for owner_id, waiters in self._queues.items():
+                count = sum(1 for w in waiters if w.database_id == database_obj.pk)
+                if count:
+                    queued_by_owner[str(owner_id)] = count
+            return {
+                'running': stats.running,
+                'queued': stats.queued,
+                'queued_by_owner': queued_by_owner,
+                'max_concurrency': (database_obj.max_concurrent_queries
+                                    or getattr(settings, 'WORKLOAD_MAX_CONCURRENCY_PER_DATABASE', 8)),
+                'admitted': stats.admitted,
+                'timeouts': stats.timeouts,
+                'avg_wait_ms': round(stats.total_wait / stats.admitted * 1000, 2) if stats.admitted else 0.0,
+                'p95_wait_ms': round(recent[min(int(len(recent) * 0.95), len(recent) - 1)] * 1000, 2) if recent else 0.0,
+                'max_wait_ms': round(stats.max_wait * 1000, 2),
+                'process_running': self._running_total,
+                'process_max_concurrency': self._max_total(),
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class Admission:
+    """
+    An execution slot granted ahead of time by WorkloadScheduler.aadmit
+
+    Used like admit(): entering it yields the seconds spent queued (or raises the QueueTimeout
+    of a wait that ran out) and leaving it releases the slot. abandon() releases a slot that
+    was never entered, e.g. when the request was cancelled before the query started.
+    """
+
+    def __init__(self, scheduler, database_obj, waited=0.0, error=None):
+        self._scheduler = scheduler
+        self._database_obj = database_obj
+        self._lock = threading.Lock()
+        self._state = 'failed' if error else 'granted'  # granted -> held -> released
+        self.waited = waited
+        self.error = error
+
+    def __enter__(self):
+        with self._lock:
+            if self.error:
+                raise self.error
+            if self._state != 'granted':
+                raise QueueTimeout("Execution slot was given up before the query started")
+            self._state = 'held'
+        return self.waited
+
+    def __exit__(self, *exc_info):
+        self._release('held')
+
+    def abandon(self):
+        self._release('granted')
+
+    def _release(self, expected):
+        with self._lock:
+            if self._state != expected:
+                return
+            self._state = 'released'
+        self._scheduler.release(self._database_obj)
+
+
+# Shared by every DatabaseConnector in this process
+workload_scheduler = WorkloadScheduler()
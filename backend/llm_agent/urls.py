@@ -3,5 +3,6 @@ from . import views
 
 urlpatterns = [
     path('generate-sql/', views.generate_sql_from_nl, name='generate-sql'),
+    path('generate-sql-async/', views.generate_sql_from_nl_async, name='generate-sql-async'),
     # Removed redundant generate-description endpoint
 ]
\ No newline at end of file
@@ -1,4 +1,9 @@
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
@@ -6,6 +11,7 @@ from rest_framework.permissions import IsAuthenticated
 from .services import nl_to_sql, get_metadata_description
 from databases.models import ClientDatabase, TableMetadata, ColumnMetadata
 from databases.services import DatabaseConnector
+from databases.async_views import authenticate_request, parse_json_body, unauthorized_response
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -41,3 +47,50 @@ def generate_sql_from_nl(request):
         'sql_query': result.get('sql_query', ''),
         'explanation': result.get('explanation', '')
     })
+
+
+def _nl_to_sql_in_thread(natural_language_query, database_id, user):
+    """Run nl_to_sql on a worker thread and release that thread's ORM connections afterwards"""
+    try:
+        return nl_to_sql(natural_language_query, database_id, user=user)
+    finally:
+        connections.close_all()
+
+
+@csrf_exempt
+@require_POST
+async def generate_sql_from_nl_async(request):
+    """
+    Async variant of generate_sql_from_nl for ASGI deployments
+
+    The LLM call runs off the event loop, so a slow completion does not hold a worker.
+    """
+    user = await authenticate_request(request)
+    if user is None:
+        return unauthorized_response()
+
+    data = parse_json_body(request) or {}
+    if 'query' not in data or 'database_id' not in data:
+        return JsonResponse(
+            {
+                'error': 'Both query and database_id are required',
+                'error_type': 'missing_parameters'
+            },
+            status=400
+        )
+
+    # thread_sensitive=False so concurrent generations don't queue behind each other
+    result = await sync_to_async(_nl_to_sql_in_thread, thread_sensitive=False)(data['query'], data['database_id'], user)
+
+    if not result.get('success'):
+        return JsonResponse(
+            {
+                'error': result.get('error', 'Unknown error generating SQL'),
+                'error_type': result.get('error_type', 'generation_error')
+            },
+            status=400
+        )
+    return JsonResponse({
+        'sql_query': result.get('sql_query', ''),
+        'explanation': result.get('explanation', '')
+    })
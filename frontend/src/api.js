@@ -97,6 +97,12 @@ api.executeSqlQuery = (databaseId, sqlQuery) =>
     query: sqlQuery,
   });
 
+// Fetch another page of a paginated query result
+api.fetchResultPage = (databaseId, handle, offset, limit) =>
+  api.get(`/api/databases/databases/${databaseId}/results/`, {
+    params: { handle, offset, limit },
+  });
+
 // ER Diagram
 api.getERDiagram = (databaseId) =>
   api.get(`/api/databases/databases/${databaseId}/er_diagram/`);
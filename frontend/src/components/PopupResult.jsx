@@ -64,7 +64,9 @@ const PopupResult = ({
   sql, 
   results, 
   executionTime,
-  naturalQuery // Add naturalQuery parameter
+  naturalQuery, // Add naturalQuery parameter
+  onLoadMore, // Fetches the next page of a large result (omitted for historic results)
+  loadingMore
 }) => {
   const theme = useTheme();
   const [tabValue, setTabValue] = useState(0);
@@ -251,6 +253,8 @@ const PopupResult = ({
               <Box sx={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', mb: 2 }}>
                 <Typography variant="body2" color="text.secondary" sx={{ fontWeight: 500 }}>
                   {results.rows?.length || 0} {results.rows?.length === 1 ? 'row' : 'rows'} returned
+                  {results.has_more && (results.total_rows != null ? ` of ${results.total_rows}` : ', more available')}
+                  {results.truncated && ' (truncated)'}
                 </Typography>
                 <Box>
                   <Tooltip title="Export to Excel">
@@ -379,6 +383,14 @@ const PopupResult = ({
                   </Typography>
                 </Box>
               )}
+
+              {results.has_more && onLoadMore && (
+                <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                  <Button variant="outlined" size="small" onClick={onLoadMore} disabled={loadingMore}>
+                    {loadingMore ? 'Loading...' : 'Load more rows'}
+                  </Button>
+                </Box>
+              )}
             </Box>
           ) : (
             <Box sx={{ 
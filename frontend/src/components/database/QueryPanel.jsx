@@ -1,4 +1,4 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import { 
   Box, 
   Typography, 
@@ -41,7 +41,14 @@ const QueryPanel = ({ selectedDb, onQueryResult }) => {
         onQueryResult({
           columns: response.data.columns,
           rows: response.data.rows,
-          status: `Executed successfully. ${response.data.rows.length} row(s) returned. Time: ${response.data.execution_time}ms`
+          // Large results come back one page at a time behind a result handle
+          result_handle: response.data.result_handle,
+          has_more: response.data.has_more,
+          total_rows: response.data.total_rows,
+          truncated: response.data.truncated,
+          status: response.data.has_more
+            ? `Executed successfully. Showing the first ${response.data.rows.length} row(s). Time: ${response.data.execution_time}ms`
+            : `Executed successfully. ${response.data.rows.length} row(s) returned. Time: ${response.data.execution_time}ms`
         });
       }
     } catch (err) {
@@ -103,9 +110,38 @@ const QueryPanel = ({ selectedDb, onQueryResult }) => {
 };
 
 // This component displays the result of a query
-export const QueryResultPanel = ({ queryResult }) => {
+export const QueryResultPanel = ({ queryResult, selectedDb }) => {
+  const [moreRows, setMoreRows] = useState([]);
+  const [lastPage, setLastPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  // A new result starts from its first page again
+  useEffect(() => {
+    setMoreRows([]);
+    setLastPage(null);
+  }, [queryResult]);
+
   if (!queryResult) return null;
   
+  const rows = moreRows.length ? [...queryResult.rows, ...moreRows] : queryResult.rows;
+  const hasMore = lastPage ? lastPage.has_more : queryResult.has_more;
+  const totalRows = lastPage ? lastPage.total_rows : queryResult.total_rows;
+  const truncated = (lastPage && lastPage.truncated) || queryResult.truncated;
+
+  // Fetch the next page of the result by its handle and append it
+  const handleLoadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const response = await api.fetchResultPage(selectedDb, queryResult.result_handle, rows.length);
+      setMoreRows([...moreRows, ...response.data.rows]);
+      setLastPage(response.data);
+    } catch (err) {
+      console.error("Error loading more rows:", err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+  
   return (
     <Paper className="w-full rounded-lg shadow-md overflow-hidden" sx={{ 
       backgroundColor: '#1F2736',
@@ -136,7 +172,7 @@ export const QueryResultPanel = ({ queryResult }) => {
               </tr>
             </thead>
             <tbody className="bg-gray-700 divide-y divide-gray-600">
-              {queryResult.rows.map((row, rowIdx) => (
+              {rows.map((row, rowIdx) => (
                 <tr key={rowIdx} className={rowIdx % 2 === 0 ? "bg-gray-800" : "bg-gray-700"}>
                   {row.map((cell, cellIdx) => (
                     <td
@@ -152,6 +188,18 @@ export const QueryResultPanel = ({ queryResult }) => {
               ))}
             </tbody>
           </table>
+          <Box className="p-4 flex items-center justify-between">
+            <Typography variant="caption" className="text-gray-400">
+              {rows.length} {totalRows != null && hasMore ? `of ${totalRows} ` : ''}row(s)
+              {hasMore && totalRows == null ? ', more available' : ''}
+              {truncated ? ' (truncated at the result limit)' : ''}
+            </Typography>
+            {hasMore && queryResult.result_handle && (
+              <Button variant="outlined" size="small" onClick={handleLoadMore} disabled={loadingMore}>
+                {loadingMore ? <CircularProgress size={18} /> : "Load more rows"}
+              </Button>
+            )}
+          </Box>
         </Box>
       ) : (
         <Typography className="text-center text-gray-400 py-4">
@@ -690,7 +690,7 @@ const DatabaseTester = () => {
         {/* Query Results Section - Full Width */}
         {selectedDb && activeTab === 3 && queryResult && (
           <Box className="mt-8 w-full">
-            <QueryResultPanel queryResult={queryResult} />
+            <QueryResultPanel queryResult={queryResult} selectedDb={selectedDb} />
           </Box>
         )}
         
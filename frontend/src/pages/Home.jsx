@@ -36,6 +36,8 @@ function Home() {
     const [showSqlControls, setShowSqlControls] = useState(false);
     const [showResultPopup, setShowResultPopup] = useState(false);
     const [queryResult, setQueryResult] = useState(null);
+    const [queryDatabaseId, setQueryDatabaseId] = useState(null); // Database the current result came from, for paging
+    const [loadingMoreRows, setLoadingMoreRows] = useState(false);
     const [currentNaturalQuery, setCurrentNaturalQuery] = useState(""); 
     const [historicQueryData, setHistoricQueryData] = useState(null); 
     const [currentQueryId, setCurrentQueryId] = useState(null); // To track the current query being processed
@@ -258,6 +260,7 @@ ${explanation ? `**Explanation:**\n${explanation}` : ''}
             
             // Store the query results
             setQueryResult(executionResponse.data);
+            setQueryDatabaseId(databaseId);
             
             // Format the response to display the generated SQL and the results
             const formattedResponse = `
@@ -463,6 +466,28 @@ ${errorMessage}
         return { previewText, rowCount, sql };
     };
 
+    // Append the next page of a large result, read by its result handle
+    const loadMoreResultRows = async () => {
+        if (!queryResult?.result_handle || loadingMoreRows) return;
+        
+        setLoadingMoreRows(true);
+        try {
+            const pageResponse = await api.fetchResultPage(queryDatabaseId, queryResult.result_handle, queryResult.rows.length);
+            const page = pageResponse.data;
+            setQueryResult((current) => ({
+                ...current,
+                rows: [...current.rows, ...page.rows],
+                has_more: page.has_more,
+                total_rows: page.total_rows,
+                truncated: page.truncated || current.truncated,
+            }));
+        } catch (error) {
+            console.error("Error loading more rows:", error);
+        } finally {
+            setLoadingMoreRows(false);
+        }
+    };
+    
     // Helper function to format query results for display
     const formatQueryResults = (results) => {
         console.log("Formatting query results:", results);
@@ -777,6 +802,8 @@ ${errorMessage}
                 results={historicQueryData ? historicQueryData.results : queryResult}
                 executionTime={historicQueryData ? null : queryResult?.execution_time}
                 naturalQuery={historicQueryData ? historicQueryData.naturalQuery : currentNaturalQuery}
+                onLoadMore={historicQueryData ? null : loadMoreResultRows}
+                loadingMore={loadingMoreRows}
             />
         </Box>
     );
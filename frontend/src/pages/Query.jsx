@@ -5,7 +5,7 @@ import ArrowBackIcon from '@mui/icons-material/ArrowBack';
 import PlayArrowIcon from '@mui/icons-material/PlayArrow';
 import SaveIcon from '@mui/icons-material/Save';
 import HistoryIcon from '@mui/icons-material/History';
-import * as api from '../api';
+import api from '../api';
 import { DatabaseIcon } from '../components/Icons';
 import NotFound from './NotFound';
 import Navbar from '../components/Navbar';
@@ -20,6 +20,7 @@ function Query() {
   const [executing, setExecuting] = useState(false);
   const [query, setQuery] = useState('');
   const [results, setResults] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState(null);
   const [queryHistory, setQueryHistory] = useState([]);
   const [showHistory, setShowHistory] = useState(false);
@@ -112,6 +113,29 @@ function Query() {
     }
   };
 
+  // Fetch the next page of a paginated result by its handle and append it
+  const loadMoreRows = async () => {
+    if (!results?.result_handle) return;
+    
+    setLoadingMore(true);
+    try {
+      const response = await api.fetchResultPage(database.id, results.result_handle, results.rows.length);
+      setResults({
+        ...results,
+        rows: [...results.rows, ...response.data.rows],
+        has_more: response.data.has_more,
+        total_rows: response.data.total_rows,
+        truncated: results.truncated || response.data.truncated,
+        status: response.data.status,
+      });
+    } catch (error) {
+      console.error('Error loading more rows:', error);
+      setError(error.response?.data?.status || 'Failed to load more rows. Run the query again.');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleHistoryItemClick = (item) => {
     setQuery(item.query);
     setShowHistory(false);
@@ -265,7 +289,9 @@ function Query() {
               p: 2
             }}>
               <Typography variant="body2" fontWeight="bold" gutterBottom>
-                Results {results && `(${results.rows?.length || 0} rows)`}
+                Results {results && `(${results.rows?.length || 0}${
+                  results.has_more ? (results.total_rows != null ? ` of ${results.total_rows}` : '+') : ''
+                } rows${results.truncated ? ', truncated at the result limit' : ''})`}
               </Typography>
               
               {error && (
@@ -318,6 +344,13 @@ function Query() {
                       ))}
                     </tbody>
                   </table>
+                  {results.has_more && results.result_handle && (
+                    <Box sx={{ display: 'flex', justifyContent: 'center', mt: 2 }}>
+                      <Button variant="outlined" size="small" onClick={loadMoreRows} disabled={loadingMore}>
+                        {loadingMore ? <CircularProgress size={18} /> : 'Load more rows'}
+                      </Button>
+                    </Box>
+                  )}
                 </Box>
               )}
               